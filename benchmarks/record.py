@@ -0,0 +1,55 @@
+"""
+Record live store responses as benchmark fixtures.
+
+Sends each chain's first-page request, exactly as the server would for its
+default location, and saves the body under benchmarks/fixtures. Needs
+network access; the benchmarks themselves never do.
+
+    python -m benchmarks.record [cityGross willys ica]
+"""
+
+from datetime import date
+from typing import List
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+from recipe_mcp import foodmcp
+
+from .transport import FIXTURES_DIR, STORE_FIXTURES
+
+
+async def record(store_key: str) -> str:
+    """Fetch one chain's first page and write it as a fixture; returns the file path"""
+    adapter = foodmcp._store_adapters()[store_key]
+    store_config = foodmcp._store_config(store_key)
+    api = store_config['api']
+    base_url = api['baseUrl'] + adapter.endpoint
+    async with httpx.AsyncClient(headers=api['headers'], timeout=api['timeout'] / 1000.0) as client:
+        if adapter.body is not None:
+            response = await client.request(adapter.method, base_url, params=api['defaultParams'], json=adapter.body)
+        else:
+            response = await client.request(adapter.method, foodmcp._build_url(base_url, api['defaultParams']))
+        response.raise_for_status()
+
+    path = os.path.join(FIXTURES_DIR, f"{STORE_FIXTURES[store_key]}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"store": store_key, "recorded_at": date.today().isoformat(), "body": response.json()},
+                  f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return path
+
+
+async def record_all(store_keys: List[str]) -> None:
+    for store_key in store_keys:
+        try:
+            print(f"{store_key}: wrote {await record(store_key)}")
+        except httpx.HTTPError as e:
+            print(f"{store_key}: failed ({e})")
+
+
+if __name__ == "__main__":
+    asyncio.run(record_all(sys.argv[1:] or list(STORE_FIXTURES)))
@@ -0,0 +1,275 @@
+"""
+Offline benchmark harness for the MCP server.
+
+Every upstream request is served by FixtureTransport, so results are
+reproducible and need no network. Tools are called through FastMCP's
+call_tool, which includes argument validation and result serialization.
+
+    python -m benchmarks.run --items 500 --latency-ms 20 --concurrency 8
+
+Reports per-tool latency percentiles (cold and warm cache), throughput of
+concurrent calls, parse cost per item, nearest-store lookup cost and peak
+memory of a cold fetch of every store. --json writes the numbers for comparison between runs.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The disk cache directory is read at import, so point it somewhere disposable first
+os.environ.setdefault('RECIPE_MCP_CACHE_DIR', tempfile.mkdtemp(prefix='recipe-mcp-bench-'))
+
+from recipe_mcp import client, foodmcp  # noqa: E402
+from recipe_mcp.geo import StoreLocationIndex  # noqa: E402
+from recipe_mcp.jsonstream import BufferedDecoder, StreamDecoder  # noqa: E402
+
+from .transport import STORE_FIXTURES, FixtureTransport  # noqa: E402
+
+INGREDIENTS = ["kycklingfilé", "krossade tomater", "pasta", "grädde", "gul lök", "ost"]
+
+# (tool, arguments) measured with a cold cache, i.e. including the upstream fetch
+COLD_CALLS = [
+    ("get_city_gross_offers", {}),
+    ("get_willys_offers", {}),
+    ("get_ica_offers", {}),
+    ("get_all_grocery_offers", {}),
+]
+
+# (tool, arguments) measured against a warm cache
+WARM_CALLS = COLD_CALLS + [
+    ("get_all_grocery_offers", {"fields": ["name", "price_value"], "limit": 20, "sort_by": "price_value"}),
+    ("search_offers", {"query": "mjölk"}),
+    ("compare_prices", {}),
+    ("plan_basket", {"ingredients": INGREDIENTS, "max_stores": 2}),
+]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p90_ms": round(percentile(samples, 90) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def _label(tool: str, arguments: Dict[str, Any]) -> str:
+    return f"{tool}({', '.join(f'{k}={v!r}' for k, v in arguments.items())})" if arguments else tool
+
+
+def _failed(result: Any) -> bool:
+    """Whether a call_tool result reports an error or failed pages for the call or any store"""
+    structured = result[1] if isinstance(result, tuple) else None
+    if not isinstance(structured, dict):
+        return False
+    # Dict results are wrapped as {"result": ...} in the structured content
+    structured = structured.get('result', structured)
+    return any(store.get('error') or store.get('page_errors')
+               for store in [structured] + structured.get('stores', []))
+
+
+def reset_cache() -> None:
+    """Drop cached store results so the next call fetches upstream again"""
+    foodmcp.offer_cache.clear()
+    if foodmcp.response_store is not None:
+        foodmcp.response_store = foodmcp._open_response_store()
+
+
+async def _timed(call: Callable[[], Awaitable[Any]]) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    result = await call()
+    return time.perf_counter() - started, result
+
+
+async def bench_latency(iterations: int, cold: bool) -> Dict[str, Any]:
+    """Per-tool latency percentiles over sequential calls"""
+    report = {}
+    for tool, arguments in (COLD_CALLS if cold else WARM_CALLS):
+        samples = []
+        errors = 0
+        if not cold:
+            await foodmcp.mcp.call_tool(tool, arguments)
+        for _ in range(iterations):
+            if cold:
+                reset_cache()
+            elapsed, result = await _timed(lambda: foodmcp.mcp.call_tool(tool, arguments))
+            samples.append(elapsed)
+            errors += _failed(result)
+        report[_label(tool, arguments)] = dict(summarize(samples), errors=errors)
+    return report
+
+
+async def bench_throughput(concurrency: int, calls: int) -> Dict[str, Any]:
+    """Calls per second for a mix of warm tool calls issued concurrently"""
+    await foodmcp.mcp.call_tool("get_all_grocery_offers", {})
+    queue: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(WARM_CALLS[i % len(WARM_CALLS)])
+    samples: List[float] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            tool, arguments = queue.get_nowait()
+            elapsed, _ = await _timed(lambda: foodmcp.mcp.call_tool(tool, arguments))
+            samples.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return dict(summarize(samples), concurrency=concurrency, calls=calls,
+                calls_per_second=round(calls / elapsed, 1))
+
+
+def bench_parse(transport: FixtureTransport, repeats: int = 5) -> Dict[str, Any]:
+    """Decode and normalize cost per item for each store's scaled fixture body"""
+    report = {}
+    for store_key, adapter in foodmcp._store_adapters().items():
+        store_id = foodmcp._store_config(store_key)['id']
+        fixture = transport.fixtures[STORE_FIXTURES[store_key]]
+        body = json.dumps(fixture, ensure_ascii=False).encode('utf-8')
+        count = len(adapter.items_of(fixture)) or 1
+
+        def streamed() -> None:
+            decoder = StreamDecoder(adapter.item_paths, lambda item: adapter.to_offer(store_id, item))
+            for start in range(0, len(body), 16 * 1024):
+                decoder.feed(body[start:start + 16 * 1024])
+            decoder.close()
+
+        def buffered() -> None:
+            decoder = BufferedDecoder()
+            decoder.feed(body)
+            for item in adapter.items_of(decoder.close()):
+                adapter.to_offer(store_id, item)
+
+        timings = {}
+        for label, run in (("stream", streamed), ("buffered", buffered)):
+            best = math.inf
+            for _ in range(repeats):
+                started = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - started)
+            timings[f"{label}_us_per_item"] = round(best / count * 1e6, 2)
+        report[store_key] = dict(timings, items=count, body_bytes=len(body))
+    return report
+
+
+def bench_nearest(store_count: int = 5000, queries: int = 1000, seed: int = 0) -> Dict[str, Any]:
+    """Nearest-store lookup cost over synthetic locations spread across Sweden"""
+    rng = random.Random(seed)
+    chains = list(foodmcp.CONSTANTS['stores'])
+    index = StoreLocationIndex(foodmcp.CONSTANTS['common']['storeLocations']['cellKm'])
+    index.extend({"chain": rng.choice(chains), "id": str(n), "name": f"Store {n}",
+                  "lat": rng.uniform(55.3, 69.0), "lon": rng.uniform(11.0, 24.0)} for n in range(store_count))
+    points = [(rng.uniform(55.3, 69.0), rng.uniform(11.0, 24.0)) for _ in range(queries)]
+    report: Dict[str, Any] = {"stores": store_count}
+    for radius_km in (5, 25, 100):
+        started = time.perf_counter()
+        for lat, lon in points:
+            index.nearest(lat, lon, radius_km)
+        report[f"radius_{radius_km}km_us"] = round((time.perf_counter() - started) / queries * 1e6, 1)
+    return report
+
+
+async def bench_memory() -> Dict[str, Any]:
+    """Peak traced memory of a cold get_all_grocery_offers call"""
+    reset_cache()
+    tracemalloc.start()
+    try:
+        await foodmcp.mcp.call_tool("get_all_grocery_offers", {})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"get_all_grocery_offers_cold_peak_mb": round(peak / 1e6, 2)}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    transport = FixtureTransport(args.items, args.latency_ms / 1000.0, args.jitter_ms / 1000.0,
+                                 args.failure_rate, args.seed)
+    client.use_transport(transport)
+    # One log line per upstream request would swamp the output and the timings
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    if args.no_disk_cache:
+        foodmcp.response_store = None
+        foodmcp._response_store_opened = True
+    if not args.rate_limit:
+        # The token buckets would otherwise dominate cold timings
+        foodmcp.CONSTANTS['common']['rateLimit']['requestsPerSecond'] = 0
+    try:
+        report = {
+            "settings": vars(args),
+            "cold": await bench_latency(args.iterations, cold=True),
+            "warm": await bench_latency(args.iterations, cold=False),
+            "throughput": await bench_throughput(args.concurrency, args.calls),
+            "parse": bench_parse(transport),
+            "nearest": bench_nearest(seed=args.seed),
+            "memory": await bench_memory(),
+        }
+        report["transport"] = {"requests": transport.requests, "injected_failures": transport.failures,
+                               "bytes": transport.bytes_sent}
+        return report
+    finally:
+        await client.close_clients()
+        client.use_transport(None)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for phase in ("cold", "warm"):
+        print(f"\n{phase} latency")
+        for label, stats in report[phase].items():
+            print(f"  {label:<90} p50 {stats['p50_ms']:>9.2f} ms  p90 {stats['p90_ms']:>9.2f} ms  "
+                  f"p99 {stats['p99_ms']:>9.2f} ms  errors {stats['errors']}")
+    throughput = report["throughput"]
+    print(f"\nthroughput: {throughput['calls_per_second']} calls/s over {throughput['calls']} calls "
+          f"at concurrency {throughput['concurrency']} (p99 {throughput['p99_ms']} ms)")
+    print("\nparse cost")
+    for store_key, stats in report["parse"].items():
+        print(f"  {store_key:<12} stream {stats['stream_us_per_item']:>7} us/item  "
+              f"buffered {stats['buffered_us_per_item']:>7} us/item  ({stats['items']} items, {stats['body_bytes']} bytes)")
+    nearest = report["nearest"]
+    print(f"\nnearest stores over {nearest['stores']} locations: "
+          + ", ".join(f"{key} {value}" for key, value in nearest.items() if key != "stores"))
+    print(f"\nmemory: {report['memory']['get_all_grocery_offers_cold_peak_mb']} MB peak for a cold get_all_grocery_offers")
+    print(f"transport: {report['transport']}")
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the recipe MCP server")
+    parser.add_argument('--items', type=int, default=500, help="items served per store")
+    parser.add_argument('--iterations', type=int, default=20, help="calls per tool for latency percentiles")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent callers for the throughput run")
+    parser.add_argument('--calls', type=int, default=400, help="calls in the throughput run")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="injected upstream latency per request")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="random +/- jitter on the injected latency")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of upstream requests that fail")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate-limit', action='store_true', help="keep the configured per-host rate limits")
+    parser.add_argument('--no-disk-cache', action='store_true', help="skip writing responses to the disk cache")
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
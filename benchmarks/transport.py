@@ -0,0 +1,125 @@
+"""
+Mock transport replaying store fixtures offline.
+
+Each fixture holds one recorded response body. The transport serves it for
+the matching store host, scaled to any number of items and paginated the way
+the real API would (City Gross skip/take, Willys page/size, ICA in one
+response). Latency and failures can be injected per request.
+"""
+
+from typing import Any, Dict, List, Optional
+import asyncio
+import copy
+import json
+import os
+import random
+
+import httpx
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Bodies are streamed in chunks of this size, like a network read
+CHUNK_SIZE = 16 * 1024
+
+# Fixture name by upstream host
+HOSTS = {
+    'www.citygross.se': 'citygross',
+    'www.willys.se': 'willys',
+    'apimgw-pub.ica.se': 'ica',
+}
+
+# Fixture name by chain key in constants.json
+STORE_FIXTURES = {
+    'cityGross': 'citygross',
+    'willys': 'willys',
+    'ica': 'ica',
+}
+
+
+def load_fixture(name: str) -> Dict[str, Any]:
+    """Load a fixture file from benchmarks/fixtures"""
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _scaled(items: List[Dict[str, Any]], count: int, name_key: str = 'name') -> List[Dict[str, Any]]:
+    """Repeat fixture items up to count, numbering repeats so they stay distinct products"""
+    scaled = []
+    for i in range(count):
+        item = items[i % len(items)]
+        if i >= len(items):
+            item = copy.deepcopy(item)
+            item[name_key] = f"{item[name_key]} {i // len(items) + 1}"
+        scaled.append(item)
+    return scaled
+
+
+class _ChunkedStream(httpx.AsyncByteStream):
+    def __init__(self, content: bytes):
+        self.content = content
+
+    async def __aiter__(self):
+        for start in range(0, len(self.content), CHUNK_SIZE):
+            yield self.content[start:start + CHUNK_SIZE]
+
+
+class FixtureTransport(httpx.AsyncBaseTransport):
+    """Serve fixture responses with optional latency and failure injection.
+
+    latency and jitter are in seconds; failure_rate is the share of requests
+    that fail, half as connection errors and half as 503 responses.
+    """
+
+    def __init__(self, items_per_store: Optional[int] = None, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.bytes_sent = 0
+        self._encoded: Dict[str, bytes] = {}
+        self.fixtures = {name: load_fixture(name)['body'] for name in set(HOSTS.values())}
+        if items_per_store:
+            self.fixtures['citygross']['items'] = _scaled(self.fixtures['citygross']['items'], items_per_store)
+            self.fixtures['citygross']['totalCount'] = items_per_store
+            self.fixtures['willys']['results'] = _scaled(self.fixtures['willys']['results'], items_per_store)
+            self.fixtures['willys']['pagination']['totalNumberOfResults'] = items_per_store
+            self.fixtures['ica']['data']['products'] = _scaled(self.fixtures['ica']['data']['products'], items_per_store)
+
+    def _body(self, name: str, params: httpx.QueryParams) -> Dict[str, Any]:
+        fixture = self.fixtures[name]
+        if name == 'citygross':
+            skip = int(params.get('skip', 0))
+            take = int(params.get('take', 50))
+            return dict(fixture, items=fixture['items'][skip:skip + take])
+        if name == 'willys':
+            page = int(params.get('page', 0))
+            size = int(params.get('size', 50))
+            return dict(fixture, results=fixture['results'][page * size:(page + 1) * size])
+        return fixture
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            self.failures += 1
+            if self.random.random() < 0.5:
+                raise httpx.ConnectError("Injected connection failure", request=request)
+            return httpx.Response(503, request=request)
+
+        name = HOSTS.get(request.url.host)
+        if name is None:
+            return httpx.Response(404, request=request)
+        # Encoded once per distinct request so serving stays cheap next to the server's own work
+        key = f"{name}?{request.url.query.decode('ascii', 'replace')}"
+        content = self._encoded.get(key)
+        if content is None:
+            content = json.dumps(self._body(name, request.url.params), ensure_ascii=False).encode('utf-8')
+            self._encoded[key] = content
+        self.bytes_sent += len(content)
+        return httpx.Response(200, stream=_ChunkedStream(content), request=request,
+                              headers={'Content-Type': 'application/json', 'Content-Length': str(len(content))})
@@ -7,20 +7,30 @@ This package provides tools to fetch current offers from City Gross, Willys, and
 __version__ = "0.1.0"
 __author__ = "Sathwik Katepally"
 
-from .foodmcp import (
-    get_city_gross_offers,
-    get_willys_offers,
-    get_ica_offers,
-    get_all_grocery_offers,
-    get_store_offers,
-    main
-)
-
 __all__ = [
     "get_city_gross_offers",
     "get_willys_offers", 
     "get_ica_offers",
     "get_all_grocery_offers",
+    "get_offer_changes",
     "get_store_offers",
+    "get_offers_batch",
+    "get_store_locations",
+    "find_stores",
+    "search_offers",
+    "compare_prices",
+    "plan_basket",
+    "get_refresh_status",
+    "price_history",
+    "best_deals",
     "main"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # The server module pulls in mcp, httpx and pydantic, so it is only
+    # imported once one of its tools is actually used
+    if name in __all__:
+        from . import foodmcp
+        return getattr(foodmcp, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,158 @@
+"""
+Declarative store adapters.
+
+Each chain in constants.json describes its offers endpoint, where the items
+live in a response and which paths hold each offer field. The descriptions
+are compiled once at startup into plain extractor functions, so normalizing
+an item is a handful of dict lookups with no per-item layout checks. Adding a
+chain whose API fits this model only takes configuration.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import inspect
+
+from .models import Offer
+from .prices import normalize_unit, parse_price, parse_quantity
+
+Extractor = Callable[[Any], Any]
+
+
+def compile_path(path: str) -> Extractor:
+    """Compile a dotted path such as 'potentialPromotions.0.price' into a getter.
+
+    Numeric parts index into lists; an empty path returns the data itself.
+    Missing keys and mismatched types give None.
+    """
+    if not path:
+        return lambda data: data
+    parts = tuple(int(part) if part.isdigit() else part for part in path.split('.'))
+    if len(parts) == 1 and isinstance(parts[0], str):
+        key = parts[0]
+
+        def get_key(data: Any) -> Any:
+            return data.get(key) if isinstance(data, dict) else None
+        return get_key
+
+    def get_path(data: Any) -> Any:
+        for part in parts:
+            try:
+                data = data[part]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return data
+    return get_path
+
+
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    'text': str,
+    'price': parse_price,
+    'quantity': parse_quantity,
+    'unit': lambda value: normalize_unit(str(value)),
+}
+
+
+def compile_field(spec: Any) -> Extractor:
+    """Compile a field spec into a function extracting the field from an item.
+
+    A spec is a path, a list of paths tried in order, or a dict with:
+    - paths: paths tried in order; the first non-empty value wins
+    - type: 'text' (default), 'price', 'unit' (e.g. 'kr/kg' -> 'kg') or
+      'quantity' (e.g. '2 för' -> 2)
+    - default: value when no path matches
+    - join: separator to join every non-empty value instead of taking the first
+    - stripPrefix: prefix removed from text values, e.g. 'kr/' in 'kr/kg'
+    """
+    if isinstance(spec, str):
+        spec = {"paths": [spec]}
+    elif isinstance(spec, list):
+        spec = {"paths": spec}
+    field_type = spec.get('type', 'text')
+    if field_type not in _CONVERTERS:
+        raise ValueError(f"Unknown field type '{field_type}'")
+    convert = _CONVERTERS[field_type]
+    getters = [compile_path(path) for path in spec['paths']]
+    default = spec.get('default', {'price': 0.0, 'quantity': 1}.get(field_type, ''))
+
+    prefix = spec.get('stripPrefix')
+    if prefix:
+        to_value = convert
+
+        def convert(value: Any) -> Any:
+            text = to_value(value)
+            return text[len(prefix):] if text.startswith(prefix) else text
+
+    separator = spec.get('join')
+    if separator is not None:
+        def extract_joined(item: Any) -> Any:
+            values = [convert(value) for value in (get(item) for get in getters) if value is not None and value != '']
+            return separator.join(values) if values else default
+        return extract_joined
+
+    def extract_first(item: Any) -> Any:
+        for get in getters:
+            value = get(item)
+            if value is not None and value != '':
+                return convert(value)
+        return default
+    return extract_first
+
+
+class StoreAdapter:
+    """Compiled description of one chain's offers API"""
+
+    def __init__(self, store_key: str, chain_config: Dict[str, Any]):
+        api = chain_config['api']
+        spec = chain_config['adapter']
+        self.store_key = store_key
+        self.method = api.get('method', 'GET').upper()
+        self.endpoint = api['endpoints'][spec['endpoint']]
+        self.pagination: Optional[Dict[str, Any]] = api.get('pagination')
+        # POST endpoints send the params as a query string alongside a JSON body
+        self.body: Optional[Any] = spec.get('body')
+
+        unknown = set(spec['fields']) - set(inspect.signature(Offer).parameters)
+        if unknown:
+            raise ValueError(f"{store_key}: unknown offer fields {sorted(unknown)}")
+        self._fields = tuple((name, compile_field(field)) for name, field in spec['fields'].items())
+
+        self.item_paths: List[str] = list(spec['itemsPaths'])
+        self._item_getters = [compile_path(path) for path in self.item_paths]
+        self._items_getter: Optional[Extractor] = None
+
+    def items_of(self, data: Any) -> List[Any]:
+        """Get the list of raw items from a response.
+
+        The first configured path that yields a list is remembered, so later
+        responses with the same layout take a single lookup.
+        """
+        if self._items_getter is not None:
+            items = self._items_getter(data)
+            if isinstance(items, list):
+                return items
+        for get in self._item_getters:
+            items = get(data)
+            if isinstance(items, list):
+                self._items_getter = get
+                return items
+        return []
+
+    def to_offer(self, store_id: str, item: Any) -> Optional[Offer]:
+        """Normalize one raw item, or return None if it is not an object"""
+        if not isinstance(item, dict):
+            return None
+        return Offer(store_id=store_id, **{name: extract(item) for name, extract in self._fields})
+
+
+def build_registry(stores: Dict[str, Any]) -> Dict[str, StoreAdapter]:
+    """Compile an adapter for every chain in the stores config"""
+    return {store_key: StoreAdapter(store_key, chain_config) for store_key, chain_config in stores.items()}
+
+
+def build_aliases(stores: Dict[str, Any]) -> Dict[str, str]:
+    """Map lower-case store names and aliases to chain keys"""
+    aliases = {}
+    for store_key, chain_config in stores.items():
+        names = [store_key, chain_config['name'], *chain_config.get('aliases', [])]
+        for name in names:
+            aliases[name.lower()] = store_key
+    return aliases
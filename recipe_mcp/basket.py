@@ -0,0 +1,81 @@
+"""
+Recipe basket planning over cached offers.
+
+Every ingredient is matched once against the search index, giving a cost
+matrix of the cheapest relevant offer per ingredient and store. Store
+combinations are then scored column-wise on that matrix, so the cost of a
+plan is independent of how many offers the stores have.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from itertools import combinations
+import math
+
+from .models import Offer
+from .search import OfferIndex
+
+# Offers scoring below this fraction of the best match are not considered
+RELEVANCE_CUTOFF = 0.5
+
+# How many matches per ingredient are considered before picking per-store minimums
+CANDIDATES_PER_INGREDIENT = 200
+
+
+def build_cost_matrix(index: OfferIndex, ingredients: Sequence[str],
+                      store_ids: Sequence[str]) -> Tuple[List[List[float]], List[List[Optional[Offer]]]]:
+    """Find the cheapest relevant offer for each ingredient in each store"""
+    column = {store_id: position for position, store_id in enumerate(store_ids)}
+    costs = [[math.inf] * len(store_ids) for _ in ingredients]
+    choices: List[List[Optional[Offer]]] = [[None] * len(store_ids) for _ in ingredients]
+    for row, ingredient in enumerate(ingredients):
+        matches = index.search(ingredient, set(store_ids), limit=CANDIDATES_PER_INGREDIENT)
+        if not matches:
+            continue
+        cutoff = matches[0][0] * RELEVANCE_CUTOFF
+        for score, offer in matches:
+            if score < cutoff or offer.unit_price <= 0:
+                continue
+            position = column[offer.store_id]
+            if offer.unit_price < costs[row][position]:
+                costs[row][position] = offer.unit_price
+                choices[row][position] = offer
+    return costs, choices
+
+
+def rank_store_combinations(costs: List[List[float]], store_count: int,
+                            max_stores: int) -> List[Tuple[int, float, Tuple[int, ...]]]:
+    """Score every combination of up to max_stores stores as (covered, total, stores)"""
+    ranked = []
+    for size in range(1, min(max_stores, store_count) + 1):
+        for combo in combinations(range(store_count), size):
+            best = [min(row[position] for position in combo) for row in costs]
+            found = [cost for cost in best if cost < math.inf]
+            ranked.append((len(found), sum(found), combo))
+    # Most ingredients covered first, then cheapest, then fewest stores
+    ranked.sort(key=lambda plan: (-plan[0], plan[1], len(plan[2])))
+    return ranked
+
+
+def plan(index: OfferIndex, ingredients: Sequence[str], store_ids: Sequence[str],
+         max_stores: int, alternatives: int = 3) -> List[Dict[str, Any]]:
+    """Return the best store plans for a list of ingredients, best first"""
+    costs, choices = build_cost_matrix(index, ingredients, store_ids)
+    plans = []
+    for covered, total, combo in rank_store_combinations(costs, len(store_ids), max_stores)[:alternatives + 1]:
+        items = []
+        missing = []
+        for row, ingredient in enumerate(ingredients):
+            position = min(combo, key=lambda position: costs[row][position])
+            offer = choices[row][position]
+            if offer is None:
+                missing.append(ingredient)
+            else:
+                items.append((ingredient, offer))
+        plans.append({
+            "store_ids": [store_ids[position] for position in combo],
+            "total": round(total, 2),
+            "covered": covered,
+            "items": items,
+            "missing": missing,
+        })
+    return plans
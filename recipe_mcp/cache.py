@@ -0,0 +1,138 @@
+"""
+In-process cache for store offer results.
+
+Entries are kept in LRU order and expire after a per-store TTL. Once expired,
+an entry is still served for a stale-while-revalidate window while a single
+background task refreshes it. Entries never outlive the earliest promotion
+end date of the offers they hold. Concurrent misses for the same key share
+one fetch.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import json
+import time
+
+from .singleflight import SingleFlight
+
+Fetcher = Callable[[], Awaitable[Dict[str, Any]]]
+Listener = Callable[[str, Dict[str, Any]], None]
+
+
+def earliest_expiry(timestamps: Iterable[str]) -> Optional[float]:
+    """Get the earliest future expiry (epoch seconds) from ISO date strings"""
+    now = time.time()
+    earliest = None
+    for value in timestamps:
+        if not value:
+            continue
+        text = str(value).replace('Z', '+00:00')
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            continue
+        # A bare date means the promotion runs until the end of that day
+        if len(text) == 10:
+            parsed += timedelta(days=1)
+        expires = parsed.timestamp()
+        if expires > now and (earliest is None or expires < earliest):
+            earliest = expires
+    return earliest
+
+
+class CacheEntry:
+    """A cached value with its freshness deadlines"""
+
+    __slots__ = ('value', 'stored_at', 'fresh_until', 'stale_until')
+
+    def __init__(self, value: Dict[str, Any], stored_at: float, fresh_until: float, stale_until: float):
+        self.value = value
+        self.stored_at = stored_at
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class OfferCache:
+    """LRU cache with TTL and stale-while-revalidate for store results"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self._listeners: List[Listener] = []
+        self._fetches = SingleFlight()
+
+    @staticmethod
+    def make_key(store_key: str, params: Dict[str, Any]) -> str:
+        """Build a cache key from a store and its request parameters"""
+        return f"{store_key}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call listener(key, value) whenever a fresh value is stored"""
+        self._listeners.append(listener)
+
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        self._entries.clear()
+
+    def _store(self, key: str, value: Dict[str, Any], ttl: float, stale: float,
+               expires: Optional[float]) -> None:
+        now = time.time()
+        fresh_until = now + ttl
+        stale_until = fresh_until + stale
+        if expires is not None:
+            fresh_until = min(fresh_until, expires)
+            stale_until = min(stale_until, expires)
+        self._entries[key] = CacheEntry(value, now, fresh_until, stale_until)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        for listener in self._listeners:
+            listener(key, value)
+
+    async def _revalidate(self, key: str, fetch: Fetcher, ttl: float, stale: float,
+                          expiry_of: Callable[[Dict[str, Any]], Optional[float]],
+                          cacheable: Callable[[Dict[str, Any]], bool]) -> None:
+        try:
+            value = await fetch()
+            if cacheable(value):
+                self._store(key, value, ttl, stale, expiry_of(value))
+        except Exception:
+            # Keep serving the stale entry until the window closes
+            pass
+        finally:
+            self._revalidating.pop(key, None)
+
+    async def get_or_fetch(self, key: str, fetch: Fetcher, ttl: float, stale: float,
+                           expiry_of: Callable[[Dict[str, Any]], Optional[float]],
+                           cacheable: Callable[[Dict[str, Any]], bool],
+                           force: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return a cached value or fetch it, along with hit/age information.
+
+        With force=True the cached entry is bypassed and replaced.
+        """
+        now = time.time()
+        entry = None if force else self._entries.get(key)
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+            is_stale = now >= entry.fresh_until
+            if is_stale and key not in self._revalidating:
+                self._revalidating[key] = asyncio.ensure_future(
+                    self._revalidate(key, fetch, ttl, stale, expiry_of, cacheable)
+                )
+            return entry.value, {
+                "hit": True,
+                "stale": is_stale,
+                "age_seconds": round(now - entry.stored_at, 3),
+            }
+
+        async def fetch_and_store() -> Dict[str, Any]:
+            value = await fetch()
+            if cacheable(value):
+                self._store(key, value, ttl, stale, expiry_of(value))
+            return value
+
+        value, callers, joined = await self._fetches.do(key, fetch_and_store)
+        return value, {"hit": False, "stale": False, "age_seconds": 0.0, "coalesced_callers": callers, "joined": joined}
@@ -0,0 +1,60 @@
+"""
+Shared HTTP connection pools for the store adapters.
+
+One long-lived httpx.AsyncClient is kept per upstream host, so TCP connections
+and TLS sessions are reused across tool calls instead of being re-established
+on every request.
+"""
+
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import importlib.util
+import httpx
+
+# Open clients keyed by upstream host
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# Transport for new clients; None uses httpx's network transport
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Route new clients through transport (e.g. a mock for offline benchmarks).
+
+    Clients already created keep their transport, so call this before the
+    first request or after close_clients().
+    """
+    global _transport
+    _transport = transport
+
+
+def get_client(base_url: str, pool: Dict[str, Any]) -> httpx.AsyncClient:
+    """Get the pooled client for the host of base_url, creating it on first use"""
+    host = urlsplit(base_url).netloc
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=pool.get('maxConnections'),
+            max_keepalive_connections=pool.get('maxKeepaliveConnections'),
+            keepalive_expiry=pool.get('keepaliveExpiry'),
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            http2=bool(pool.get('http2')) and http2_available(),
+            transport=_transport,
+        )
+        _clients[host] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Close every pooled client and drop its connections"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
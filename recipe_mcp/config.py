@@ -0,0 +1,79 @@
+"""
+Loading and validation of the server configuration.
+
+constants.json is read and checked once per process; every later call gets
+the same parsed dict. Validation only covers what the server relies on at
+startup, so a broken config fails with a message naming the missing key
+instead of a KeyError in the middle of a tool call.
+"""
+
+from typing import Any, Dict, Iterable, Optional
+import functools
+import json
+import os
+
+CONSTANTS_FILE = os.path.join(os.path.dirname(__file__), 'constants.json')
+
+# Sections of `common` and keys of each chain the server reads unconditionally
+COMMON_KEYS = ('defaultTimeout', 'httpPool', 'cache', 'rateLimit', 'resilience', 'diskCache', 'history',
+               'scheduler', 'server', 'storeLocations', 'batch')
+COMMON_SECTION_KEYS = {
+    'cache': ('maxEntries', 'ttlSeconds'),
+    'rateLimit': ('requestsPerSecond', 'burst'),
+    'resilience': ('attemptTimeout', 'deadline', 'retries', 'retryBudget', 'circuitBreaker', 'hedge'),
+    'diskCache': ('directory', 'maxDecodedBodies'),
+    'history': ('file', 'batchSize', 'flushSeconds', 'rawDays', 'dailyDays', 'averageDays', 'minDaysForAverage'),
+    'server': ('host', 'port', 'workers'),
+    'storeLocations': ('file', 'cellKm', 'maxRadiusKm'),
+    'batch': ('maxRequests', 'defaultLimit'),
+}
+CHAIN_KEYS = ('name', 'id', 'api', 'adapter', 'locations')
+API_KEYS = ('baseUrl', 'endpoints', 'defaultParams', 'headers')
+ADAPTER_KEYS = ('endpoint', 'itemsPaths', 'fields')
+
+
+def _require(section: Any, keys: Iterable[str], where: str) -> None:
+    if not isinstance(section, dict):
+        raise ValueError(f"{where}: expected an object")
+    missing = [key for key in keys if key not in section]
+    if missing:
+        raise ValueError(f"{where}: missing {', '.join(missing)}")
+
+
+def validate_constants(constants: Dict[str, Any]) -> None:
+    """Check the structure of a parsed config; raises ValueError naming the first problem"""
+    _require(constants, ('stores', 'common'), 'config')
+    common = constants['common']
+    _require(common, COMMON_KEYS, 'common')
+    for section, keys in COMMON_SECTION_KEYS.items():
+        _require(common[section], keys, f"common.{section}")
+
+    stores = constants['stores']
+    if not isinstance(stores, dict) or not stores:
+        raise ValueError("stores: at least one chain is required")
+    for store_key, chain_config in stores.items():
+        _require(chain_config, CHAIN_KEYS, store_key)
+        _require(chain_config['api'], API_KEYS, f"{store_key}.api")
+        _require(chain_config['adapter'], ADAPTER_KEYS, f"{store_key}.adapter")
+        endpoint = chain_config['adapter']['endpoint']
+        if endpoint not in chain_config['api']['endpoints']:
+            raise ValueError(f"{store_key}.adapter: unknown endpoint '{endpoint}'")
+        _require(chain_config['adapter']['fields'], ('name', 'price'), f"{store_key}.adapter.fields")
+        locations = chain_config['locations']
+        if not isinstance(locations, list) or not locations:
+            raise ValueError(f"{store_key}.locations: at least one location is required")
+        ids = set()
+        for index, location in enumerate(locations):
+            _require(location, ('id', 'name'), f"{store_key}.locations[{index}]")
+            if str(location['id']) in ids:
+                raise ValueError(f"{store_key}.locations: duplicate id '{location['id']}'")
+            ids.add(str(location['id']))
+
+
+@functools.lru_cache(maxsize=None)
+def load_constants(path: Optional[str] = None) -> Dict[str, Any]:
+    """Read and validate a config file (the bundled one by default), once per path"""
+    with open(path or CONSTANTS_FILE, 'r', encoding='utf-8') as f:
+        constants = json.load(f)
+    validate_constants(constants)
+    return constants
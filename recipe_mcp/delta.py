@@ -0,0 +1,117 @@
+"""
+Snapshot versions and offer deltas for polling clients.
+
+Every offer gets an identity key (its folded brand, name and description,
+numbered when a store lists the same one more than once) and a fingerprint of its
+content. A snapshot's version is a hash over its keys and fingerprints, so an
+unchanged assortment keeps its version across refreshes. The fingerprints of
+a store's last few versions are kept, which lets a client that sends the
+version it has receive only the offers added, removed or changed since.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import base64
+import binascii
+import hashlib
+import json
+
+from .models import Offer
+from .search import tokenize
+
+# Versions remembered per store; older ones get a full resync
+MAX_VERSIONS = 16
+
+# (fingerprint, name, price) of one offer in a snapshot
+ItemState = Tuple[str, str, float]
+
+
+def offer_fingerprint(offer: Offer) -> str:
+    """Hash the offer fields a client sees"""
+    content = '\x1f'.join(str(value) for value in (
+        offer.name, offer.price, offer.original_price, offer.unit, offer.discount, offer.description,
+        offer.category, offer.brand, offer.availability, offer.valid_until,
+    ))
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def offer_key(offer: Offer) -> str:
+    """Identify an offer within a store's snapshot"""
+    return ' '.join(tokenize(f"{offer.brand} {offer.name} {offer.description}"))
+
+
+def keyed_offers(offers: List[Offer]) -> List[Tuple[str, Offer]]:
+    """Pair offers with the keys snapshot_fingerprints gives them"""
+    keys: Dict[str, int] = {}
+    keyed = []
+    for offer in offers:
+        base = offer_key(offer)
+        keys[base] = keys.get(base, 0) + 1
+        keyed.append((base if keys[base] == 1 else f"{base} #{keys[base]}", offer))
+    return keyed
+
+
+def snapshot_fingerprints(offers: List[Offer]) -> Tuple[str, Dict[str, ItemState]]:
+    """Key and fingerprint every offer; returns (version, {key: item state})"""
+    items = {key: (offer_fingerprint(offer), offer.name, offer.price) for key, offer in keyed_offers(offers)}
+    digest = hashlib.blake2b(digest_size=8)
+    for key in sorted(items):
+        digest.update(f"{key}\x1e{items[key][0]}\x1d".encode('utf-8'))
+    return digest.hexdigest(), items
+
+
+def encode_version(versions: Dict[str, str]) -> str:
+    """Pack per-store versions into the token clients send back"""
+    raw = json.dumps(versions, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_version(token: str) -> Dict[str, str]:
+    """Unpack a token made by encode_version"""
+    try:
+        versions = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid version")
+    if not isinstance(versions, dict) or not all(isinstance(v, str) for v in versions.values()):
+        raise ValueError("Invalid version")
+    return versions
+
+
+class SnapshotLog:
+    """The item states of each store's recent snapshot versions"""
+
+    def __init__(self, max_versions: int = MAX_VERSIONS):
+        self.max_versions = max_versions
+        self._versions: Dict[str, "OrderedDict[str, Dict[str, ItemState]]"] = {}
+
+    def remember(self, store_id: str, version: str, items: Dict[str, ItemState]) -> None:
+        versions = self._versions.setdefault(store_id, OrderedDict())
+        versions[version] = items
+        versions.move_to_end(version)
+        while len(versions) > self.max_versions:
+            versions.popitem(last=False)
+
+    def diff(self, store_id: str, since: str, version: str,
+             offers: List[Offer]) -> Optional[Dict[str, List[Any]]]:
+        """What changed between two remembered versions of a store's snapshot.
+
+        offers is the snapshot at version. Returns None when either version is
+        no longer remembered. Added and changed entries are (key, offer,
+        previous price) tuples.
+        """
+        versions = self._versions.get(store_id, {})
+        old = versions.get(since)
+        new = versions.get(version)
+        if old is None or new is None:
+            return None
+        added_keys = [key for key in new if key not in old]
+        changed_keys = [key for key in new if key in old and old[key][0] != new[key][0]]
+        by_key = dict(keyed_offers(offers)) if added_keys or changed_keys else {}
+        return {
+            "added": [(key, by_key[key], None) for key in added_keys],
+            "changed": [(key, by_key[key], old[key][2]) for key in changed_keys],
+            "removed": [
+                {"key": key, "name": name, "previous_price_value": price}
+                for key, (_, name, price) in old.items() if key not in new
+            ],
+        }
@@ -0,0 +1,225 @@
+"""
+Persistent on-disk cache of raw upstream responses.
+
+Each response body is stored next to its ETag/Last-Modified validators. The
+next fetch of the same request sends If-None-Match/If-Modified-Since, so a
+304 reply skips both the download and the JSON parse. When the upstream is
+unreachable the last good snapshot is served and marked as stale.
+
+Bodies are streamed: each chunk is fed to a decoder and written to a
+temporary file at the same time, and the file replaces the stored body once
+the response is complete. All file access runs in worker threads, so a slow
+disk does not stall the event loop.
+"""
+
+from typing import Any, Callable, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import httpx
+
+from .jsonstream import BufferedDecoder
+
+# Chunk size when replaying a stored body through a decoder
+READ_CHUNK_SIZE = 1 << 16
+
+# Decoded bodies kept in memory by default
+MAX_DECODED = 128
+
+# Response statuses reported to the adapters
+FRESH = 'fresh'
+NOT_MODIFIED = 'not_modified'
+STALE = 'stale'
+
+
+class CachedResponse:
+    """Decoded upstream data and where it came from"""
+
+    __slots__ = ('data', 'status', 'stored_at')
+
+    def __init__(self, data: Any, status: str, stored_at: float):
+        self.data = data
+        self.status = status
+        self.stored_at = stored_at
+
+
+class ResponseStore:
+    """Directory of raw response bodies with their validators.
+
+    Methods block on the file system; fetch_json and load_stale call them
+    from worker threads.
+    """
+
+    def __init__(self, directory: str, max_decoded: int = MAX_DECODED):
+        self.directory = os.path.expanduser(directory)
+        # The most recently used decoded bodies, so a 304 usually does not re-parse
+        self.max_decoded = max_decoded
+        self._decoded: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _paths(self, key: str):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return base + '.meta.json', base + '.body'
+
+    def load_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """Read the validators stored for a request, if any"""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(body_path) else None
+
+    def _remember(self, key: str, data: Any) -> None:
+        with self._lock:
+            self._decoded[key] = data
+            self._decoded.move_to_end(key)
+            while len(self._decoded) > self.max_decoded:
+                self._decoded.popitem(last=False)
+
+    def load_data(self, key: str, decoder: Any) -> Any:
+        """Get the decoded body for a request, parsing the stored file unless it is still in memory"""
+        with self._lock:
+            if key in self._decoded:
+                self._decoded.move_to_end(key)
+                return self._decoded[key]
+        _, body_path = self._paths(key)
+        with open(body_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                decoder.feed(chunk)
+        data = decoder.close()
+        self._remember(key, data)
+        return data
+
+    def temp_file(self):
+        """Open a temporary file in the cache directory; returns (file, path)"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        return os.fdopen(fd, 'wb'), tmp_path
+
+    def save(self, key: str, body_path: str, data: Any, headers: httpx.Headers) -> float:
+        """Store a fully written temporary body file and its validators, replacing older files atomically"""
+        meta_path, stored_body_path = self._paths(key)
+        stored_at = time.time()
+        meta = {
+            "request": key,
+            "etag": headers.get('etag'),
+            "last_modified": headers.get('last-modified'),
+            "stored_at": stored_at,
+        }
+        f, tmp_path = self.temp_file()
+        with f:
+            f.write(json.dumps(meta).encode('utf-8'))
+        os.replace(body_path, stored_body_path)
+        os.replace(tmp_path, meta_path)
+        self._remember(key, data)
+        return stored_at
+
+
+def _request_key(request: httpx.Request) -> str:
+    key = f"{request.method} {request.url}"
+    if request.content:
+        key += ' ' + hashlib.sha256(request.content).hexdigest()
+    return key
+
+
+async def _read_body(response: httpx.Response, decoder: Any, body: Optional[Any] = None) -> Any:
+    """Feed a streamed response to a decoder, copying it to body as it arrives"""
+    async for chunk in response.aiter_bytes():
+        decoder.feed(chunk)
+        if body is not None:
+            await asyncio.to_thread(body.write, chunk)
+    return decoder.close()
+
+
+def _save(store: ResponseStore, key: str, body: Any, body_path: str, data: Any, headers: httpx.Headers) -> float:
+    body.close()
+    return store.save(key, body_path, data, headers)
+
+
+async def fetch_json(store: Optional[ResponseStore], client: httpx.AsyncClient,
+                     method: str, url: str, decoder: Optional[Callable[[], Any]] = None,
+                     serve_stale: bool = True, **kwargs: Any) -> CachedResponse:
+    """Fetch and decode a JSON response, revalidating against the disk cache.
+
+    decoder builds the object the body is fed to (BufferedDecoder by default),
+    such as a StreamDecoder that normalizes items while they download. With
+    serve_stale off, upstream failures are raised instead of answered from disk.
+    """
+    make_decoder = decoder or BufferedDecoder
+    request = client.build_request(method, url, **kwargs)
+    if store is None:
+        response = await client.send(request, stream=True)
+        try:
+            response.raise_for_status()
+            return CachedResponse(await _read_body(response, make_decoder()), FRESH, time.time())
+        finally:
+            await response.aclose()
+
+    key = _request_key(request)
+    meta = await asyncio.to_thread(store.load_meta, key)
+    if meta:
+        if meta.get('etag'):
+            request.headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            request.headers['If-Modified-Since'] = meta['last_modified']
+
+    body = tmp_path = None
+    try:
+        response = await client.send(request, stream=True)
+        try:
+            if response.status_code == 304 and meta:
+                data = await asyncio.to_thread(store.load_data, key, make_decoder())
+                return CachedResponse(data, NOT_MODIFIED, meta['stored_at'])
+            response.raise_for_status()
+            try:
+                body, tmp_path = await asyncio.to_thread(store.temp_file)
+            except OSError:
+                # An unwritable cache directory must not fail the fetch itself
+                pass
+            data = await _read_body(response, make_decoder(), body)
+        finally:
+            await response.aclose()
+    except BaseException as e:
+        if body is not None:
+            body.close()
+            os.unlink(tmp_path)
+        # Serve the last good snapshot when the upstream is down or failing
+        upstream_failed = isinstance(e, httpx.TransportError) or (
+            isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500)
+        if meta and upstream_failed and serve_stale:
+            data = await asyncio.to_thread(store.load_data, key, make_decoder())
+            return CachedResponse(data, STALE, meta['stored_at'])
+        raise
+
+    if body is None:
+        return CachedResponse(data, FRESH, time.time())
+    try:
+        stored_at = await asyncio.to_thread(_save, store, key, body, tmp_path, data, response.headers)
+    except OSError:
+        stored_at = time.time()
+    return CachedResponse(data, FRESH, stored_at)
+
+
+async def load_stale(store: Optional[ResponseStore], client: httpx.AsyncClient,
+               method: str, url: str, decoder: Optional[Callable[[], Any]] = None,
+               **kwargs: Any) -> Optional[CachedResponse]:
+    """Get the last stored response for a request without contacting the upstream"""
+    if store is None:
+        return None
+    key = _request_key(client.build_request(method, url, **kwargs))
+    meta = await asyncio.to_thread(store.load_meta, key)
+    if not meta:
+        return None
+    try:
+        data = await asyncio.to_thread(store.load_data, key, (decoder or BufferedDecoder)())
+        return CachedResponse(data, STALE, meta['stored_at'])
+    except (OSError, ValueError):
+        return None
@@ -1,331 +1,1314 @@
-from typing import Any, Dict
-import httpx
-import re
+from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import argparse
+import asyncio
 import json
 import os
+import sqlite3
+import time
+import httpx
 from mcp.server.fastmcp import FastMCP
+from . import basket
+from .adapters import StoreAdapter, build_aliases, build_registry
+from .cache import OfferCache, earliest_expiry
+from .client import close_clients, get_client
+from .config import load_constants
+from .delta import SnapshotLog, decode_version, encode_version, keyed_offers, snapshot_fingerprints
+from .geo import StoreLocationIndex, load_store_locations
+from .history import PriceHistory
+from .disk_cache import FRESH, NOT_MODIFIED, STALE, CachedResponse, ResponseStore, fetch_json, load_stale
+from .jsonstream import BufferedDecoder, StreamDecoder
+from .matching import ProductMatcher
+from .metrics import MetricsRegistry
+from .models import Offer
+from .pagination import Paginator
+from .ratelimit import get_bucket
+from .resilience import (CircuitBreaker, CircuitOpenError, UpstreamTimeout, backoff_delay, circuit_status,
+                         get_breaker, get_latencies, get_retry_budget, hedged, is_retryable)
+from .scheduler import RefreshScheduler
+from .search import OfferIndex
+from .shaping import OfferView, snapshot_stamp, sorted_offers
+from .singleflight import SingleFlight
+
+# Load and validate constants from JSON file
+CONSTANTS = load_constants()
+
+# Store name lookup, built once from the stores config
+STORE_ALIASES = build_aliases(CONSTANTS['stores'])
+
+# Store adapters, compiled on the first fetch so starting the server stays cheap
+_adapters: Optional[Dict[str, StoreAdapter]] = None
+
+def _store_adapters() -> Dict[str, StoreAdapter]:
+    """Get the adapter of every chain, compiling them on first use"""
+    global _adapters
+    if _adapters is None:
+        _adapters = build_registry(CONSTANTS['stores'])
+    return _adapters
 
-# Load constants from JSON file
-with open(os.path.join(os.path.dirname(__file__), 'constants.json'), 'r') as f:
-    CONSTANTS = json.load(f)
+# Background refresher, running only while the server is up
+scheduler: Optional[RefreshScheduler] = None
+
+# Client sessions currently open; over HTTP many share this process
+_open_sessions = 0
+
+@asynccontextmanager
+async def _server_lifespan(server: Any):
+    """Start the shared state with the first client session and release it after the last.
+    
+    The lifespan runs once per session. Over stdio that is the whole process;
+    over HTTP every client session runs it, while the pooled clients, caches
+    and the refresh scheduler stay shared between them.
+    """
+    global scheduler, _open_sessions
+    _open_sessions += 1
+    settings = CONSTANTS['common']['scheduler']
+    if _open_sessions == 1 and settings.get('enabled'):
+        scheduler = RefreshScheduler(settings)
+        for store_key, store_config in _chain_locations():
+            interval = store_config.get('scheduler', {}).get('intervalSeconds')
+            scheduler.add(store_config['id'], _refresher(store_key, store_config['location']['id']), interval)
+        scheduler.start()
+    try:
+        yield {}
+    finally:
+        _open_sessions -= 1
+        if _open_sessions == 0:
+            if scheduler is not None:
+                await scheduler.stop()
+                scheduler = None
+            if history_store is not None:
+                history_store.flush()
+            await close_clients()
+
+class _SharedServer(FastMCP):
+    """FastMCP serving at most `workers` tool calls at once, across all sessions"""
+    
+    workers: Optional[int] = None
+    _slots: Optional[asyncio.Semaphore] = None
+    
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
+        if not self.workers:
+            return await super().call_tool(name, arguments)
+        # Created lazily so the semaphore belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            return await super().call_tool(name, arguments)
 
 # Initialize FastMCP server
-mcp = FastMCP("food-app-mcp")
-
-def extract_price_value(price_str: str) -> float:
-    """Extract numeric price value from price string"""
-    if not price_str:
-        return 0.0
-    # Extract numbers from price string (handle Swedish format)
-    matches = re.findall(r'\d+[,.]?\d*', str(price_str))
-    if matches:
-        # Handle Swedish decimal format (comma as decimal separator)
-        price_val = matches[0].replace(',', '.')
+mcp = _SharedServer("food-app-mcp", lifespan=_server_lifespan)
+
+# Shared cache of store results
+offer_cache = OfferCache(CONSTANTS['common']['cache']['maxEntries'])
+
+def _cache_directory() -> str:
+    return os.environ.get('RECIPE_MCP_CACHE_DIR', CONSTANTS['common']['diskCache']['directory'])
+
+def _open_response_store() -> Optional[ResponseStore]:
+    """Open the on-disk response cache, unless it is disabled"""
+    if not CONSTANTS['common']['diskCache'].get('enabled'):
+        return None
+    return ResponseStore(_cache_directory(), CONSTANTS['common']['diskCache']['maxDecodedBodies'])
+
+# Opened with the first upstream request
+response_store: Optional[ResponseStore] = None
+_response_store_opened = False
+
+def _response_store() -> Optional[ResponseStore]:
+    """Get the on-disk response cache, opening it on first use"""
+    global response_store, _response_store_opened
+    if not _response_store_opened:
+        _response_store_opened = True
+        response_store = _open_response_store()
+    return response_store
+
+def _open_history_store() -> Optional[PriceHistory]:
+    """Open the price history database in the cache directory, unless it is disabled"""
+    settings = CONSTANTS['common']['history']
+    if not settings.get('enabled'):
+        return None
+    try:
+        return PriceHistory(os.path.join(os.path.expanduser(_cache_directory()), settings['file']),
+                            settings['batchSize'], settings['flushSeconds'],
+                            settings['rawDays'], settings['dailyDays'])
+    except (OSError, sqlite3.Error):
+        # Offers are still served without a writable history
+        return None
+
+# Opened on first use, so starting the server does not touch the database
+history_store: Optional[PriceHistory] = None
+_history_opened = False
+
+def _history_store() -> Optional[PriceHistory]:
+    """Get the price history database, opening it on first use"""
+    global history_store, _history_opened
+    if not _history_opened:
+        _history_opened = True
+        history_store = _open_history_store()
+    return history_store
+
+# Physical store locations for find_stores, loaded on first use
+_store_location_index: Optional[StoreLocationIndex] = None
+
+def _store_locations() -> StoreLocationIndex:
+    """Get the spatial index of the store location dataset, building it on first use"""
+    global _store_location_index
+    if _store_location_index is None:
+        settings = CONSTANTS['common']['storeLocations']
+        # Relative paths are inside the package; an absolute one can point at a fuller export
+        path = os.path.join(os.path.dirname(__file__), os.path.expanduser(settings['file']))
+        stores = load_store_locations(path)
+        unknown = sorted({store['chain'] for store in stores} - set(CONSTANTS['stores']))
+        if unknown:
+            raise ValueError(f"{settings['file']}: unknown chains {unknown}")
+        index = StoreLocationIndex(settings['cellKm'])
+        index.extend(stores)
+        _store_location_index = index
+    return _store_location_index
+
+# Per-store latency, size, parse and cache metrics, published as resources
+metrics = MetricsRegistry()
+
+# Item fingerprints of recent snapshot versions, for get_offer_changes
+snapshot_log = SnapshotLog()
+
+# Search index and cross-store product groups over every cached store snapshot
+search_index = OfferIndex()
+product_matcher = ProductMatcher()
+
+def _on_snapshot_stored(key: str, result: Dict[str, Any]) -> None:
+    """Feed a freshly cached, complete store snapshot into the indexes"""
+    if not _is_complete(result):
+        return
+    search_index.update(result['store_id'], result['items'])
+    product_matcher.update(result['store_id'], result['items'])
+    history = _history_store()
+    if history is not None:
         try:
-            return float(price_val)
-        except ValueError:
-            return 0.0
-    return 0.0
+            history.record(result['store_id'], result['items'])
+        except sqlite3.Error:
+            pass
 
-@mcp.tool()
-async def get_city_gross_offers() -> Dict[str, Any]:
-    """Get actual City Gross weekly offers from their API"""
+offer_cache.add_listener(_on_snapshot_stored)
+
+def _store_client(store_config: Dict[str, Any]) -> httpx.AsyncClient:
+    """Get the pooled HTTP client for a store, applying its pool overrides"""
+    pool = dict(CONSTANTS['common']['httpPool'])
+    pool.update(store_config['api'].get('pool', {}))
+    return get_client(store_config['api']['baseUrl'], pool)
+
+def _store_config(store_key: str, location_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Get a chain's config for one of its locations (the first one by default).
+    
+    Location params and headers are merged over the chain's defaults. The
+    first location keeps the chain's store id; others get their own. Stores
+    from the location dataset that carry params work as locations too.
+    """
+    chain_config = CONSTANTS['stores'][store_key]
+    locations = chain_config['locations']
+    if location_id is None:
+        location = locations[0]
+    else:
+        location = next((location for location in locations if str(location['id']) == str(location_id)), None)
+        if location is None:
+            try:
+                location = _store_locations().get(store_key, location_id)
+            except (OSError, ValueError):
+                location = None
+            if location is None or 'params' not in location:
+                return None
+    
+    store_config = dict(chain_config)
+    store_config['api'] = dict(chain_config['api'])
+    store_config['api']['defaultParams'] = dict(chain_config['api']['defaultParams'], **location.get('params', {}))
+    store_config['api']['headers'] = dict(chain_config['api']['headers'], **location.get('headers', {}))
+    if location is locations[0]:
+        store_config['id'] = location.get('storeId', chain_config['id'])
+        store_config['name'] = location.get('storeName', chain_config['name'])
+    else:
+        store_config['id'] = location.get('storeId', f"{store_key.lower()}_{location['id']}")
+        store_config['name'] = location.get('storeName', f"{chain_config['name']} {location['name']}")
+    store_config['location'] = location
+    return store_config
+
+# Upstream requests in flight, shared by identical concurrent requests
+upstream_flights = SingleFlight()
+
+async def _fetch_store_json(store_config: Dict[str, Any], client: httpx.AsyncClient,
+                            method: str, url: str, decoder: Any = BufferedDecoder, **kwargs: Any) -> CachedResponse:
+    """Fetch from a store's API; identical concurrent requests share one upstream call"""
+    key = (
+        store_config['id'], method, url,
+        json.dumps(kwargs.get('params'), sort_keys=True, default=str),
+        json.dumps(kwargs.get('json'), sort_keys=True, default=str),
+    )
+    response, _, joined = await upstream_flights.do(
+        key, lambda: _fetch_upstream(store_config, client, method, url, decoder, **kwargs))
+    if joined:
+        metrics.store(store_config['id']).record_event('coalesced_requests')
+    return response
+
+async def _fetch_upstream(store_config: Dict[str, Any], client: httpx.AsyncClient,
+                          method: str, url: str, decoder: Any = BufferedDecoder, **kwargs: Any) -> CachedResponse:
+    """Fetch from a store's API under its host's rate limit and the failure policy.
+    
+    Failed attempts are retried with jittered backoff while the retry budget
+    and the request deadline allow, slow attempts are hedged, and when the
+    store's circuit is open or every attempt failed, the last response saved
+    to disk is served instead.
+    """
+    api = store_config['api']
+    store_id = store_config['id']
+    rate_limit = dict(CONSTANTS['common']['rateLimit'])
+    rate_limit.update(api.get('rateLimit', {}))
+    policy = dict(CONSTANTS['common']['resilience'])
+    policy.update(api.get('resilience', {}))
+    
+    stats = metrics.store(store_id)
+    breaker = get_breaker(store_id, policy['circuitBreaker'])
+    budget = get_retry_budget(policy['retryBudget'])
+    latencies = get_latencies(store_id)
+    deadline = time.monotonic() + policy['deadline'] / 1000.0
+    
+    async def stale_response() -> Optional[CachedResponse]:
+        response = await load_stale(_response_store(), client, method, url, decoder, **kwargs)
+        if response is not None:
+            stats.record_event('stale_fallbacks')
+        return response
+    
+    async def attempt() -> CachedResponse:
+        await get_bucket(api['baseUrl'], rate_limit).acquire()
+        allowance = min(policy['attemptTimeout'] / 1000.0, deadline - time.monotonic())
+        metered, decoders = metrics.metered(decoder)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                fetch_json(_response_store(), client, method, url, decoder=metered, serve_stale=False, **kwargs),
+                max(allowance, 0.001))
+        except asyncio.TimeoutError as e:
+            error = UpstreamTimeout(f"No response from {store_config['name']} within {max(allowance, 0):.3g} s")
+            stats.record_request_error(error)
+            raise error from e
+        except asyncio.CancelledError:
+            # A hedge won or the fan-out deadline passed; the upstream did not fail
+            raise
+        except Exception as e:
+            stats.record_request_error(e)
+            raise
+        elapsed = time.perf_counter() - started
+        parse_seconds = sum(d.seconds for d in decoders)
+        # Bodies replayed from the disk cache were not downloaded
+        body_bytes = decoders[-1].bytes if decoders and response.status == FRESH else 0
+        stats.record_response(response.status, elapsed - parse_seconds, body_bytes, parse_seconds)
+        latencies.add(elapsed)
+        return response
+    
+    def may_hedge() -> bool:
+        if not budget.withdraw():
+            return False
+        stats.record_event('hedges')
+        return True
+    
+    if not breaker.allow():
+        stats.record_event('short_circuits')
+        response = await stale_response()
+        if response is None:
+            raise CircuitOpenError(f"{store_config['name']} is failing; skipping it for another "
+                                   f"{breaker.status().get('retry_in_seconds', 0):g} s")
+        return response
+    
+    hedge = policy['hedge']
+    budget.deposit()
+    error: Optional[Exception] = None
+    for retry in range(policy['retries'] + 1):
+        if retry:
+            delay = backoff_delay(retry - 1, policy['backoffBaseSeconds'], policy['backoffMaxSeconds'])
+            if time.monotonic() + delay >= deadline or breaker.state == CircuitBreaker.OPEN:
+                break
+            if not budget.withdraw():
+                stats.record_event('retries_refused')
+                break
+            stats.record_event('retries')
+            await asyncio.sleep(delay)
+        hedge_delay = None
+        if hedge.get('enabled') and len(latencies.samples) >= hedge['minSamples']:
+            hedge_delay = max(latencies.percentile(hedge['percentile']), hedge['minDelaySeconds'])
+        try:
+            response = await hedged(attempt, hedge_delay, may_hedge)
+        except Exception as e:
+            if not is_retryable(e):
+                # The upstream answered, so it is up; the request itself is at fault and
+                # repeating it will not help, but the last saved snapshot still can
+                breaker.record_success()
+                error = e
+                break
+            breaker.record_failure()
+            error = e
+            continue
+        breaker.record_success()
+        return response
+    
+    response = await stale_response()
+    if response is None:
+        raise error
+    return response
+
+def _build_url(base_url: str, params: Dict[str, Any]) -> str:
+    """Append query parameters to a base URL"""
+    query_params = '&'.join([f"{k}={v}" for k, v in params.items()])
+    return f"{base_url}?{query_params}"
+
+def _with_fetch_info(result: Dict[str, Any], responses: List[CachedResponse],
+                     paginator: Optional[Paginator] = None) -> Dict[str, Any]:
+    """Attach pagination and disk cache details to a store result"""
+    if paginator is not None:
+        result["total_available"] = paginator.total
+        result["pages_fetched"] = paginator.pages_fetched
+        result["truncated"] = paginator.truncated
+        if paginator.errors:
+            result["page_errors"] = paginator.errors
+    result["not_modified_responses"] = sum(1 for response in responses if response.status == NOT_MODIFIED)
+    stale = [response for response in responses if response.status == STALE]
+    if stale:
+        # The upstream could not be reached; this is the last snapshot saved to disk
+        result["stale_snapshot"] = True
+        result["snapshot_saved_at"] = datetime.fromtimestamp(min(response.stored_at for response in stale)).isoformat(timespec='seconds')
+    return result
+
+async def _fetch_store_offers(adapter: StoreAdapter, store_config: Dict[str, Any],
+                             max_items: Optional[int] = None) -> Dict[str, Any]:
+    """Fetch a store location's offers as described by its chain's adapter"""
     
     try:
-        async with httpx.AsyncClient() as client:
-            city_gross_config = CONSTANTS['stores']['cityGross']
-            headers = city_gross_config['api']['headers']
-            
-            # Build URL with parameters
-            base_url = city_gross_config['api']['baseUrl'] + city_gross_config['api']['endpoints']['weeklyOffers']
-            params = city_gross_config['api']['defaultParams']
-            
-            # Build query string
-            query_params = '&'.join([f"{k}={v}" for k, v in params.items()])
-            url = f"{base_url}?{query_params}"
-            response = await client.get(url, headers=headers, timeout=city_gross_config['api']['timeout'] / 1000.0)
-            data = response.json()
-            
-            items = []
-            if 'items' in data:
-                for product in data['items'][:30]:  # Limit to 30 items
-                    # Extract pricing information
-                    product_details = product.get('productStoreDetails', {})
-                    prices = product_details.get('prices', {})
-                    current_price = prices.get('currentPrice', {})
-                    active_promotion = prices.get('activePromotion', {})
-                    promotion_price = active_promotion.get('priceDetails', {}) if active_promotion else {}
-                    
-                    # Calculate actual selling price (promotion price if available, otherwise current price)
-                    selling_price = promotion_price.get('price', current_price.get('price', 0))
-                    original_price = current_price.get('price', 0)
-                    
-                    item = {
-                        "name": product.get('name', 'Unknown'),
-                        "price": f"{selling_price} kr" + (f"/{current_price.get('unit', 'st')}" if current_price.get('unit') else ''),
-                        "price_value": float(selling_price) if selling_price else 0.0,
-                        "original_price": f"{original_price} kr" + (f"/{current_price.get('unit', 'st')}" if current_price.get('unit') else '') if original_price != selling_price else '',
-                        "discount": f"Save {original_price - selling_price:.2f} kr" if original_price and selling_price and original_price > selling_price else '',
-                        "description": product.get('description', ''),
-                        "category": product.get('category', ''),
-                        "brand": product.get('brand', ''),
-                        "unit": current_price.get('unit', 'st') if current_price else 'st',
-                        "availability": "available",
-                        "promotion_valid_until": active_promotion.get('to', '') if active_promotion else ''
-                    }
-                    items.append(item)
-            
-            return {
-                "store_name": city_gross_config['name'],
-                "store_id": city_gross_config['id'],
-                "items": items,
-                "item_count": len(items),
-                "source_url": url
-            }
-            
+        client = _store_client(store_config)
+        headers = store_config['api']['headers']
+        timeout = store_config['api']['timeout'] / 1000.0
+        
+        base_url = store_config['api']['baseUrl'] + adapter.endpoint
+        params = store_config['api']['defaultParams']
+        url = _build_url(base_url, params)
+        
+        responses = []
+        store_id = store_config['id']
+        
+        def to_offer(product: Any) -> Optional[Offer]:
+            return adapter.to_offer(store_id, product)
+        
+        def decoder() -> StreamDecoder:
+            # Items are normalized one at a time while the body downloads
+            return StreamDecoder(adapter.item_paths, to_offer)
+        
+        async def fetch_page(page_params: Dict[str, Any]) -> Any:
+            if adapter.body is not None:
+                response = await _fetch_store_json(store_config, client, adapter.method, base_url, decoder=decoder,
+                                                   headers=headers, params=page_params, json=adapter.body, timeout=timeout)
+            else:
+                response = await _fetch_store_json(store_config, client, adapter.method, _build_url(base_url, page_params),
+                                                   decoder=decoder, headers=headers, timeout=timeout)
+            responses.append(response)
+            return response.data
+        
+        def normalized(products: List[Any]) -> List[Offer]:
+            # Items that were not streamed (an unexpected layout) are normalized here
+            offers = [product if isinstance(product, Offer) else to_offer(product) for product in products]
+            return [offer for offer in offers if offer is not None]
+        
+        items = []
+        paginator = None
+        truncated = False
+        if adapter.pagination:
+            paginator = Paginator(fetch_page, params, adapter.pagination, max_items, adapter.items_of)
+            async for products in paginator.pages():
+                items.extend(normalized(products))
+        else:
+            # The whole assortment comes back in a single response
+            products = adapter.items_of(await fetch_page(params))
+            truncated = max_items is not None and len(products) > max_items
+            items = normalized(products[:max_items])
+        
+        result = {
+            "store_name": store_config['name'],
+            "store_id": store_id,
+            "items": items,
+            "item_count": len(items),
+            "source_url": url,
+            "fetched_at": datetime.now().isoformat(timespec='milliseconds'),
+        }
+        if paginator is None:
+            result["truncated"] = truncated
+        if not items:
+            result["note"] = f"No offers found from the {store_config['name']} API"
+        result = _with_fetch_info(result, responses, paginator)
+        version, fingerprints = snapshot_fingerprints(items)
+        result["version"] = version
+        if _is_complete(result):
+            # Only complete snapshots can be diffed against
+            snapshot_log.remember(store_id, version, fingerprints)
+        
     except Exception as e:
-        city_gross_config = CONSTANTS['stores']['cityGross']
-        return {
-            "store_name": city_gross_config['name'],
-            "store_id": city_gross_config['id'],
+        result = {
+            "store_name": store_config['name'],
+            "store_id": store_config['id'],
             "items": [],
             "item_count": 0,
             "error": str(e),
         }
+    metrics.store(store_config['id']).record_fetch(result)
+    return result
+
+def _is_complete(result: Dict[str, Any]) -> bool:
+    """Whether a result holds the store's whole assortment: every page came back and none were cut off"""
+    return not result.get('truncated') and not result.get('page_errors')
+
+def _is_cacheable(result: Dict[str, Any]) -> bool:
+    """Only cache successful, live results that actually contain offers and lost no pages.
+    
+    A result missing pages is still returned, but a stale complete entry
+    keeps being served instead of it, and the next call fetches again.
+    """
+    return ('error' not in result and not result.get('stale_snapshot') and result.get('item_count', 0) > 0
+            and not result.get('page_errors'))
+
+def _promotion_expiry(result: Dict[str, Any]) -> Optional[float]:
+    """Get when the first cached promotion in a result ends"""
+    return earliest_expiry(offer.valid_until for offer in result.get('items', []))
+
+def _location_error(store_key: str, location: str) -> Dict[str, Any]:
+    """Build the error for an unknown store location"""
+    chain_config = CONSTANTS['stores'][store_key]
+    available = ', '.join(f"{location['id']} ({location['name']})" for location in chain_config['locations'])
+    return {
+        "error": f"Unknown {chain_config['name']} location '{location}'. Available locations: {available}"
+    }
+
+async def _cached_store_offers(store_key: str, max_items: Optional[int] = None,
+                               location: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+    """Serve a store location's offers from the cache, fetching them on a miss or when refresh is set"""
+    store_config = _store_config(store_key, location)
+    if store_config is None:
+        return _location_error(store_key, location)
+    settings = dict(CONSTANTS['common']['cache'])
+    settings.update(store_config.get('cache', {}))
+    
+    key = OfferCache.make_key(store_key, dict(store_config['api']['defaultParams'], max_items=max_items))
+    result, cache_info = await offer_cache.get_or_fetch(
+        key,
+        lambda: _fetch_store_offers(_store_adapters()[store_key], store_config, max_items),
+        ttl=settings['ttlSeconds'],
+        stale=settings['staleWhileRevalidateSeconds'],
+        expiry_of=_promotion_expiry,
+        cacheable=_is_cacheable,
+        force=refresh,
+    )
+    metrics.store(store_config['id']).record_cache(cache_info)
+    if cache_info.get('joined'):
+        metrics.store(store_config['id']).record_event('coalesced_fetches')
+    return dict(result, cache=cache_info)
+
+def _offer_view(fields: Optional[List[str]], limit: Optional[int], sort_by: Optional[str],
+                cursor: Optional[str]):
+    """Build the view for a tool call, or an error response for invalid options"""
+    try:
+        return OfferView(fields, limit, sort_by, cursor), None
+    except ValueError as e:
+        return None, {"error": str(e)}
+
+async def _store_tool_offers(store_key: str, max_items: Optional[int], location: Optional[str],
+                             fields: Optional[List[str]], limit: Optional[int], sort_by: Optional[str],
+                             cursor: Optional[str]) -> Dict[str, Any]:
+    """Serve a single-store tool call, shaped by the view options"""
+    view, error = _offer_view(fields, limit, sort_by, cursor)
+    if error:
+        return error
+    result = await _cached_store_offers(store_key, max_items, location)
+    try:
+        response = view.render(result)
+    except ValueError as e:
+        return {"error": str(e)}
+    if view.paged:
+        response["next_cursor"] = view.next_cursor()
+    return response
+
+@mcp.tool()
+async def get_city_gross_offers(max_items: Optional[int] = None, location: Optional[str] = None,
+                                fields: Optional[List[str]] = None, limit: Optional[int] = None,
+                                sort_by: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get actual City Gross weekly offers from their API.
+    
+    Every page of offers is fetched unless max_items caps the result.
+    location selects a configured location id (see get_store_locations).
+    fields, limit, sort_by (e.g. "price_value" or "-savings") and cursor pick,
+    order and page the items of the cached snapshot; pass next_cursor back to
+    get the next page.
+    """
+    return await _store_tool_offers('cityGross', max_items, location, fields, limit, sort_by, cursor)
+
+@mcp.tool()
+async def get_willys_offers(max_items: Optional[int] = None, location: Optional[str] = None,
+                            fields: Optional[List[str]] = None, limit: Optional[int] = None,
+                            sort_by: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get Willys offers - test their API endpoints.
+    
+    Every page of offers is fetched unless max_items caps the result.
+    location selects a configured location id (see get_store_locations).
+    fields, limit, sort_by (e.g. "price_value" or "-savings") and cursor pick,
+    order and page the items of the cached snapshot; pass next_cursor back to
+    get the next page.
+    """
+    return await _store_tool_offers('willys', max_items, location, fields, limit, sort_by, cursor)
 
 @mcp.tool()
-async def get_willys_offers() -> Dict[str, Any]:
-    """Get Willys offers - test their API endpoints"""
+async def get_ica_offers(max_items: Optional[int] = None, location: Optional[str] = None,
+                         fields: Optional[List[str]] = None, limit: Optional[int] = None,
+                         sort_by: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get ICA offers for a store using the real API endpoint.
+    
+    location selects a configured location id (see get_store_locations);
+    the default is ICA Supermarket Sundbyberg.
+    fields, limit, sort_by (e.g. "price_value" or "-savings") and cursor pick,
+    order and page the items of the cached snapshot; pass next_cursor back to
+    get the next page.
+    """
+    return await _store_tool_offers('ica', max_items, location, fields, limit, sort_by, cursor)
+
+def _refresher(store_key: str, location: str):
+    """Build the scheduler callback that re-fetches one store location into the cache"""
+    async def refresh() -> Dict[str, Any]:
+        return await _cached_store_offers(store_key, location=location, refresh=True)
+    return refresh
+
+def _failed_store_result(store_config: Dict[str, Any], error: str, timed_out: bool = False) -> Dict[str, Any]:
+    """Build the empty result for a store that failed or missed the fan-out deadline"""
+    return {
+        "store_name": store_config['name'],
+        "store_id": store_config['id'],
+        "items": [],
+        "item_count": 0,
+        "timed_out": timed_out,
+        "error": error,
+    }
+
+def _offer_targets(locations: Optional[List[str]]):
+    """Work out which (chain, location) pairs to fetch; returns (targets, error response)"""
+    if locations is None:
+        return [(store_key, None) for store_key in CONSTANTS['stores']], None
+    if not locations:
+        return None, {"error": "No store locations given. Omit locations for each chain's default location."}
+    targets = []
+    for location in locations:
+        matches = [
+            (store_key, location) for store_key, chain_config in CONSTANTS['stores'].items()
+            if any(str(configured['id']) == str(location) for configured in chain_config['locations'])
+        ]
+        if not matches:
+            return None, {"error": f"Unknown store location '{location}'. Use get_store_locations to list them."}
+        targets.extend(matches)
+    return targets, None
+
+async def _fetch_targets(targets: List[Any], max_items: Optional[int] = None):
+    """Fetch store locations concurrently under one shared deadline; returns (store results, timed out ids)"""
+    if not targets:
+        return [], []
+    deadline = CONSTANTS['common'].get('allOffersDeadline', CONSTANTS['common']['defaultTimeout']) / 1000.0
+    tasks = [
+        asyncio.ensure_future(_cached_store_offers(store_key, max_items, location))
+        for store_key, location in targets
+    ]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    
+    # Late stores are cancelled; stores that already answered are kept as partial results
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    stores = []
+    timed_out = []
+    for (store_key, location), task in zip(targets, tasks):
+        store_config = _store_config(store_key, location)
+        if task in pending:
+            stores.append(_failed_store_result(store_config, f"No response within {deadline:g} s deadline", timed_out=True))
+            timed_out.append(store_config['id'])
+            metrics.store(store_config['id']).deadline_misses += 1
+        elif task.exception() is not None:
+            stores.append(_failed_store_result(store_config, str(task.exception())))
+        else:
+            stores.append(task.result())
+    return stores, timed_out
+
+def _versions_token(stores: List[Dict[str, Any]], previous: Optional[Dict[str, str]] = None) -> str:
+    """Combine store versions into one token; failed stores keep their previous version"""
+    versions = dict(previous or {})
+    versions.update({store['store_id']: store['version'] for store in stores if store.get('version')})
+    return encode_version(versions)
+
+@mcp.tool()
+async def get_all_grocery_offers(max_items_per_store: Optional[int] = None,
+                                 locations: Optional[List[str]] = None,
+                                 fields: Optional[List[str]] = None, limit: Optional[int] = None,
+                                 sort_by: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get all current grocery offers from all stores.
+    
+    By default each chain's default location is fetched; pass location ids
+    (see get_store_locations) to fetch any number of locations at once.
+    fields, limit (per store), sort_by (e.g. "price_value") and cursor pick,
+    order and page the items of the cached snapshots; pass next_cursor back
+    to get the next page. Pass the returned version to get_offer_changes to
+    poll for changes only.
+    """
+    view, error = _offer_view(fields, limit, sort_by, cursor)
+    if error:
+        return error
+    targets, error = _offer_targets(locations)
+    if error:
+        return error
+    stores, timed_out = await _fetch_targets(targets, max_items_per_store)
     
     try:
-        async with httpx.AsyncClient() as client:
-            willys_config = CONSTANTS['stores']['willys']
-            headers = willys_config['api']['headers']
-            
-            # Build URL with parameters
-            base_url = willys_config['api']['baseUrl'] + willys_config['api']['endpoints']['campaigns']
-            params = willys_config['api']['defaultParams']
-            
-            # Build query string
-            query_params = '&'.join([f"{k}={v}" for k, v in params.items()])
-            url = f"{base_url}?{query_params}"
-            
-            items = []
-            try:
-                response = await client.get(url, headers=headers, timeout=willys_config['api']['timeout'] / 1000.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Parse the results from real Willys API
-                    if 'results' in data:
-                        results = data['results']
-                        for result in results[:30]:  # Limit to 30 items
-                            # Extract product information
-                            product_name = result.get('name', 'Unknown Product')
-                            manufacturer = result.get('manufacturer', '')
-                            display_volume = result.get('displayVolume', '')
-                            
-                            # Get current price
-                            current_price_str = result.get('priceNoUnit', '0')
-                            current_price = extract_price_value(current_price_str)
-                            price_unit = result.get('priceUnit', 'kr/st')
-                            
-                            # Get promotion info if available
-                            promotions = result.get('potentialPromotions', [])
-                            promotion_price = current_price
-                            discount_info = ""
-                            
-                            if promotions:
-                                promotion = promotions[0]  # Take first promotion
-                                if promotion.get('price'):
-                                    promotion_price = float(promotion['price'])
-                                save_price = promotion.get('savePrice', '')
-                                redeem_limit = promotion.get('redeemLimitLabel', '')
-                                
-                                if save_price and redeem_limit:
-                                    discount_info = f"{save_price} • {redeem_limit}"
-                                elif save_price:
-                                    discount_info = save_price
-                                elif redeem_limit:
-                                    discount_info = redeem_limit
-                            
-                            # Build description
-                            description_parts = [manufacturer, display_volume]
-                            description = ' '.join(filter(None, description_parts))
-                            
-                            item = {
-                                "name": product_name,
-                                "price": f"{promotion_price} {price_unit}" if promotion_price else f"{current_price} {price_unit}",
-                                "price_value": float(promotion_price) if promotion_price else current_price,
-                                "original_price": f"{current_price} {price_unit}" if promotion_price != current_price else "",
-                                "discount": discount_info,
-                                "description": description,
-                                "category": "",
-                                "brand": manufacturer,
-                                "unit": price_unit.replace('kr/', '') if 'kr/' in price_unit else 'st',
-                                "availability": "available"
-                            }
-                            items.append(item)
-                            
-                working_url = url
-            except Exception:
-                working_url = None
-            
-            return {
-                "store_name": willys_config['name'],
-                "store_id": willys_config['id'],
-                "items": items,
-                "item_count": len(items),
-                "source_url": working_url or "API endpoint failed",
-                "note": "No working API found" if not items else f"Data from real Willys API"
-            }
-            
-    except Exception as e:
-        willys_config = CONSTANTS['stores']['willys']
+        rendered = [view.render(store) for store in stores]
+    except ValueError as e:
+        return {"error": str(e)}
+    all_offers = {
+        "stores": rendered,
+        "total_items": sum(store["item_count"] for store in stores),
+        "data_source": "real_apis",
+        "partial": bool(timed_out),
+        "timed_out_stores": timed_out,
+        "version": _versions_token(stores),
+    }
+    if view.paged:
+        all_offers["next_cursor"] = view.next_cursor()
+    
+    return all_offers
+
+@mcp.tool()
+async def get_offer_changes(since_version: Optional[str] = None, locations: Optional[List[str]] = None,
+                            fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Get only the offers added, removed or changed since a version.
+    
+    Pass the version from get_all_grocery_offers or from the previous call
+    (with the same locations). Stores whose snapshot is unchanged return no
+    items. Without since_version, or when the version is too old to diff
+    against, a store's full list comes back under "added" with "full": true.
+    fields picks the item fields as in get_all_grocery_offers.
+    """
+    view, error = _offer_view(fields, None, None, None)
+    if error:
+        return error
+    try:
+        since = decode_version(since_version) if since_version else {}
+    except ValueError as e:
+        return {"error": str(e)}
+    targets, error = _offer_targets(locations)
+    if error:
+        return error
+    stores, timed_out = await _fetch_targets(targets)
+    
+    def item(key: str, offer: Offer, previous_price: Optional[float] = None) -> Dict[str, Any]:
+        rendered = dict(view.project(offer), key=key)
+        if previous_price is not None:
+            rendered["previous_price_value"] = previous_price
+        return rendered
+    
+    changes = []
+    counts = {"added": 0, "changed": 0, "removed": 0}
+    for store in stores:
+        store_id = store.get('store_id')
+        entry = {"store_name": store.get('store_name'), "store_id": store_id}
+        version = store.get('version')
+        if 'error' in store or not version:
+            entry["error"] = store.get('error', "No version available")
+            changes.append(entry)
+            continue
+        entry["version"] = version
+        if since.get(store_id) == version:
+            entry["unchanged"] = True
+            changes.append(entry)
+            continue
+        diff = snapshot_log.diff(store_id, since[store_id], version, store['items']) if store_id in since else None
+        if diff is None:
+            entry["full"] = True
+            entry["added"] = [item(key, offer) for key, offer in keyed_offers(store['items'])]
+            entry["changed"] = []
+            entry["removed"] = []
+        else:
+            entry["added"] = [item(*change) for change in diff['added']]
+            entry["changed"] = [item(*change) for change in diff['changed']]
+            entry["removed"] = diff['removed']
+        for kind in counts:
+            counts[kind] += len(entry[kind])
+        changes.append(entry)
+    
+    return {
+        "version": _versions_token(stores, since),
+        "changed": any(counts.values()),
+        "added_count": counts["added"],
+        "changed_count": counts["changed"],
+        "removed_count": counts["removed"],
+        "stores": changes,
+        "partial": bool(timed_out),
+        "timed_out_stores": timed_out,
+    }
+
+def _resolve_store_key(store_name: str) -> Optional[str]:
+    """Map a user-supplied store name to its key in constants.json"""
+    store_name_lower = store_name.lower().strip()
+    store_key = STORE_ALIASES.get(store_name_lower)
+    if store_key is None:
+        # Fuller names such as "ICA Maxi Solna" resolve by the alias they contain
+        store_key = next((key for alias, key in STORE_ALIASES.items() if alias in store_name_lower), None)
+    return store_key
+
+def _available_stores() -> str:
+    """List the configured chain names for error messages"""
+    return ', '.join(chain_config.get('chainName', chain_config['name']) for chain_config in CONSTANTS['stores'].values())
+
+@mcp.tool()
+async def get_store_offers(store_name: str, max_items: Optional[int] = None,
+                           locations: Optional[List[str]] = None,
+                           fields: Optional[List[str]] = None, limit: Optional[int] = None,
+                           sort_by: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get offers from a specific store.
+    
+    With several location ids the locations are fetched concurrently and
+    returned together under "stores". fields, limit (per location), sort_by
+    and cursor pick, order and page the items as in get_all_grocery_offers.
+    """
+    store_key = _resolve_store_key(store_name)
+    if store_key is None:
         return {
-            "store_name": willys_config['name'],
-            "store_id": willys_config['id'],
-            "items": [],
-            "item_count": 0,
-            "error": str(e),
+            "error": f"Store '{store_name}' not supported. Available stores: {_available_stores()}"
         }
+    if not locations or len(locations) == 1:
+        return await _store_tool_offers(store_key, max_items, locations[0] if locations else None,
+                                        fields, limit, sort_by, cursor)
+    
+    view, error = _offer_view(fields, limit, sort_by, cursor)
+    if error:
+        return error
+    stores = await asyncio.gather(*(_cached_store_offers(store_key, max_items, location) for location in locations))
+    try:
+        rendered = [view.render(store) for store in stores]
+    except ValueError as e:
+        return {"error": str(e)}
+    response = {
+        "stores": rendered,
+        "total_items": sum(store.get("item_count", 0) for store in stores),
+    }
+    if view.paged:
+        response["next_cursor"] = view.next_cursor()
+    return response
+
+def _batch_target(request: Any):
+    """Validate one get_offers_batch sub-request; returns ((store_key, location), error message)"""
+    if not isinstance(request, dict) or not isinstance(request.get('store'), str):
+        return None, "Each request needs a 'store' name"
+    unknown = sorted(set(request) - {'store', 'location', 'query', 'limit'})
+    if unknown:
+        return None, f"Unknown request keys {unknown}; use store, location, query and limit"
+    store_key = _resolve_store_key(request['store'])
+    if store_key is None:
+        return None, f"Store '{request['store']}' not supported. Available stores: {_available_stores()}"
+    location = request.get('location')
+    location = str(location) if location is not None else None
+    if _store_config(store_key, location) is None:
+        return None, _location_error(store_key, location)['error']
+    if request.get('query') is not None and not isinstance(request['query'], str):
+        return None, "query must be a string"
+    limit = request.get('limit')
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        return None, "limit must be a whole number of at least 1"
+    return (store_key, location), None
+
+def _batch_matches(result: Dict[str, Any], indexes: Dict[str, OfferIndex], query: Optional[str], limit: int,
+                   sort_by: Optional[str]) -> List[Offer]:
+    """Pick a sub-request's offers from its store snapshot: query matches, or every offer, in order.
+    
+    Queries search an index of exactly this snapshot, built once per store
+    and batch; the shared search index may already hold a newer refresh.
+    """
+    store_id = result['store_id']
+    offers = result['items']
+    if query:
+        index = indexes.get(store_id)
+        if index is None:
+            index = indexes[store_id] = OfferIndex()
+            index.update(store_id, offers)
+        matches = [offer for _, offer in index.search(query, {store_id}, None, len(offers) if sort_by else limit)]
+        return sorted_offers(store_id, '', matches, sort_by)[:limit]
+    return sorted_offers(store_id, snapshot_stamp(result), offers, sort_by)[:limit]
 
 @mcp.tool()
-async def get_ica_offers() -> Dict[str, Any]:
-    """Get ICA offers from Sundbyberg store using the real API endpoint"""
+async def get_offers_batch(requests: List[Dict[str, Any]], fields: Optional[List[str]] = None,
+                           sort_by: Optional[str] = None) -> Dict[str, Any]:
+    """Run many store/query lookups in one call.
+    
+    Each request is {"store": name, "location": id, "query": text,
+    "limit": n}; only store is required. Without a query a request returns
+    the store's first offers (by sort_by, if given), with one the best
+    matching offers. Every store location is fetched once, concurrently,
+    however many requests use it. Offers are returned once under "offers";
+    each entry of "results" lists the indexes of its offers there, with a
+    status of "ok", "error" or "timed_out". fields picks the offer fields.
+    """
+    settings = CONSTANTS['common']['batch']
+    if not requests:
+        return {"error": "requests must list at least one request"}
+    if len(requests) > settings['maxRequests']:
+        return {"error": f"At most {settings['maxRequests']} requests per call"}
+    view, error = _offer_view(fields, None, sort_by, None)
+    if error:
+        return error
     
+    planned = [_batch_target(request) for request in requests]
+    targets = list(dict.fromkeys(target for target, _ in planned if target is not None))
+    fetched, _ = await _fetch_targets(targets)
+    by_target = dict(zip(targets, fetched))
+    
+    offers = []
+    offer_ids: Dict[Any, int] = {}
+    offer_keys: Dict[str, Dict[int, str]] = {}
+    indexes: Dict[str, OfferIndex] = {}
+    results = []
+    for position, (request, (target, error)) in enumerate(zip(requests, planned)):
+        entry: Dict[str, Any] = {"index": position}
+        store = by_target.get(target)
+        if error is None and 'error' in store:
+            error = store['error']
+        if error is not None:
+            entry.update(status="timed_out" if store is not None and store.get('timed_out') else "error",
+                         error=error)
+            results.append(entry)
+            continue
+        store_id = store['store_id']
+        if store_id not in offer_keys:
+            offer_keys[store_id] = {id(offer): key for key, offer in keyed_offers(store['items'])}
+        ids = []
+        for offer in _batch_matches(store, indexes, request.get('query'),
+                                    request.get('limit') or settings['defaultLimit'], view.sort_by):
+            identity = (store_id, offer_keys[store_id][id(offer)])
+            if identity not in offer_ids:
+                offer_ids[identity] = len(offers)
+                offers.append(dict(view.project(offer), store_id=store_id, key=identity[1]))
+            ids.append(offer_ids[identity])
+        entry.update(status="ok", store_name=store['store_name'], store_id=store_id,
+                     fetched_at=store.get('fetched_at'), offer_ids=ids, offer_count=len(ids))
+        results.append(entry)
+    
+    failed = sum(1 for entry in results if entry['status'] != "ok")
+    return {
+        "results": results,
+        "offers": offers,
+        "offer_count": len(offers),
+        "request_count": len(results),
+        "failed_count": failed,
+        "partial": bool(failed),
+    }
+
+@mcp.tool()
+async def get_store_locations() -> Dict[str, Any]:
+    """List the configured locations of every chain, with their store ids"""
+    chains = []
+    for store_key, chain_config in CONSTANTS['stores'].items():
+        locations = []
+        for location in chain_config['locations']:
+            store_config = _store_config(store_key, location['id'])
+            locations.append({
+                "location_id": str(location['id']),
+                "name": location['name'],
+                "store_id": store_config['id'],
+                "store_name": store_config['name'],
+            })
+        chains.append({"chain": chain_config['name'], "locations": locations})
+    return {"chains": chains}
+
+def _offers_location(store_key: str, store: Dict[str, Any]) -> Optional[str]:
+    """The location id whose offers a physical store has, if it has any"""
+    if _store_config(store_key, store['id']) is not None:
+        return str(store['id'])
+    return store.get('offersLocation')
+
+@mcp.tool()
+async def find_stores(lat: float, lon: float, radius_km: float = 5, chains: Optional[List[str]] = None,
+                      limit: int = 10, include_offers: bool = False, fields: Optional[List[str]] = None,
+                      offers_limit: Optional[int] = None, sort_by: Optional[str] = None) -> Dict[str, Any]:
+    """Find the stores nearest to a position, optionally with their offers.
+
+    Returns up to limit stores within radius_km of lat/lon, closest first;
+    chains filters by chain name. Only the stores in the store location
+    dataset are searched. The bundled one lists the physical stores whose
+    offers this server can fetch, the Willys and ICA locations in
+    constants.json; City Gross offers are online-only, so it has no stores
+    there. Chains without any listed store are named in "missing_chains".
+    With include_offers the offers of every store found are fetched in the
+    same call; fields, offers_limit (items per store) and sort_by shape them
+    as in get_all_grocery_offers. The location_id of a store can also be
+    passed to get_store_offers.
+    """
+    max_radius = CONSTANTS['common']['storeLocations']['maxRadiusKm']
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return {"error": "lat must be between -90 and 90 and lon between -180 and 180"}
+    if not 0 < radius_km <= max_radius:
+        return {"error": f"radius_km must be greater than 0 and at most {max_radius:g}"}
+    if limit < 1:
+        return {"error": "limit must be at least 1"}
+    store_keys = None
+    if chains:
+        store_keys = [_resolve_store_key(chain) for chain in chains]
+        unknown = [chain for chain, store_key in zip(chains, store_keys) if store_key is None]
+        if unknown:
+            return {"error": f"Stores {unknown} not supported. Available stores: {_available_stores()}"}
+    view, error = _offer_view(fields, offers_limit, sort_by, None)
+    if error:
+        return error
     try:
-        async with httpx.AsyncClient() as client:
-            ica_config = CONSTANTS['stores']['ica']
-            headers = ica_config['api']['headers']
-            
-            # Use the real ICA API endpoint for Sundbyberg store
-            url = ica_config['api']['baseUrl'] + ica_config['api']['endpoints']['assortment']
-            params = ica_config['api']['defaultParams']
-            
-            items = []
-            
-            try:
-                response = await client.post(url, headers=headers, params=params, json={}, timeout=ica_config['api']['timeout'] / 1000.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Parse the real ICA API response structure
-                    products = []
-                    if 'data' in data:
-                        # Look for products in the data structure
-                        if 'products' in data['data']:
-                            products = data['data']['products']
-                        elif 'items' in data['data']:
-                            products = data['data']['items']
-                        elif 'offers' in data['data']:
-                            products = data['data']['offers']
-                        elif isinstance(data['data'], list):
-                            products = data['data']
-                    elif 'products' in data:
-                        products = data['products']
-                    elif 'items' in data:
-                        products = data['items']
-                    elif isinstance(data, list):
-                        products = data
-                    
-                    for product in products[:30]:  # Limit to 30 items
-                        if isinstance(product, dict):
-                            # Extract product information from ICA API structure
-                            name = product.get('name', product.get('title', product.get('productName', 'ICA Product')))
-                            
-                            # Handle ICA pricing structure
-                            price_info = product.get('price', {})
-                            current_price = price_info.get('current', product.get('currentPrice', ''))
-                            original_price = price_info.get('original', product.get('originalPrice', ''))
-                            unit = price_info.get('unit', product.get('unit', 'st'))
-                            
-                            # Handle discounts/offers
-                            offer_info = product.get('offer', {})
-                            discount_text = offer_info.get('text', product.get('discount', ''))
-                            
-                            # Extract numeric price values
-                            current_price_val = extract_price_value(str(current_price))
-                            original_price_val = extract_price_value(str(original_price))
-                            
-                            item = {
-                                "name": name,
-                                "price": f"{current_price} kr/{unit}" if current_price else "",
-                                "price_value": current_price_val,
-                                "original_price": f"{original_price} kr/{unit}" if original_price and original_price != current_price else "",
-                                "discount": discount_text or (f"Save {original_price_val - current_price_val:.2f} kr" if original_price_val > current_price_val > 0 else ""),
-                                "description": product.get('description', product.get('brand', '')),
-                                "category": product.get('category', 'ICA'),
-                                "brand": product.get('brand', product.get('manufacturer', 'ICA')),
-                                "unit": unit,
-                                "availability": "available"
-                            }
-                            items.append(item)
-                
-                working_url = f"{url}?accountNumber={params['accountNumber']}&channel={params['channel']}"
-            except Exception as e:
-                working_url = None
-            
-            return {
-                "store_name": ica_config['name'],
-                "store_id": ica_config['id'],
-                "items": items,
-                "item_count": len(items),
-                "source_url": working_url or "Real ICA API endpoint failed",
-                "note": f"Data from real ICA API for {ica_config['storeInfo']['location']} store" if items else "No offers found from real ICA API"
-            }
-            
-    except Exception as e:
-        ica_config = CONSTANTS['stores']['ica']
-        return {
-            "store_name": ica_config['name'],
-            "store_id": ica_config['id'],
-            "items": [],
-            "item_count": 0,
-            "error": str(e),
+        index = _store_locations()
+    except (OSError, ValueError) as e:
+        return {"error": f"Store locations unavailable: {e}"}
+
+    stores = []
+    targets = []
+    for distance, store in index.nearest(lat, lon, radius_km, store_keys, limit):
+        store_key = store['chain']
+        chain_config = CONSTANTS['stores'][store_key]
+        offers_location = _offers_location(store_key, store)
+        store_config = _store_config(store_key, offers_location) if offers_location is not None else None
+        entry = {
+            "chain": chain_config.get('chainName', chain_config['name']),
+            "location_id": str(store['id']),
+            "store_name": store.get('storeName', f"{chain_config['name']} {store['name']}"),
+            "address": store.get('address'),
+            "city": store.get('city'),
+            "lat": store['lat'],
+            "lon": store['lon'],
+            "distance_km": round(distance, 2),
+            "offers_store_id": store_config['id'] if store_config else None,
         }
+        stores.append(entry)
+        if include_offers and store_config is not None and (store_key, offers_location) not in targets:
+            targets.append((store_key, offers_location))
+
+    response = {"stores": stores, "store_count": len(stores), "radius_km": radius_km}
+    missing = [store_key for store_key in (store_keys or CONSTANTS['stores']) if not index.chains.get(store_key)]
+    if missing:
+        response["missing_chains"] = [
+            CONSTANTS['stores'][store_key].get('chainName', CONSTANTS['stores'][store_key]['name'])
+            for store_key in dict.fromkeys(missing)
+        ]
+    if include_offers:
+        # Stores sharing an offers location (e.g. a chain's online offers) share one result
+        offers, timed_out = await _fetch_targets(targets)
+        try:
+            response["offers"] = [view.render(store) for store in offers]
+        except ValueError as e:
+            return {"error": str(e)}
+        response["partial"] = bool(timed_out)
+        response["timed_out_stores"] = timed_out
+    return response
+
+def _chain_locations():
+    """Yield (store_key, store_config) for every configured chain location"""
+    for store_key, chain_config in CONSTANTS['stores'].items():
+        for location in chain_config['locations']:
+            yield store_key, _store_config(store_key, location['id'])
+
+def _store_names() -> Dict[str, str]:
+    """Map store ids of every location to display names"""
+    return {store_config['id']: store_config['name'] for _, store_config in _chain_locations()}
+
+def _store_ids(stores: Optional[List[str]]):
+    """Map store names to the ids of their locations; returns (ids, error response)"""
+    if not stores:
+        return None, None
+    store_keys = [_resolve_store_key(store) for store in stores]
+    unknown = [store for store, store_key in zip(stores, store_keys) if store_key is None]
+    if unknown:
+        return None, {"error": f"Stores {unknown} not supported. Available stores: {_available_stores()}"}
+    return [store_config['id'] for store_key, store_config in _chain_locations() if store_key in store_keys], None
 
 @mcp.tool()
-async def get_all_grocery_offers() -> Dict[str, Any]:
-    """Get all current grocery offers from all stores"""
+async def search_offers(query: str, stores: Optional[List[str]] = None,
+                        max_price: Optional[float] = None, limit: int = 20) -> Dict[str, Any]:
+    """Search cached offers by name, brand, category or description.
     
-    # Get offers from all stores
-    city_gross_data = await get_city_gross_offers()
-    willys_data = await get_willys_offers()
-    ica_data = await get_ica_offers()
+    Matches Swedish text regardless of diacritics, by word prefix and by
+    compound part (e.g. "filé" finds "Kycklingfilé"). Only offers already
+    fetched by the other tools are searched; no store API is called.
+    """
+    store_ids, error = _store_ids(stores)
+    if error:
+        return error
     
-    all_offers = {
-        "stores": [city_gross_data, willys_data, ica_data],
-        "total_items": (
-            city_gross_data["item_count"] + 
-            willys_data["item_count"] + 
-            ica_data["item_count"]
-        ),
-        "data_source": "real_apis"
+    store_names = _store_names()
+    results = []
+    for score, offer in search_index.search(query, set(store_ids) if store_ids else None, max_price, limit):
+        item = offer.to_dict()
+        item.update(store_name=store_names.get(offer.store_id, offer.store_id), store_id=offer.store_id, score=score)
+        results.append(item)
+    
+    response = {
+        "query": query,
+        "results": results,
+        "result_count": len(results),
+        "indexed_offers": len(search_index),
+        "indexed_at": {
+            store_id: datetime.fromtimestamp(updated_at).isoformat(timespec='seconds')
+            for store_id, updated_at in search_index.updated_at.items()
+        },
     }
+    if not len(search_index):
+        response["note"] = "No offers cached yet - call get_all_grocery_offers to load them"
+    return response
+
+@mcp.tool()
+async def compare_prices(query: Optional[str] = None, min_stores: int = 2, limit: int = 20) -> Dict[str, Any]:
+    """Compare prices of the same product across stores.
     
-    return all_offers
+    Products are matched across City Gross, Willys and ICA by normalized
+    name, brand and package size whenever store offers are refreshed. Each
+    group lists the per-store price and unit price, cheapest first.
+    """
+    store_names = _store_names()
+    groups = product_matcher.find(query, max(min_stores, 2))
+    
+    comparisons = []
+    for group in groups[:limit]:
+        offers = []
+        for offer, (unit_price, unit_price_unit) in zip(group.offers, group.prices):
+            offers.append({
+                "store_name": store_names.get(offer.store_id, offer.store_id),
+                "store_id": offer.store_id,
+                "name": offer.name,
+                "brand": offer.brand,
+                "price_value": offer.price,
+                "unit_price": unit_price,
+                "unit_price_unit": unit_price_unit,
+            })
+        comparisons.append({
+            "product": group.name,
+            "package_size": f"{group.volume[0]:g} {group.volume[1]}" if group.volume else "",
+            "cheapest_store": offers[0]["store_name"],
+            "price_spread": round(group.price_spread, 2),
+            "offers": offers,
+        })
+    
+    response = {
+        "query": query,
+        "products": comparisons,
+        "product_count": len(comparisons),
+        "matched_groups": len(product_matcher.groups),
+    }
+    if not len(search_index):
+        response["note"] = "No offers cached yet - call get_all_grocery_offers to load them"
+    return response
 
 @mcp.tool()
-async def get_store_offers(store_name: str) -> Dict[str, Any]:
-    """Get offers from a specific store"""
-    store_name_lower = store_name.lower()
-    
-    if "city gross" in store_name_lower or "citygross" in store_name_lower:
-        return await get_city_gross_offers()
-    elif "willys" in store_name_lower:
-        return await get_willys_offers()
-    elif "ica" in store_name_lower:
-        return await get_ica_offers()
-    else:
+async def plan_basket(ingredients: List[str], max_stores: int = 1) -> Dict[str, Any]:
+    """Find the cheapest store, or split across up to 3 stores, for a recipe.
+    
+    Each ingredient is matched against the cached offers of every store, and
+    the plan covering the most ingredients at the lowest total is returned
+    together with the items it chose and a few alternatives. Chains not
+    cached yet are fetched first; any that could not be loaded are listed
+    under missing_stores.
+    """
+    if not 1 <= max_stores <= len(CONSTANTS['stores']):
+        return {"error": f"max_stores must be between 1 and {len(CONSTANTS['stores'])}"}
+    if not ingredients:
+        return {"error": "No ingredients given"}
+    
+    # Load each chain's default location that has not been indexed yet
+    defaults = [(store_key, _store_config(store_key)['id']) for store_key in CONSTANTS['stores']]
+    unindexed = [(store_key, None) for store_key, store_id in defaults if store_id not in search_index.updated_at]
+    if unindexed:
+        await _fetch_targets(unindexed)
+    
+    store_names = _store_names()
+    store_ids = sorted(search_index.updated_at)
+    plans = []
+    for store_plan in basket.plan(search_index, ingredients, store_ids, max_stores):
+        items = []
+        for ingredient, offer in store_plan['items']:
+            item = offer.to_dict()
+            item.update(ingredient=ingredient, store_name=store_names.get(offer.store_id, offer.store_id), store_id=offer.store_id)
+            items.append(item)
+        plans.append({
+            "stores": [store_names.get(store_id, store_id) for store_id in store_plan['store_ids']],
+            "total": store_plan['total'],
+            "covered_ingredients": store_plan['covered'],
+            "missing_ingredients": store_plan['missing'],
+            "items": items,
+        })
+    
+    return {
+        "ingredients": ingredients,
+        "max_stores": max_stores,
+        "best_plan": plans[0] if plans else None,
+        "alternatives": plans[1:],
+        "missing_stores": [
+            store_names.get(store_id, store_id) for _, store_id in defaults if store_id not in search_index.updated_at
+        ],
+    }
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+def _history_unavailable() -> Dict[str, Any]:
+    return {"error": "Price history is disabled; set common.history.enabled in constants.json"}
+
+@mcp.tool()
+async def price_history(product: str, stores: Optional[List[str]] = None, days: Optional[int] = None,
+                        limit: int = 5) -> Dict[str, Any]:
+    """Show how a product's price developed over past snapshots.
+    
+    Every store snapshot the server fetches is kept in a local database;
+    this returns per-day (weekly for older data) average and range of the
+    unit price, plus the recent individual price changes, for the products
+    matching the query in each store.
+    """
+    history = _history_store()
+    if history is None:
+        return _history_unavailable()
+    store_ids, error = _store_ids(stores)
+    if error:
+        return error
+    since = int(time.time()) - days * 86400 if days else None
+    store_names = _store_names()
+    products = []
+    for row in history.find_products(product, store_ids, limit):
+        series = history.series(row['id'], since)
+        buckets = series['rollups']
+        changes = []
+        for observed_at, price, unit_price, original_price in series['observations']:
+            if not changes or changes[-1]['price_value'] != price:
+                changes.append({
+                    "observed_at": _iso(observed_at),
+                    "price_value": price,
+                    "unit_price_value": unit_price,
+                    "original_price_value": original_price,
+                })
+        samples = sum(bucket[2] for bucket in buckets)
+        products.append({
+            "name": row['name'],
+            "store_name": store_names.get(row['store_id'], row['store_id']),
+            "store_id": row['store_id'],
+            "unit": row['unit'],
+            "first_seen": _iso(row['first_seen']),
+            "last_seen": _iso(row['last_seen']),
+            "last_price_value": row['last_price'],
+            "last_unit_price_value": row['last_unit_price'],
+            "average_unit_price": round(sum(bucket[4] * bucket[2] for bucket in buckets) / samples, 2) if samples else None,
+            "lowest_unit_price": min((bucket[5] for bucket in buckets), default=None),
+            "highest_unit_price": max((bucket[6] for bucket in buckets), default=None),
+            "history": [
+                {
+                    "date": datetime.fromtimestamp(start, timezone.utc).date().isoformat(),
+                    "period": "day" if bucket_days == 1 else "week",
+                    "samples": count,
+                    "average_price": round(average_price, 2),
+                    "average_unit_price": round(average_unit_price, 2),
+                    "min_unit_price": lowest,
+                    "max_unit_price": highest,
+                }
+                for start, bucket_days, count, average_price, average_unit_price, lowest, highest in buckets
+            ],
+            "recent_changes": changes,
+        })
+    response = {"product": product, "products": products, "product_count": len(products)}
+    if not products:
+        response["note"] = "No history for this product yet; history grows with every store refresh"
+    return response
+
+@mcp.tool()
+async def best_deals(store: str, vs_average: bool = True, limit: int = 20,
+                     location: Optional[str] = None) -> Dict[str, Any]:
+    """Find the offers in a store's latest snapshot that are actually cheap.
+    
+    With vs_average the current unit price is compared with the product's
+    own average over the recorded history (common.history.averageDays);
+    otherwise offers are ranked by their discount from the regular price.
+    """
+    history = _history_store()
+    if history is None:
+        return _history_unavailable()
+    store_key = _resolve_store_key(store)
+    if store_key is None:
+        return {"error": f"Store '{store}' not supported. Available stores: {_available_stores()}"}
+    store_config = _store_config(store_key, location)
+    if store_config is None:
+        return _location_error(store_key, location)
+    
+    settings = CONSTANTS['common']['history']
+    observed_at = history.latest_snapshot(store_config['id'])
+    deals = history.deals(store_config['id'], settings['averageDays'], vs_average,
+                          settings['minDaysForAverage'], limit)
+    for deal in deals:
+        deal["first_seen"] = _iso(deal["first_seen"])
+    response = {
+        "store_name": store_config['name'],
+        "store_id": store_config['id'],
+        "vs_average": vs_average,
+        "snapshot_at": _iso(observed_at) if observed_at else None,
+        "deals": deals,
+        "deal_count": len(deals),
+    }
+    if observed_at is None:
+        response["note"] = f"No {store_config['name']} snapshot recorded yet - fetch its offers first"
+    elif not deals and vs_average:
+        response["note"] = (f"No offer is below its average yet; averages need at least "
+                            f"{settings['minDaysForAverage']} days of history")
+    return response
+
+@mcp.tool()
+async def get_refresh_status() -> Dict[str, Any]:
+    """Show when each store was last refreshed by the background scheduler"""
+    if scheduler is None:
         return {
-            "error": f"Store '{store_name}' not supported. Available stores: City Gross, Willys, ICA"
+            "enabled": False,
+            "note": "Background refresh is disabled; set common.scheduler.enabled in constants.json",
         }
+    return {"enabled": True, "stores": scheduler.status()}
+
+@mcp.resource("metrics://stores", mime_type="application/json")
+def store_metrics() -> str:
+    """Per-store upstream latency, response size, parse time, item, cache and error metrics"""
+    return json.dumps(dict(metrics.snapshot(), circuits=circuit_status()), indent=2)
 
+@mcp.resource("metrics://stores/prometheus", mime_type="text/plain")
+def store_metrics_prometheus() -> str:
+    """The per-store metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP recipe_mcp_circuit_open Whether a store's circuit breaker is open",
+        "# TYPE recipe_mcp_circuit_open gauge",
+    ]
+    for store_id, status in circuit_status().items():
+        lines.append(f'recipe_mcp_circuit_open{{store="{store_id}"}} {int(status["state"] == CircuitBreaker.OPEN)}')
+    return metrics.prometheus() + '\n'.join(lines) + '\n'
 
-def main():
+# CLI transport names mapped to FastMCP's
+TRANSPORTS = {'stdio': 'stdio', 'http': 'streamable-http', 'sse': 'sse'}
+
+def main(argv: Optional[List[str]] = None):
     """Main entry point for the MCP server"""
-    mcp.run(transport='stdio')
+    settings = CONSTANTS['common']['server']
+    parser = argparse.ArgumentParser(
+        prog='recipe-mcp',
+        description="Grocery offers MCP server. Over http or sse one process serves many clients, "
+                    "which share its connection pool and cached offers.")
+    parser.add_argument('--transport', choices=list(TRANSPORTS), default='stdio')
+    parser.add_argument('--host', default=settings['host'], help="address to listen on (http/sse)")
+    parser.add_argument('--port', type=int, default=settings['port'], help="port to listen on (http/sse)")
+    parser.add_argument('--workers', type=int, default=settings['workers'],
+                        help="tool calls served at once across all sessions; 0 for no limit")
+    args = parser.parse_args(argv)
+    if args.workers < 0:
+        parser.error("--workers must not be negative")
+    
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.workers = args.workers
+    mcp.run(transport=TRANSPORTS[args.transport])
 
 
 if __name__ == "__main__":
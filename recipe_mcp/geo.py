@@ -0,0 +1,99 @@
+"""
+Nearest-store lookup over store locations.
+
+Locations are bucketed into a grid of square cells (in degrees, cell_km
+high). A query only measures the stores in the cells its radius overlaps,
+so a lookup touches a handful of stores however many are indexed.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import json
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+REQUIRED_FIELDS = ('chain', 'id', 'name', 'lat', 'lon')
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def load_store_locations(path: str) -> List[Dict[str, Any]]:
+    """Read a store location dataset; raises ValueError on malformed entries"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stores = json.load(f)['stores']
+    for index, store in enumerate(stores):
+        missing = [field for field in REQUIRED_FIELDS if field not in store]
+        if missing:
+            raise ValueError(f"{path}: store {index} is missing {', '.join(missing)}")
+        if not (-90 <= store['lat'] <= 90 and -180 <= store['lon'] <= 180):
+            raise ValueError(f"{path}: store {index} has invalid coordinates")
+    return stores
+
+
+class StoreLocationIndex:
+    """Grid index of store locations, queried by distance"""
+
+    def __init__(self, cell_km: float = 5.0):
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        self._columns = math.ceil(360 / self.cell_degrees)
+        self._cells: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        self._by_id: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Stores per chain
+        self.chains: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees),
+                math.floor((lon + 180) / self.cell_degrees) % self._columns)
+
+    def add(self, store: Dict[str, Any]) -> None:
+        self._cells.setdefault(self._cell(store['lat'], store['lon']), []).append(store)
+        self._by_id[(store['chain'], str(store['id']))] = store
+        self.chains[store['chain']] = self.chains.get(store['chain'], 0) + 1
+
+    def extend(self, stores: Iterable[Dict[str, Any]]) -> None:
+        for store in stores:
+            self.add(store)
+
+    def get(self, chain: str, store_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get((chain, str(store_id)))
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> Iterable[Dict[str, Any]]:
+        lat_span = radius_km / KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles; size the box for its widest latitude
+        widest = min(89.9, abs(lat) + lat_span)
+        lon_span = lat_span / math.cos(math.radians(widest))
+        rows = range(math.floor((lat - lat_span) / self.cell_degrees),
+                     math.floor((lat + lat_span) / self.cell_degrees) + 1)
+        first = math.floor((lon - lon_span + 180) / self.cell_degrees)
+        columns = min(self._columns, math.floor((lon + lon_span + 180) / self.cell_degrees) - first + 1)
+        if len(rows) * columns > len(self._cells):
+            # Fewer occupied cells than cells in the box: scanning them all is cheaper
+            for stores in self._cells.values():
+                yield from stores
+            return
+        for row in rows:
+            for column in range(first, first + columns):
+                yield from self._cells.get((row, column % self._columns), ())
+
+    def nearest(self, lat: float, lon: float, radius_km: float, chains: Optional[Iterable[str]] = None,
+                limit: int = 10) -> List[Tuple[float, Dict[str, Any]]]:
+        """The closest stores within radius_km, as (distance in km, store) pairs"""
+        chains = set(chains) if chains is not None else None
+        matches = []
+        for store in self._candidates(lat, lon, radius_km):
+            if chains is not None and store['chain'] not in chains:
+                continue
+            distance = haversine_km(lat, lon, store['lat'], store['lon'])
+            if distance <= radius_km:
+                matches.append((distance, store))
+        return heapq.nsmallest(limit, matches, key=lambda match: match[0])
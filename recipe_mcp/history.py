@@ -0,0 +1,287 @@
+"""
+Local price history of every store snapshot.
+
+Offers are keyed per store by their normalized brand, name and package size.
+Each snapshot adds one raw observation per product and folds it into that
+product's daily rollup, so averages never need the raw rows. Writes are
+buffered and flushed in one transaction per batch. Compaction drops raw
+observations after rawDays and merges daily rollups into weekly ones after
+dailyDays, keeping the database small after months of snapshots.
+
+Tables:
+- products: one row per (product_key, store_id) with its latest observation
+- observations: raw (product, time, price) rows, primary key (product_id, observed_at)
+  (original_price is the regular price per item, comparable with unit_price)
+- rollups: per product and day (or week) sample count, price sums and range
+- snapshots: when each store was observed and how many offers it had
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import sqlite3
+import time
+
+from .matching import normalize_name
+from .models import Offer
+from .prices import parse_volume
+from .search import tokenize
+
+DAY = 86400
+WEEK = 7 * DAY
+# 1970-01-05 was a Monday, so weekly buckets start on Mondays (UTC)
+_WEEK_ORIGIN = 4 * DAY
+
+# Seconds between compaction runs
+COMPACT_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    product_key TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    unit TEXT NOT NULL DEFAULT '',
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    last_price REAL,
+    last_unit_price REAL,
+    last_original_price REAL,
+    UNIQUE (product_key, store_id)
+);
+CREATE INDEX IF NOT EXISTS products_store_seen ON products (store_id, last_seen);
+CREATE TABLE IF NOT EXISTS observations (
+    product_id INTEGER NOT NULL,
+    observed_at INTEGER NOT NULL,
+    price REAL NOT NULL,
+    unit_price REAL NOT NULL,
+    original_price REAL,
+    PRIMARY KEY (product_id, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_time ON observations (observed_at);
+CREATE TABLE IF NOT EXISTS rollups (
+    product_id INTEGER NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    bucket_days INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    price_sum REAL NOT NULL,
+    unit_price_sum REAL NOT NULL,
+    min_unit_price REAL NOT NULL,
+    max_unit_price REAL NOT NULL,
+    PRIMARY KEY (product_id, bucket_start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollups_time ON rollups (bucket_start);
+CREATE TABLE IF NOT EXISTS snapshots (
+    store_id TEXT NOT NULL,
+    observed_at INTEGER NOT NULL,
+    item_count INTEGER NOT NULL,
+    PRIMARY KEY (store_id, observed_at)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_ROLLUP = """
+INSERT INTO rollups (product_id, bucket_start, bucket_days, samples, price_sum, unit_price_sum,
+                     min_unit_price, max_unit_price)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (product_id, bucket_start) DO UPDATE SET
+    bucket_days = max(bucket_days, excluded.bucket_days),
+    samples = samples + excluded.samples,
+    price_sum = price_sum + excluded.price_sum,
+    unit_price_sum = unit_price_sum + excluded.unit_price_sum,
+    min_unit_price = min(min_unit_price, excluded.min_unit_price),
+    max_unit_price = max(max_unit_price, excluded.max_unit_price)
+"""
+
+
+def product_key(offer: Offer) -> str:
+    """Identify a product within a store by brand, name and package size"""
+    key = normalize_name(offer)
+    volume = parse_volume(f"{offer.name} {offer.description}")
+    return f"{key} {volume[0]:g}{volume[1]}" if volume else key
+
+
+def week_start(timestamp: int) -> int:
+    return (timestamp - _WEEK_ORIGIN) // WEEK * WEEK + _WEEK_ORIGIN
+
+
+class PriceHistory:
+    """SQLite store of price observations with batched writes"""
+
+    def __init__(self, path: str, batch_size: int = 2000, flush_seconds: float = 60,
+                 raw_days: int = 7, daily_days: int = 180):
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.raw_days = raw_days
+        self.daily_days = daily_days
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        # (store_id, observed_at, [(key, offer)]) waiting to be written
+        self._pending: List[Tuple[str, int, List[Tuple[str, Offer]]]] = []
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        self._last_compact = 0.0
+        self._ids: Dict[Tuple[str, str], int] = {}
+
+    def record(self, store_id: str, offers: Iterable[Offer], observed_at: Optional[float] = None) -> None:
+        """Queue a store snapshot; it is written once the batch is full or old enough"""
+        products: Dict[str, Offer] = {}
+        for offer in offers:
+            if offer.price > 0:
+                # A product listed twice in one snapshot counts once, at its lower price
+                key = product_key(offer)
+                if key not in products or offer.unit_price < products[key].unit_price:
+                    products[key] = offer
+        self._pending.append((store_id, int(observed_at or time.time()), list(products.items())))
+        self._pending_rows += len(products)
+        if self._pending_rows >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def _product_ids(self, store_id: str, rows: List[Tuple[str, Offer]], observed_at: int) -> List[int]:
+        missing = [(key, offer) for key, offer in rows if (key, store_id) not in self._ids]
+        if missing:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO products (product_key, store_id, name, unit, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, store_id, offer.name, offer.unit, observed_at, observed_at) for key, offer in missing])
+            for product_id, key in self.db.execute(
+                    "SELECT id, product_key FROM products WHERE store_id = ?", (store_id,)):
+                self._ids[(key, store_id)] = product_id
+        return [self._ids[(key, store_id)] for key, _ in rows]
+
+    def flush(self) -> None:
+        """Write every queued snapshot in one transaction"""
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        self.db.execute("BEGIN")
+        try:
+            for store_id, observed_at, rows in pending:
+                ids = self._product_ids(store_id, rows, observed_at)
+                offers = [offer for _, offer in rows]
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?)",
+                    [(product_id, observed_at, offer.price, offer.unit_price, offer.regular_price)
+                     for product_id, offer in zip(ids, offers)])
+                day = observed_at - observed_at % DAY
+                self.db.executemany(
+                    _UPSERT_ROLLUP,
+                    [(product_id, day, 1, 1, offer.price, offer.unit_price, offer.unit_price, offer.unit_price)
+                     for product_id, offer in zip(ids, offers)])
+                self.db.executemany(
+                    "UPDATE products SET name = ?, unit = ?, last_seen = ?, last_price = ?, last_unit_price = ?, "
+                    "last_original_price = ? WHERE id = ? AND last_seen <= ?",
+                    [(offer.name, offer.unit, observed_at, offer.price, offer.unit_price, offer.regular_price,
+                      product_id, observed_at) for product_id, offer in zip(ids, offers)])
+                self.db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (store_id, observed_at, len(rows)))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            # Ids handed out inside the rolled back transaction no longer exist
+            self._ids.clear()
+            raise
+        if time.monotonic() - self._last_compact >= COMPACT_INTERVAL:
+            self.compact()
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Drop old raw observations and merge old daily rollups into weekly ones"""
+        now = int(now or time.time())
+        self._last_compact = time.monotonic()
+        weekly_before = week_start(now - self.daily_days * DAY)
+        self.db.execute("BEGIN")
+        try:
+            self.db.execute("DELETE FROM observations WHERE observed_at < ?", (now - self.raw_days * DAY,))
+            merged = self.db.execute(
+                "SELECT product_id, (bucket_start - ?) / ? * ? + ?, 7, SUM(samples), SUM(price_sum), "
+                "SUM(unit_price_sum), MIN(min_unit_price), MAX(max_unit_price) FROM rollups "
+                "WHERE bucket_days = 1 AND bucket_start < ? GROUP BY 1, 2",
+                (_WEEK_ORIGIN, WEEK, WEEK, _WEEK_ORIGIN, weekly_before)).fetchall()
+            self.db.execute("DELETE FROM rollups WHERE bucket_days = 1 AND bucket_start < ?", (weekly_before,))
+            self.db.executemany(_UPSERT_ROLLUP, merged)
+            self.db.execute("DELETE FROM snapshots WHERE observed_at < ?", (now - self.daily_days * DAY,))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def find_products(self, query: str, store_ids: Optional[List[str]] = None,
+                      limit: int = 10) -> List[sqlite3.Row]:
+        """Products whose key contains every query token, most recently seen first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.flush()
+        sql = "SELECT * FROM products WHERE " + " AND ".join("product_key LIKE ?" for _ in tokens)
+        params: List[Any] = [f"%{token}%" for token in tokens]
+        if store_ids:
+            sql += f" AND store_id IN ({', '.join('?' for _ in store_ids)})"
+            params.extend(store_ids)
+        sql += " ORDER BY last_seen DESC, length(product_key) LIMIT ?"
+        params.append(limit)
+        cursor = self.db.execute(sql, params)
+        cursor.row_factory = sqlite3.Row
+        return cursor.fetchall()
+
+    def series(self, product_id: int, since: Optional[int] = None) -> Dict[str, List[Tuple]]:
+        """A product's rollup buckets and recent raw observations, oldest first"""
+        since = since or 0
+        rollups = self.db.execute(
+            "SELECT bucket_start, bucket_days, samples, price_sum / samples, unit_price_sum / samples, "
+            "min_unit_price, max_unit_price FROM rollups WHERE product_id = ? AND bucket_start >= ? "
+            "ORDER BY bucket_start", (product_id, since)).fetchall()
+        observations = self.db.execute(
+            "SELECT observed_at, price, unit_price, original_price FROM observations "
+            "WHERE product_id = ? AND observed_at >= ? ORDER BY observed_at", (product_id, since)).fetchall()
+        return {"rollups": rollups, "observations": observations}
+
+    def latest_snapshot(self, store_id: str) -> Optional[int]:
+        self.flush()
+        row = self.db.execute("SELECT MAX(observed_at) FROM snapshots WHERE store_id = ?", (store_id,)).fetchone()
+        return row[0]
+
+    def deals(self, store_id: str, average_days: int, vs_average: bool = True, min_days: int = 3,
+              limit: int = 20) -> List[Dict[str, Any]]:
+        """Offers of a store's latest snapshot, ranked by how far they are below their average or regular price"""
+        observed_at = self.latest_snapshot(store_id)
+        if observed_at is None:
+            return []
+        since = observed_at - average_days * DAY
+        rows = self.db.execute(
+            "SELECT p.id, p.name, p.unit, p.last_price, p.last_unit_price, p.last_original_price, p.first_seen, "
+            "       AVG(r.unit_price_sum / r.samples), MIN(r.min_unit_price), COUNT(r.bucket_start) "
+            "FROM products p JOIN rollups r ON r.product_id = p.id AND r.bucket_start >= ? "
+            "WHERE p.store_id = ? AND p.last_seen = ? GROUP BY p.id",
+            (since, store_id, observed_at)).fetchall()
+        deals = []
+        for (_, name, unit, price, unit_price, original_price, first_seen,
+             average, lowest, buckets) in rows:
+            if vs_average:
+                if buckets < min_days or not average or unit_price >= average:
+                    continue
+                below = (average - unit_price) / average
+            else:
+                if not original_price or original_price <= unit_price:
+                    continue
+                below = (original_price - unit_price) / original_price
+            deals.append({
+                "name": name,
+                "unit": unit,
+                "price_value": price,
+                "unit_price_value": unit_price,
+                "original_price_value": original_price,
+                "average_unit_price": round(average, 2),
+                "lowest_unit_price": lowest,
+                "below_percent": round(below * 100, 1),
+                "days_observed": buckets,
+                "first_seen": first_seen,
+            })
+        deals.sort(key=lambda deal: deal["below_percent"], reverse=True)
+        return deals[:limit]
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
@@ -0,0 +1,206 @@
+"""
+Incremental JSON decoding of upstream responses.
+
+StreamDecoder is fed the response body chunk by chunk. It walks only the
+objects leading to the configured items path; every other value, and every
+element of the items array, is decoded whole by the C scanner as soon as it is
+complete. Elements are handed to a transform (the store normalizer) one at a
+time and never kept as raw JSON, so memory stays flat in the size of the page
+and the first offer is ready before the body has finished downloading.
+"""
+
+from typing import Any, Callable, List, Optional, Sequence
+import codecs
+import json
+import re
+
+Transform = Callable[[Any], Any]
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+# Characters a number or literal can continue with in the next chunk
+_SCALAR_TAIL_RE = re.compile(r'[0-9a-zA-Z.+-]*')
+_scanner = json.JSONDecoder()
+
+# Consumed text is dropped from the buffer once it grows past this many characters
+_TRIM_AT = 1 << 16
+
+# Parser states of an open object or array
+_KEY, _COLON, _VALUE, _NEXT = range(4)
+
+
+class BufferedDecoder:
+    """Collect the whole body and decode it in one go"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+
+    def close(self) -> Any:
+        return json.loads(b''.join(self._chunks))
+
+
+class _Frame:
+    __slots__ = ('container', 'path', 'is_items', 'state', 'key')
+
+    def __init__(self, container: Any, path: str, is_items: bool = False):
+        self.container = container
+        self.path = path
+        self.is_items = is_items
+        self.state = _KEY if isinstance(container, dict) else _VALUE
+        self.key: Optional[str] = None
+
+
+class StreamDecoder:
+    """Decode a JSON document incrementally, streaming the items array.
+
+    item_paths are dotted paths ('' for the document itself) where the items
+    array may live; the first one found is streamed. Each element is passed
+    through transform and kept only if the result is not None. close()
+    returns the document with the items array holding the transformed items.
+    """
+
+    def __init__(self, item_paths: Sequence[str], transform: Optional[Transform] = None):
+        self.item_paths = set(item_paths)
+        self.transform = transform
+        self.items_path: Optional[str] = None
+        self.item_count = 0
+        # Every object on the way to an items path is walked rather than decoded whole
+        self._prefixes = set()
+        for path in item_paths:
+            parts = path.split('.') if path else []
+            for end in range(len(parts)):
+                self._prefixes.add('.'.join(parts[:end]))
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._root: Any = None
+        self._done = False
+
+    def feed(self, chunk: bytes) -> None:
+        """Consume the next chunk of the body"""
+        self._buffer += self._text.decode(chunk)
+        self._parse(final=False)
+
+    def close(self) -> Any:
+        """Finish decoding and return the document"""
+        self._buffer += self._text.decode(b'', final=True)
+        self._parse(final=True)
+        if not self._done:
+            raise ValueError("Incomplete JSON document")
+        return self._root
+
+    def _attach(self, value: Any) -> None:
+        if not self._stack:
+            self._root = value
+            self._done = True
+            return
+        frame = self._stack[-1]
+        if frame.is_items:
+            if self.transform is not None:
+                value = self.transform(value)
+                if value is None:
+                    frame.state = _NEXT
+                    return
+            self.item_count += 1
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+        frame.state = _NEXT
+
+    def _value(self, path: str, final: bool) -> bool:
+        """Start or decode the value at the current position; False if more input is needed"""
+        char = self._buffer[self._pos]
+        if char == '[' and path in self.item_paths and self.items_path is None:
+            self.items_path = path
+            frame = _Frame([], path, is_items=True)
+        elif char == '{' and path in self._prefixes:
+            frame = _Frame({}, path)
+        else:
+            try:
+                value, end = _scanner.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if final:
+                    raise
+                return False
+            # A number or literal running to the end of the buffer may continue in the next chunk
+            if (not final and char not in '"{['
+                    and _SCALAR_TAIL_RE.match(self._buffer, end).end() == len(self._buffer)):
+                return False
+            self._pos = end
+            self._attach(value)
+            return True
+        if self._stack:
+            self._attach(frame.container)
+        else:
+            self._root = frame.container
+        self._stack.append(frame)
+        self._pos += 1
+        return True
+
+    def _parse(self, final: bool) -> None:
+        buffer_length = len(self._buffer)
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()
+            if self._pos >= buffer_length:
+                break
+            if self._done:
+                raise ValueError(f"Extra data at position {self._pos}")
+            if not self._stack:
+                if not self._value('', final):
+                    break
+                continue
+
+            frame = self._stack[-1]
+            char = self._buffer[self._pos]
+            is_object = isinstance(frame.container, dict)
+            closing = '}' if is_object else ']'
+            if frame.state == _NEXT:
+                if char == ',':
+                    frame.state = _KEY if is_object else _VALUE
+                    self._pos += 1
+                elif char == closing:
+                    self._stack.pop()
+                    self._pos += 1
+                    if not self._stack:
+                        self._done = True
+                else:
+                    raise ValueError(f"Expected ',' or '{closing}' at position {self._pos}")
+            elif char == closing and (frame.state == _KEY or (frame.state == _VALUE and not is_object)):
+                # Empty container
+                self._stack.pop()
+                self._pos += 1
+                if not self._stack:
+                    self._done = True
+            elif frame.state == _KEY:
+                if char != '"':
+                    raise ValueError(f"Expected object key at position {self._pos}")
+                try:
+                    key, end = _scanner.raw_decode(self._buffer, self._pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+                frame.key = key
+                frame.state = _COLON
+                self._pos = end
+            elif frame.state == _COLON:
+                if char != ':':
+                    raise ValueError(f"Expected ':' at position {self._pos}")
+                frame.state = _VALUE
+                self._pos += 1
+            else:
+                if is_object:
+                    path = f"{frame.path}.{frame.key}" if frame.path else frame.key
+                else:
+                    path = None
+                if not self._value(path, final):
+                    break
+
+            if self._pos > _TRIM_AT:
+                self._buffer = self._buffer[self._pos:]
+                self._pos = 0
+                buffer_length = len(self._buffer)
@@ -0,0 +1,239 @@
+"""
+Cross-store product matching.
+
+Each offer is reduced to a normalized brand-and-name key plus its package size.
+Keys are shingled into character trigrams and summarized with MinHash; LSH
+banding over the signatures yields candidate pairs from different stores,
+which are confirmed by trigram Jaccard similarity and a compatible volume.
+Confirmed pairs are merged into product groups. Offers sharing a key and
+package size are hashed and compared once, as one node, and buckets and
+confirmed pairs are kept between refreshes: a store refresh only hashes and
+compares keys that are new, then regroups, so queries only filter
+precomputed groups.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+import random
+
+from .models import Offer
+from .prices import VOLUME_FACTORS, VOLUME_RE, parse_volume
+from .search import fold, tokenize
+
+# MinHash signature length, split into LSH bands of BAND_ROWS rows each
+NUM_HASHES = 32
+BAND_ROWS = 4
+
+# Minimum trigram Jaccard similarity for two offers to count as one product
+MATCH_THRESHOLD = 0.5
+
+# Each MinHash function is the shingle hash XORed with a fixed random mask
+_rng = random.Random(4711)
+_HASH_MASKS = [_rng.getrandbits(64) for _ in range(NUM_HASHES)]
+
+# Words that describe the offer rather than the product
+_STOP_WORDS = {'ca', 'st', 'pack', 'klass', 'eko', 'ekologisk', 'kr', 'for', 'och'}
+
+
+def normalize_name(offer: Offer) -> str:
+    """Build the comparison key for an offer from its brand and name"""
+    text = VOLUME_RE.sub(' ', fold(f"{offer.brand} {offer.name}"))
+    return ' '.join(token for token in tokenize(text) if token not in _STOP_WORDS and not token.isdigit())
+
+
+def _shingles(text: str) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _minhash(shingles: Set[str]) -> Tuple[int, ...]:
+    hashes = [hash(shingle) & 0xFFFFFFFFFFFFFFFF for shingle in shingles]
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _HASH_MASKS)
+
+
+class _Entry:
+    __slots__ = ('offer', 'key', 'volume')
+
+    def __init__(self, offer: Offer):
+        self.offer = offer
+        self.key = normalize_name(offer)
+        self.volume = parse_volume(f"{offer.name} {offer.description}")
+
+
+class _Node:
+    """The offers of every store sharing one key and package size"""
+
+    __slots__ = ('shingles', 'signature', 'volume', 'entries', 'stores')
+
+    def __init__(self, key: str, volume: Optional[Tuple[float, str]]):
+        self.shingles = _shingles(key)
+        self.signature = _minhash(self.shingles) if self.shingles else ()
+        self.volume = volume
+        self.entries: List[_Entry] = []
+        # Entries per store
+        self.stores: Dict[str, int] = {}
+
+
+def _volumes_compatible(a: Optional[Tuple[float, str]], b: Optional[Tuple[float, str]]) -> bool:
+    if a is None or b is None:
+        return True
+    return a[1] == b[1] and abs(a[0] - b[0]) <= 0.05 * max(a[0], b[0])
+
+
+def _normalized_price(offer: Offer, volume: Optional[Tuple[float, str]]) -> Tuple[float, str]:
+    """An offer's price per kg or litre when it can be worked out, otherwise per unit.
+
+    The offer's own comparison price wins; the group's package size is only
+    applied to per-item prices of offers whose own size is unknown.
+    """
+    if offer.comparison_price:
+        return offer.comparison_price, f"kr/{offer.comparison_unit}"
+    if volume and offer.unit not in VOLUME_FACTORS:
+        amount, base_unit = volume
+        return round(offer.unit_price / amount, 2), f"kr/{base_unit}"
+    return offer.unit_price, f"kr/{offer.unit}"
+
+
+class ProductGroup:
+    """Offers from different stores that appear to be the same product"""
+
+    __slots__ = ('name', 'key', 'volume', 'offers', 'prices')
+
+    def __init__(self, entries: List[_Entry]):
+        self.volume = next((entry.volume for entry in entries if entry.volume), None)
+        # Keep the cheapest offer per store, compared by normalized price
+        cheapest: Dict[str, Tuple[Tuple[float, str], _Entry]] = {}
+        for entry in entries:
+            price = _normalized_price(entry.offer, self.volume)
+            current = cheapest.get(entry.offer.store_id)
+            if current is None or price[0] < current[0][0]:
+                cheapest[entry.offer.store_id] = (price, entry)
+        chosen = sorted(cheapest.values(), key=lambda choice: choice[0][0])
+        self.name = chosen[0][1].offer.name
+        self.key = chosen[0][1].key
+        self.offers = [entry.offer for _, entry in chosen]
+        self.prices = [price for price, _ in chosen]
+
+    @property
+    def store_count(self) -> int:
+        return len(self.offers)
+
+    @property
+    def price_spread(self) -> float:
+        """Difference between the highest and lowest normalized price"""
+        return self.prices[-1][0] - self.prices[0][0]
+
+    def unit_price(self, offer: Offer) -> Tuple[float, str]:
+        """Price per kg or litre when it can be worked out, otherwise per unit"""
+        return self.prices[self.offers.index(offer)]
+
+
+class ProductMatcher:
+    """Precomputed cross-store product groups"""
+
+    def __init__(self):
+        self._entries: Dict[str, List[_Entry]] = {}
+        self._nodes: Dict[Tuple[str, Optional[Tuple[float, str]]], _Node] = {}
+        # Per LSH band: that band of a signature -> the nodes sharing it
+        self._buckets: List[Dict[Tuple[int, ...], Set[_Node]]] = [{} for _ in range(0, NUM_HASHES, BAND_ROWS)]
+        # Confirmed matches, recorded on both nodes
+        self._links: Dict[_Node, Set[_Node]] = {}
+        self.groups: List[ProductGroup] = []
+
+    def update(self, store_id: str, offers: List[Offer]) -> None:
+        """Replace one store's offers and recompute the product groups"""
+        touched = {(entry.key, entry.volume) for entry in self._entries.get(store_id, ())}
+        for node_key in touched:
+            node = self._nodes[node_key]
+            node.entries = [entry for entry in node.entries if entry.offer.store_id != store_id]
+            del node.stores[store_id]
+            if not node.entries:
+                del self._nodes[node_key]
+                self._remove(node)
+        entries = [_Entry(offer) for offer in offers if offer.price > 0]
+        self._entries[store_id] = entries
+        for entry in entries:
+            node = self._nodes.get((entry.key, entry.volume))
+            if node is None:
+                node = self._nodes[(entry.key, entry.volume)] = _Node(entry.key, entry.volume)
+                if node.signature:
+                    self._insert(node)
+            node.entries.append(entry)
+            node.stores[store_id] = node.stores.get(store_id, 0) + 1
+        self._regroup()
+
+    def _bands(self, node: _Node):
+        for buckets, band in zip(self._buckets, range(0, NUM_HASHES, BAND_ROWS)):
+            yield buckets, node.signature[band:band + BAND_ROWS]
+
+    def _remove(self, node: _Node) -> None:
+        if not node.signature:
+            return
+        for buckets, band in self._bands(node):
+            bucket = buckets[band]
+            bucket.discard(node)
+            if not bucket:
+                del buckets[band]
+        for other in self._links.pop(node, ()):
+            links = self._links[other]
+            links.discard(node)
+            if not links:
+                del self._links[other]
+
+    def _insert(self, node: _Node) -> None:
+        # LSH: nodes sharing any band of the signature are candidates
+        checked: Set[_Node] = set()
+        for buckets, band in self._bands(node):
+            bucket = buckets.setdefault(band, set())
+            for other in bucket:
+                if other in checked:
+                    continue
+                checked.add(other)
+                similarity = len(node.shingles & other.shingles) / len(node.shingles | other.shingles)
+                if similarity >= MATCH_THRESHOLD and _volumes_compatible(node.volume, other.volume):
+                    self._links.setdefault(node, set()).add(other)
+                    self._links.setdefault(other, set()).add(node)
+            bucket.add(node)
+
+    def _regroup(self) -> None:
+        """Merge matching offers of different stores into groups.
+
+        Offers only match offers of other stores, so two nodes holding the
+        same single store are not joined directly, and a lone single-store
+        node forms no group.
+        """
+        def joined(a: _Node, b: _Node) -> bool:
+            return len(a.stores) > 1 or len(b.stores) > 1 or a.stores.keys() != b.stores.keys()
+
+        order = {entry: i for i, entry in enumerate(entry for entries in self._entries.values() for entry in entries)}
+        seen: Set[_Node] = set()
+        groups = []
+        for node in self._nodes.values():
+            if node in seen or not node.signature:
+                continue
+            seen.add(node)
+            component = [node]
+            for member in component:
+                for other in self._links.get(member, ()):
+                    if other not in seen and joined(member, other):
+                        seen.add(other)
+                        component.append(other)
+            if len(component) == 1 and len(node.stores) == 1:
+                continue
+            groups.append(sorted((entry for member in component for entry in member.entries), key=order.__getitem__))
+        groups.sort(key=lambda members: order[members[0]])
+        self.groups = [ProductGroup(members) for members in groups]
+
+    def find(self, query: Optional[str] = None, min_stores: int = 2) -> List[ProductGroup]:
+        """Get groups covering at least min_stores stores, optionally filtered by query"""
+        query_terms = tokenize(query) if query else []
+        groups = []
+        for group in self.groups:
+            if group.store_count < min_stores:
+                continue
+            if query_terms:
+                words = set(tokenize(' '.join(offer.name for offer in group.offers))) | set(group.key.split())
+                if not all(any(term in word for word in words) for term in query_terms):
+                    continue
+            groups.append(group)
+        groups.sort(key=lambda group: -group.price_spread)
+        return groups
@@ -0,0 +1,262 @@
+"""
+Per-store performance metrics.
+
+Every upstream request records its latency (excluding body decoding), the
+bytes received and the time spent decoding and normalizing the body. Store
+fetches record item counts and failures, and the offer cache records hits.
+Everything is kept as cumulative counters and fixed-bucket histograms, so
+recording is a few additions and the numbers can be exported as JSON or in
+the Prometheus text format.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import bisect
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def buckets(self) -> List[Tuple[str, int]]:
+        """Cumulative (le, count) pairs as in the Prometheus format"""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            pairs.append((f"{bound:g}", seen))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+class StoreMetrics:
+    """Counters and histograms for one store location"""
+
+    def __init__(self, store_id: str):
+        self.store_id = store_id
+        self.upstream_latency = Histogram()
+        self.responses: Dict[str, int] = {}
+        self.request_errors: Dict[str, int] = {}
+        self.response_bytes = 0
+        self.parse_seconds = 0.0
+        self.fetches = 0
+        self.failed_fetches = 0
+        self.items = 0
+        self.last_item_count = 0
+        self.page_errors = 0
+        self.deadline_misses = 0
+        self.events: Dict[str, int] = {}
+        self.last_error: Optional[str] = None
+        self.cache_hits = 0
+        self.cache_stale_hits = 0
+        self.cache_misses = 0
+
+    def record_response(self, status: str, latency: float, body_bytes: int, parse_seconds: float) -> None:
+        """Record one upstream response (status is fresh, not_modified or stale)"""
+        self.upstream_latency.observe(latency)
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.response_bytes += body_bytes
+        self.parse_seconds += parse_seconds
+
+    def record_request_error(self, error: BaseException) -> None:
+        """Record an upstream request that raised"""
+        kind = type(error).__name__
+        self.request_errors[kind] = self.request_errors.get(kind, 0) + 1
+
+    def record_event(self, event: str) -> None:
+        """Count a failure-policy event such as a retry, hedge or short circuit"""
+        self.events[event] = self.events.get(event, 0) + 1
+
+    def record_fetch(self, result: Dict[str, Any]) -> None:
+        """Record the outcome of fetching a store's offers"""
+        self.fetches += 1
+        self.page_errors += len(result.get('page_errors', []))
+        if result.get('error'):
+            self.failed_fetches += 1
+            self.last_error = result['error']
+            return
+        self.last_item_count = result.get('item_count', 0)
+        self.items += self.last_item_count
+
+    def record_cache(self, cache_info: Dict[str, Any]) -> None:
+        """Record an offer cache lookup"""
+        if not cache_info.get('hit'):
+            self.cache_misses += 1
+        elif cache_info.get('stale'):
+            self.cache_stale_hits += 1
+        else:
+            self.cache_hits += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summarize the store's metrics"""
+        lookups = self.cache_hits + self.cache_stale_hits + self.cache_misses
+        latency = self.upstream_latency
+        return {
+            "store_id": self.store_id,
+            "upstream": {
+                "requests": latency.count,
+                "responses": dict(self.responses),
+                "errors": dict(self.request_errors),
+                "latency_p50_seconds": latency.quantile(0.5),
+                "latency_p90_seconds": latency.quantile(0.9),
+                "latency_p99_seconds": latency.quantile(0.99),
+                "latency_mean_seconds": round(latency.sum / latency.count, 4) if latency.count else None,
+                "latency_buckets": dict(latency.buckets()),
+                "response_bytes": self.response_bytes,
+            },
+            "parse": {
+                "seconds": round(self.parse_seconds, 4),
+                "microseconds_per_item": round(self.parse_seconds / self.items * 1e6, 2) if self.items else None,
+            },
+            "fetches": {
+                "total": self.fetches,
+                "failed": self.failed_fetches,
+                "page_errors": self.page_errors,
+                "deadline_misses": self.deadline_misses,
+                "items": self.items,
+                "last_item_count": self.last_item_count,
+                "last_error": self.last_error,
+            },
+            "policy_events": dict(self.events),
+            "cache": {
+                "hits": self.cache_hits,
+                "stale_hits": self.cache_stale_hits,
+                "misses": self.cache_misses,
+                "hit_ratio": round((self.cache_hits + self.cache_stale_hits) / lookups, 4) if lookups else None,
+            },
+        }
+
+
+class MeteredDecoder:
+    """Wrap a response decoder to time decoding and count body bytes"""
+
+    __slots__ = ('inner', 'seconds', 'bytes')
+
+    def __init__(self, inner: Any):
+        self.inner = inner
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def feed(self, chunk: bytes) -> None:
+        started = time.perf_counter()
+        self.inner.feed(chunk)
+        self.seconds += time.perf_counter() - started
+        self.bytes += len(chunk)
+
+    def close(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return self.inner.close()
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """Metrics of every store location, created on first use"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._stores: Dict[str, StoreMetrics] = {}
+
+    def store(self, store_id: str) -> StoreMetrics:
+        metrics = self._stores.get(store_id)
+        if metrics is None:
+            metrics = self._stores[store_id] = StoreMetrics(store_id)
+        return metrics
+
+    def metered(self, decoder: Callable[[], Any]) -> Tuple[Callable[[], MeteredDecoder], List[MeteredDecoder]]:
+        """Wrap a decoder factory; returns the wrapped factory and the decoders it creates"""
+        created: List[MeteredDecoder] = []
+
+        def make() -> MeteredDecoder:
+            wrapped = MeteredDecoder(decoder())
+            created.append(wrapped)
+            return wrapped
+        return make, created
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All store metrics as a JSON-friendly dict"""
+        return {
+            "since": self.started_at,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "stores": [metrics.snapshot() for metrics in self._stores.values()],
+        }
+
+    def prometheus(self, prefix: str = 'recipe_mcp') -> str:
+        """All store metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> str:
+            full_name = f"{prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            return full_name
+
+        stores = list(self._stores.values())
+        name = family('upstream_latency_seconds', 'histogram', "Upstream request latency, excluding body decoding")
+        for metrics in stores:
+            for le, count in metrics.upstream_latency.buckets():
+                lines.append(f'{name}_bucket{{store="{metrics.store_id}",le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{store="{metrics.store_id}"}} {metrics.upstream_latency.sum:.6f}')
+            lines.append(f'{name}_count{{store="{metrics.store_id}"}} {metrics.upstream_latency.count}')
+        name = family('upstream_responses_total', 'counter', "Upstream responses by cache status")
+        for metrics in stores:
+            for status, count in metrics.responses.items():
+                lines.append(f'{name}{{store="{metrics.store_id}",status="{status}"}} {count}')
+        name = family('upstream_errors_total', 'counter', "Upstream requests that raised, by error type")
+        for metrics in stores:
+            for kind, count in metrics.request_errors.items():
+                lines.append(f'{name}{{store="{metrics.store_id}",kind="{kind}"}} {count}')
+        name = family('policy_events_total', 'counter', "Retries, hedges, short circuits and stale fallbacks")
+        for metrics in stores:
+            for event, count in metrics.events.items():
+                lines.append(f'{name}{{store="{metrics.store_id}",event="{event}"}} {count}')
+
+        counters = (
+            ('response_bytes_total', "Response body bytes received", lambda m: m.response_bytes),
+            ('parse_seconds_total', "Time spent decoding and normalizing bodies", lambda m: round(m.parse_seconds, 6)),
+            ('fetches_total', "Store offer fetches", lambda m: m.fetches),
+            ('failed_fetches_total', "Store offer fetches that ended in an error", lambda m: m.failed_fetches),
+            ('page_errors_total', "Pages that failed within otherwise successful fetches", lambda m: m.page_errors),
+            ('deadline_misses_total', "Stores dropped from a fan-out for missing its deadline", lambda m: m.deadline_misses),
+            ('items_total', "Offers normalized", lambda m: m.items),
+        )
+        for suffix, help_text, value in counters:
+            name = family(suffix, 'counter', help_text)
+            for metrics in stores:
+                lines.append(f'{name}{{store="{metrics.store_id}"}} {value(metrics)}')
+        name = family('last_item_count', 'gauge', "Offers in the latest successful fetch")
+        for metrics in stores:
+            lines.append(f'{name}{{store="{metrics.store_id}"}} {metrics.last_item_count}')
+        name = family('cache_lookups_total', 'counter', "Offer cache lookups by result")
+        for metrics in stores:
+            for result, count in (('hit', metrics.cache_hits), ('stale', metrics.cache_stale_hits), ('miss', metrics.cache_misses)):
+                lines.append(f'{name}{{store="{metrics.store_id}",result="{result}"}} {count}')
+        return '\n'.join(lines) + '\n'
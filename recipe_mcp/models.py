@@ -0,0 +1,98 @@
+"""
+Typed offer model shared by all store adapters.
+
+Prices are parsed to numbers once, when an upstream item is normalized. The
+human-readable strings ("12.9 kr/st", "Save 3.00 kr") are only rendered when
+an offer is serialized for a tool response. The effective per-item price of
+multi-buy offers and the per-kg/per-litre comparison price are worked out at
+the same time.
+"""
+
+from typing import Any, Dict, Optional
+
+from .prices import regular_item_price, unit_prices
+
+
+def format_price(value: float, unit: str) -> str:
+    """Render a numeric price as e.g. '12.9 kr/st'"""
+    return f"{value:g} kr/{unit}" if unit else f"{value:g} kr"
+
+
+class Offer:
+    """A single normalized store offer"""
+
+    __slots__ = (
+        'store_id',
+        'name',
+        'price',
+        'original_price',
+        'regular_price',
+        'unit',
+        'discount',
+        'description',
+        'category',
+        'brand',
+        'availability',
+        'valid_until',
+        'quantity',
+        'unit_price',
+        'comparison_price',
+        'comparison_unit',
+    )
+
+    def __init__(self, store_id: str, name: str, price: float,
+                 original_price: Optional[float] = None, unit: str = 'st',
+                 discount: str = '', description: str = '', category: str = '',
+                 brand: str = '', availability: str = 'available', valid_until: str = '',
+                 multibuy_quantity: int = 1):
+        self.store_id = store_id
+        self.name = name
+        self.price = price
+        self.unit = unit
+        self.discount = discount
+        self.description = description
+        self.category = category
+        self.brand = brand
+        self.availability = availability
+        self.valid_until = valid_until
+        package_text = f"{name} {description}"
+        self.quantity, self.unit_price, self.comparison_price, self.comparison_unit = unit_prices(
+            price, unit, discount, package_text, multibuy_quantity)
+        # The regular price of one item, comparable with unit_price (original_price may be per kg)
+        regular = regular_item_price(original_price, unit, self.quantity, package_text) if original_price else None
+        # Only set when the offer is actually cheaper per item than the regular price
+        if regular and regular > self.unit_price:
+            self.original_price, self.regular_price = original_price, regular
+        else:
+            self.original_price = self.regular_price = None
+
+    def __repr__(self) -> str:
+        return f"Offer({self.store_id!r}, {self.name!r}, {self.price!r})"
+
+    @property
+    def savings(self) -> float:
+        """How much cheaper one item of the offer is than the regular price"""
+        if self.regular_price and self.regular_price > self.unit_price > 0:
+            return round(self.regular_price - self.unit_price, 2)
+        return 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Render the offer in the tool response format"""
+        savings = self.savings
+        return {
+            "name": self.name,
+            "price": format_price(self.price, self.unit) if self.price else "",
+            "price_value": self.price,
+            "original_price": format_price(self.original_price, self.unit) if self.original_price else "",
+            "discount": self.discount or (f"Save {savings:.2f} kr" if savings else ""),
+            "description": self.description,
+            "category": self.category,
+            "brand": self.brand,
+            "unit": self.unit,
+            "availability": self.availability,
+            "promotion_valid_until": self.valid_until,
+            "multibuy_quantity": self.quantity,
+            "unit_price_value": self.unit_price,
+            "comparison_price": format_price(self.comparison_price, self.comparison_unit) if self.comparison_price else "",
+            "comparison_price_value": self.comparison_price,
+        }
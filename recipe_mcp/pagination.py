@@ -0,0 +1,157 @@
+"""
+Pagination engine for store APIs.
+
+The first page is fetched on its own to learn the total result count; the
+remaining pages are then fetched concurrently, bounded by a per-store
+concurrency cap, and yielded in page order so callers can normalize items as
+they arrive.
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import math
+
+PageFetcher = Callable[[Dict[str, Any]], Awaitable[Any]]
+ItemsGetter = Callable[[Any], List[Any]]
+
+# Safety cap for APIs that do not report a total count
+DEFAULT_MAX_PAGES = 40
+
+
+def get_path(data: Any, path: str) -> Any:
+    """Look up a dotted path such as 'pagination.totalNumberOfResults'"""
+    for part in path.split('.'):
+        if isinstance(data, dict):
+            data = data.get(part)
+        elif isinstance(data, list) and part.isdigit() and int(part) < len(data):
+            data = data[int(part)]
+        else:
+            return None
+    return data
+
+
+class Paginator:
+    """Fetch every page of a paginated endpoint.
+
+    Supported styles (the 'style' key of the pagination config):
+    - 'offset': offsetParam/limitParam, e.g. City Gross skip/take
+    - 'page': pageParam/sizeParam, e.g. Willys page/size
+
+    Items are read from the config's itemsPath unless items_of is given.
+    """
+
+    def __init__(self, fetch_page: PageFetcher, params: Dict[str, Any],
+                 config: Dict[str, Any], max_items: Optional[int] = None,
+                 items_of: Optional[ItemsGetter] = None):
+        self.fetch_page = fetch_page
+        self.params = params
+        self.config = config
+        self.max_items = max_items
+        self.items_of = items_of
+        self.total: Optional[int] = None
+        self.pages_fetched = 0
+        self.items_yielded = 0
+        # Set when maxPages stopped the walk with results left
+        self.capped = False
+        self.errors: List[str] = []
+
+    @property
+    def truncated(self) -> bool:
+        """Whether the walk stopped before every result was fetched (max_items, maxPages or lost pages)"""
+        if self.total is not None:
+            return self.total > self.items_yielded
+        return self.capped or (self.max_items is not None and self.items_yielded >= self.max_items)
+
+    @property
+    def page_size(self) -> int:
+        size_param = self.config['limitParam'] if self.config['style'] == 'offset' else self.config['sizeParam']
+        return int(self.params[size_param])
+
+    def page_params(self, index: int) -> Dict[str, Any]:
+        """Build the request parameters for the page at index (0-based)"""
+        params = dict(self.params)
+        if self.config['style'] == 'offset':
+            start = int(self.params.get(self.config['offsetParam'], 0))
+            params[self.config['offsetParam']] = start + index * self.page_size
+        else:
+            start = int(self.params.get(self.config['pageParam'], 0))
+            params[self.config['pageParam']] = start + index
+        return params
+
+    def _items(self, data: Any) -> List[Any]:
+        if self.items_of is not None:
+            return self.items_of(data)
+        items = get_path(data, self.config['itemsPath'])
+        return items if isinstance(items, list) else []
+
+    def _take(self, items: List[Any], remaining: float) -> List[Any]:
+        if remaining < len(items):
+            items = items[:int(remaining)]
+        self.items_yielded += len(items)
+        return items
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        """Yield the items of each page in order, stopping at max_items"""
+        remaining = self.max_items if self.max_items is not None else math.inf
+        if remaining <= 0:
+            return
+
+        # The first page tells us how many results there are in total
+        first = await self.fetch_page(self.page_params(0))
+        self.pages_fetched = 1
+        items = self._items(first)
+        total = get_path(first, self.config['totalPath']) if self.config.get('totalPath') else None
+        self.total = int(total) if isinstance(total, (int, float, str)) and str(total).isdigit() else None
+
+        yield self._take(items, remaining)
+        remaining -= len(items)
+        if remaining <= 0 or len(items) < self.page_size:
+            return
+
+        max_pages = self.config.get('maxPages', DEFAULT_MAX_PAGES)
+        if self.total is None:
+            # Without a total count, walk pages one at a time until a short page
+            for index in range(1, max_pages):
+                try:
+                    items = self._items(await self.fetch_page(self.page_params(index)))
+                except Exception as e:
+                    self.errors.append(f"page {index}: {e}")
+                    return
+                self.pages_fetched += 1
+                yield self._take(items, remaining)
+                remaining -= len(items)
+                if remaining <= 0 or len(items) < self.page_size:
+                    return
+            self.capped = True
+            return
+
+        wanted = min(self.total, len(items) + remaining)
+        page_count = math.ceil(wanted / self.page_size)
+        if page_count > max_pages:
+            page_count = max_pages
+            self.capped = True
+        semaphore = asyncio.Semaphore(self.config.get('maxConcurrency', 4))
+
+        async def fetch(index: int) -> List[Any]:
+            async with semaphore:
+                return self._items(await self.fetch_page(self.page_params(index)))
+
+        tasks = [asyncio.ensure_future(fetch(index)) for index in range(1, page_count)]
+        for task in tasks:
+            # Pages abandoned after max_items was reached must not log unretrieved errors
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            for index, task in enumerate(tasks, start=1):
+                try:
+                    items = await task
+                except Exception as e:
+                    self.errors.append(f"page {index}: {e}")
+                    continue
+                self.pages_fetched += 1
+                yield self._take(items, remaining)
+                remaining -= len(items)
+                if remaining <= 0:
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
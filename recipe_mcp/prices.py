@@ -0,0 +1,157 @@
+"""
+Swedish price string parsing and unit-price normalization.
+
+Upstream prices arrive as strings such as "19,90", "19:90 kr", "1 299:-",
+"kr/kg" units and multi-buy labels like "2 för 35 kr" or a bare "2 för"
+condition next to the total price. Everything here is
+parsed with precompiled patterns and memoized, because the same strings
+repeat across thousands of offers. Offers compute their effective per-item
+price and per-kg/per-litre comparison price once, when they are created.
+"""
+
+from typing import Any, Optional, Tuple
+from functools import lru_cache
+import re
+
+# A number with an optional thousands separator and decimals: 19,90 / 19:90 / 1 299.50
+_NUMBER = r'(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[,.:](\d{1,2})(?!\d))?'
+_PRICE_RE = re.compile(_NUMBER)
+# "2 för 35 kr", "3 st för 50:-", "2 for 35"
+_MULTIBUY_RE = re.compile(r'(\d+)\s*(?:st|pkt|förp)?\s*f(?:ö|o)r\s*' + _NUMBER + r'\s*(?:kr|:-|sek)?', re.IGNORECASE)
+# "2 för", "3 st för" - a condition label whose total price is given separately
+_QUANTITY_RE = re.compile(r'(\d+)\s*(?:st|pkt|förp)?\s*f(?:ö|o)r\b', re.IGNORECASE)
+
+VOLUME_RE = re.compile(r'(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(kg|hg|g|l|dl|cl|ml)\b')
+VOLUME_FACTORS = {
+    'kg': ('kg', 1.0), 'hg': ('kg', 0.1), 'g': ('kg', 0.001),
+    'l': ('l', 1.0), 'dl': ('l', 0.1), 'cl': ('l', 0.01), 'ml': ('l', 0.001),
+}
+
+_UNIT_RE = re.compile(r'(?:kr|sek)?\s*/?\s*([a-zåäö]+)\.?$')
+_UNIT_ALIASES = {'styck': 'st', 'stk': 'st', 'liter': 'l', 'lit': 'l', 'kilo': 'kg', 'forp': 'förp', 'paket': 'pkt'}
+
+# Bounded memo size for each parser
+CACHE_SIZE = 8192
+
+
+def _to_float(whole: str, decimals: Optional[str]) -> float:
+    value = float(whole.replace(' ', '').replace('\u00a0', ''))
+    if decimals:
+        value += float(decimals.ljust(2, '0')) / 100
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_multibuy(text: str) -> Optional[Tuple[int, float]]:
+    """Parse a multi-buy label such as '2 för 35 kr' into (quantity, total price)"""
+    match = _MULTIBUY_RE.search(text)
+    if not match:
+        return None
+    quantity = int(match.group(1))
+    if quantity < 2:
+        return None
+    return quantity, _to_float(match.group(2), match.group(3))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_price_text(text: str) -> float:
+    multibuy = parse_multibuy(text)
+    if multibuy:
+        quantity, total = multibuy
+        return round(total / quantity, 2)
+    match = _PRICE_RE.search(text)
+    return _to_float(match.group(1), match.group(2)) if match else 0.0
+
+
+def parse_price(value: Any) -> float:
+    """Parse a price such as 19.9, '19,90 kr' or '1 299:-' to a number.
+
+    A multi-buy label gives the price per item ('2 för 35 kr' -> 17.5).
+    """
+    if not value:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _parse_price_text(str(value))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_quantity_text(text: str) -> int:
+    match = _QUANTITY_RE.search(text)
+    return max(1, int(match.group(1))) if match else 1
+
+
+def parse_quantity(value: Any) -> int:
+    """Parse how many items a multi-buy price covers, e.g. '2 för' -> 2; 1 when none is given"""
+    if not value:
+        return 1
+    if isinstance(value, (int, float)):
+        return max(1, int(value))
+    return _parse_quantity_text(str(value))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_unit(text: str) -> str:
+    """Normalize a price unit such as 'kr/kg', '/st' or 'Liter' to 'kg', 'st', 'l'"""
+    match = _UNIT_RE.search(text.strip().lower())
+    if not match:
+        return 'st'
+    unit = match.group(1)
+    return _UNIT_ALIASES.get(unit, unit)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_volume(text: str) -> Optional[Tuple[float, str]]:
+    """Parse a package size such as '900 g', '1,5l' or '4x125g' into (amount, 'kg'|'l')"""
+    match = VOLUME_RE.search(text.lower())
+    if not match:
+        return None
+    count, amount, unit = match.groups()
+    base_unit, factor = VOLUME_FACTORS[unit]
+    total = float(amount.replace(',', '.')) * factor * (int(count) if count else 1)
+    return (round(total, 4), base_unit) if total > 0 else None
+
+
+def regular_item_price(price: float, unit: str, quantity: int, package_text: str) -> Optional[float]:
+    """Convert a regular price to the basis of unit_prices' price per item.
+
+    Multi-buy item prices are per package, so a regular price per kg or litre
+    is scaled by the package size found in package_text; None when it is not
+    known.
+    """
+    if quantity == 1 or unit not in VOLUME_FACTORS:
+        return price
+    volume = parse_volume(package_text) if package_text else None
+    base_unit, factor = VOLUME_FACTORS[unit]
+    if not volume or volume[1] != base_unit:
+        return None
+    return round(price / factor * volume[0], 2)
+
+
+def unit_prices(price: float, unit: str, discount: str, package_text: str,
+                quantity: int = 1) -> Tuple[int, float, Optional[float], str]:
+    """Work out (multi-buy quantity, price per item, comparison price, comparison unit).
+
+    quantity is how many items price covers, for stores that give a
+    multi-buy's total price and its condition ('2 för') separately; otherwise
+    a multi-buy label in discount is used. The comparison price is per kg or
+    litre: directly for weight and volume units, otherwise from the package
+    size found in package_text. Multi-buys are always counted per package.
+    """
+    item_price = price
+    if quantity > 1:
+        item_price = round(price / quantity, 2)
+    else:
+        multibuy = parse_multibuy(discount) if discount else None
+        if multibuy:
+            quantity, total = multibuy
+            item_price = round(total / quantity, 2)
+
+    if unit in VOLUME_FACTORS and quantity == 1:
+        base_unit, factor = VOLUME_FACTORS[unit]
+        return quantity, item_price, round(item_price / factor, 2) if item_price else None, base_unit
+    volume = parse_volume(package_text) if package_text and item_price else None
+    if volume:
+        amount, base_unit = volume
+        return quantity, item_price, round(item_price / amount, 2), base_unit
+    return quantity, item_price, None, ''
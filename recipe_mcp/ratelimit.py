@@ -0,0 +1,56 @@
+"""
+Per-host rate limiting for upstream requests.
+
+Each upstream host gets a token bucket: requests spend one token, tokens
+refill at a steady rate up to a burst capacity, and callers wait when the
+bucket is empty. Fetching many store locations concurrently therefore never
+exceeds the configured request rate against any single chain's API.
+"""
+
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts of `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> float:
+        """Take one token, waiting for a refill if needed; returns the time waited"""
+        if self.rate <= 0:
+            return 0.0
+        # Created lazily so the lock belongs to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Buckets keyed by upstream host
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_bucket(base_url: str, settings: Dict[str, Any]) -> TokenBucket:
+    """Get the token bucket for the host of base_url, creating it on first use"""
+    host = urlsplit(base_url).netloc
+    bucket = _buckets.get(host)
+    if bucket is None:
+        bucket = TokenBucket(settings['requestsPerSecond'], settings['burst'])
+        _buckets[host] = bucket
+    return bucket
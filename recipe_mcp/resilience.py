@@ -0,0 +1,204 @@
+"""
+Failure policy for upstream requests.
+
+- Circuit breakers: after failureThreshold consecutive failures a store's
+  circuit opens and its requests fail fast, to the disk cache when possible,
+  for resetSeconds; then a single probe request decides whether it closes.
+- Retry budget: failed attempts are retried with jittered exponential backoff,
+  but only while retries stay within a share of all requests process-wide, so
+  an outage cannot multiply the load on a struggling upstream.
+- Hedging: an attempt still running past the store's recent latency
+  percentile gets an identical second request, and the first answer wins.
+"""
+
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from collections import deque
+import asyncio
+import math
+import random
+import time
+
+import httpx
+
+
+class CircuitOpenError(Exception):
+    """A store's circuit is open, so it was not contacted"""
+
+
+class UpstreamTimeout(Exception):
+    """An attempt ran past its time allowance"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed attempt may succeed when repeated"""
+    if isinstance(error, (httpx.TransportError, UpstreamTimeout)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before the given retry (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** retry))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one store"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may go out; in half-open state only one probe at a time may"""
+        state = self.state
+        if state == self.CLOSED or self.failure_threshold <= 0:
+            return True
+        if state == self.OPEN:
+            return False
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) is given up after reset_seconds
+        if self._probe_started is not None and now - self._probe_started < self.reset_seconds:
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failure_threshold > 0 and (self._probe_started is not None or self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+        self._probe_started = None
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state
+        status: Dict[str, Any] = {"state": state, "consecutive_failures": self.failures}
+        if state == self.OPEN:
+            status["retry_in_seconds"] = round(self.opened_at + self.reset_seconds - time.monotonic(), 1)
+        return status
+
+
+class RetryBudget:
+    """Token budget limiting retries to a share of requests.
+
+    Every request deposits `ratio` tokens, up to `max_tokens`; a retry or
+    hedge spends a whole token and is refused when none is left.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyWindow:
+    """The latencies of a store's most recent successful requests"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: Optional[float],
+                 may_hedge: Callable[[], bool]) -> Any:
+    """Await call(), starting a second call() if the first is still running after delay.
+
+    may_hedge is asked before the second call goes out. The first successful
+    result wins and the other call is cancelled; if both fail, the last error
+    is raised.
+    """
+    if delay is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done or not may_hedge():
+            return await first
+        pending.add(asyncio.ensure_future(call()))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Breakers and latency windows keyed by store id, and the process-wide retry budget
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyWindow] = {}
+_retry_budget: Optional[RetryBudget] = None
+
+
+def get_breaker(store_id: str, settings: Dict[str, Any]) -> CircuitBreaker:
+    """Get the circuit breaker of a store, creating it on first use"""
+    breaker = _breakers.get(store_id)
+    if breaker is None:
+        breaker = CircuitBreaker(settings['failureThreshold'], settings['resetSeconds'])
+        _breakers[store_id] = breaker
+    return breaker
+
+
+def get_latencies(store_id: str) -> LatencyWindow:
+    """Get the recent latency window of a store, creating it on first use"""
+    window = _latencies.get(store_id)
+    if window is None:
+        window = _latencies[store_id] = LatencyWindow()
+    return window
+
+
+def get_retry_budget(settings: Dict[str, Any]) -> RetryBudget:
+    """Get the process-wide retry budget, creating it on first use"""
+    global _retry_budget
+    if _retry_budget is None:
+        _retry_budget = RetryBudget(settings['ratio'], settings['maxTokens'])
+    return _retry_budget
+
+
+def circuit_status() -> Dict[str, Dict[str, Any]]:
+    """The state of every store's circuit"""
+    return {store_id: breaker.status() for store_id, breaker in _breakers.items()}
@@ -0,0 +1,131 @@
+"""
+Background refresh scheduler for store snapshots.
+
+Each store location gets its own refresh loop that runs inside the server
+lifespan. Refreshes happen on a jittered interval, with extra refreshes shortly
+after the weekly offer rollover, and back off exponentially while a store is
+failing. Tool calls keep reading the latest snapshot from the offer cache.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import random
+import time
+
+Refresher = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def next_rollover_refresh(now: datetime, weekday: int, hour: int, offsets: List[float]) -> datetime:
+    """Get the next refresh time after a weekly rollover (weekday 0 = Monday)"""
+    start_of_day = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    rollover = start_of_day + timedelta(days=(weekday - now.weekday()) % 7)
+    candidates = []
+    for week in (-1, 0, 1):
+        for offset in offsets:
+            candidate = rollover + timedelta(weeks=week, seconds=offset)
+            if candidate > now:
+                candidates.append(candidate)
+    return min(candidates)
+
+
+class RefreshJob:
+    """Refresh state for one store location"""
+
+    def __init__(self, store_id: str, refresh: Refresher, interval: float):
+        self.store_id = store_id
+        self.refresh = refresh
+        self.interval = interval
+        self.last_attempt_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.next_refresh_at: Optional[float] = None
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the job's refresh history"""
+        def iso(timestamp: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+        return {
+            "store_id": self.store_id,
+            "interval_seconds": self.interval,
+            "last_attempt_at": iso(self.last_attempt_at),
+            "last_refreshed_at": iso(self.last_success_at),
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+            "next_refresh_at": iso(self.next_refresh_at),
+        }
+
+
+class RefreshScheduler:
+    """Keep store snapshots warm by refreshing them in the background"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.jobs: List[RefreshJob] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, store_id: str, refresh: Refresher, interval: Optional[float] = None) -> None:
+        """Register a store location to refresh"""
+        self.jobs.append(RefreshJob(store_id, refresh, interval or self.settings['intervalSeconds']))
+
+    def _delay(self, job: RefreshJob) -> float:
+        jitter = self.settings.get('jitter', 0.1)
+        if job.consecutive_failures:
+            # Exponential backoff while the store keeps failing
+            base = min(job.interval, self.settings.get('retryBaseSeconds', 30) * 2 ** (job.consecutive_failures - 1))
+            base = min(base, self.settings.get('maxBackoffSeconds', job.interval))
+        else:
+            base = job.interval
+        delay = base * random.uniform(1 - jitter, 1 + jitter)
+
+        rollover = self.settings.get('rollover')
+        if rollover:
+            now = datetime.now()
+            extra = next_rollover_refresh(now, rollover['weekday'], rollover['hour'], rollover['refreshOffsetsSeconds'])
+            delay = min(delay, (extra - now).total_seconds())
+        return max(delay, 0.0)
+
+    async def _run(self, job: RefreshJob) -> None:
+        # Spread the first refreshes so stores are not all hit at once
+        delay = random.uniform(0, self.settings.get('startupSpreadSeconds', 5))
+        while True:
+            job.next_refresh_at = time.time() + delay
+            await asyncio.sleep(delay)
+            job.last_attempt_at = time.time()
+            try:
+                result = await job.refresh()
+                if result.get('error'):
+                    error = result['error']
+                elif result.get('stale_snapshot'):
+                    error = "Upstream unavailable; kept the last saved snapshot"
+                elif not result.get('item_count'):
+                    error = result.get('note', "No offers returned")
+                else:
+                    error = None
+            except Exception as e:
+                error = str(e)
+            if error:
+                job.consecutive_failures += 1
+                job.last_error = error
+            else:
+                job.consecutive_failures = 0
+                job.last_error = None
+                job.last_success_at = time.time()
+            delay = self._delay(job)
+
+    def start(self) -> None:
+        """Start one refresh loop per registered store location"""
+        self._tasks = [asyncio.ensure_future(self._run(job)) for job in self.jobs]
+
+    async def stop(self) -> None:
+        """Cancel every refresh loop"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Describe every job's refresh history"""
+        return [job.status() for job in self.jobs]
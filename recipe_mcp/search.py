@@ -0,0 +1,141 @@
+"""
+Inverted index for searching cached offers.
+
+Text is folded to lowercase ASCII (so "filé" matches "file" and "ö" matches
+"o") and split into tokens. Every token is indexed together with its suffixes,
+so parts of Swedish compounds are found too: "kycklingfilé" is returned for
+"kyckling" (prefix) as well as for "filé" (compound tail). The index is
+updated one store at a time whenever that store's offers are refreshed.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from bisect import bisect_left
+import re
+import time
+import unicodedata
+
+from .models import Offer
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Shortest compound part that gets its own index entry
+MIN_PART_LENGTH = 4
+
+# Relative weight of a match in each offer field
+FIELD_WEIGHTS = (
+    ('name', 3.0),
+    ('brand', 2.0),
+    ('category', 1.0),
+    ('description', 1.0),
+)
+
+
+def fold(text: str) -> str:
+    """Lowercase text and strip diacritics"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into folded search tokens"""
+    return _TOKEN_RE.findall(fold(text)) if text else []
+
+
+def _index_terms(token: str) -> Iterable[Tuple[str, bool]]:
+    """Yield the token itself and its compound suffixes, flagged as exact or not"""
+    yield token, True
+    for start in range(1, len(token) - MIN_PART_LENGTH + 1):
+        yield token[start:], False
+
+
+class OfferIndex:
+    """Inverted index from search terms to cached offers"""
+
+    def __init__(self):
+        self._offers: Dict[int, Offer] = {}
+        self._doc_terms: Dict[int, List[str]] = {}
+        self._store_docs: Dict[str, List[int]] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._sorted_terms: List[str] = []
+        self._next_id = 0
+        self.updated_at: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._offers)
+
+    def _remove_store(self, store_id: str) -> None:
+        for doc_id in self._store_docs.pop(store_id, []):
+            del self._offers[doc_id]
+            for term in self._doc_terms.pop(doc_id):
+                postings = self._postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def update(self, store_id: str, offers: List[Offer]) -> None:
+        """Replace the indexed offers of one store"""
+        self._remove_store(store_id)
+        doc_ids = []
+        for offer in offers:
+            doc_id = self._next_id
+            self._next_id += 1
+            weights: Dict[str, float] = {}
+            for field, field_weight in FIELD_WEIGHTS:
+                for token in tokenize(getattr(offer, field)):
+                    for term, exact in _index_terms(token):
+                        # Whole-word matches count double compared to compound parts
+                        weight = field_weight * 2 if exact else field_weight
+                        if weight > weights.get(term, 0.0):
+                            weights[term] = weight
+            for term, weight in weights.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+            self._offers[doc_id] = offer
+            self._doc_terms[doc_id] = list(weights)
+            doc_ids.append(doc_id)
+        self._store_docs[store_id] = doc_ids
+        self._sorted_terms = sorted(self._postings)
+        self.updated_at[store_id] = time.time()
+
+    def _match_term(self, query_term: str) -> Dict[int, float]:
+        """Score documents for one query term, matching it as a prefix"""
+        scores: Dict[int, float] = {}
+        terms = self._sorted_terms
+        position = bisect_left(terms, query_term)
+        while position < len(terms) and terms[position].startswith(query_term):
+            term = terms[position]
+            # Prefix matches score half as much as exact term matches
+            factor = 1.0 if term == query_term else 0.5
+            for doc_id, weight in self._postings[term].items():
+                score = weight * factor
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+            position += 1
+        return scores
+
+    def search(self, query: str, store_ids: Optional[Set[str]] = None,
+               max_price: Optional[float] = None, limit: int = 20) -> List[Tuple[float, Offer]]:
+        """Find offers matching every term of the query, best matches first"""
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+
+        scores: Optional[Dict[int, float]] = None
+        for query_term in query_terms:
+            matches = self._match_term(query_term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {doc_id: score + matches[doc_id] for doc_id, score in scores.items() if doc_id in matches}
+            if not scores:
+                return []
+
+        results = []
+        for doc_id, score in scores.items():
+            offer = self._offers[doc_id]
+            if store_ids is not None and offer.store_id not in store_ids:
+                continue
+            if max_price is not None and offer.price > max_price:
+                continue
+            results.append((score, offer))
+        results.sort(key=lambda result: (-result[0], result[1].price))
+        return results[:limit]
@@ -0,0 +1,159 @@
+"""
+Projection, sorting and cursor paging of offer tool responses.
+
+Pages are cut from the cached store snapshot, so walking a large result set
+in small slices costs no upstream calls. A cursor is an opaque token holding
+the sort order and, per store, the next offset and the snapshot it refers to;
+a cursor whose snapshot has since been replaced is rejected rather than
+silently skipping or repeating offers.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import base64
+import binascii
+import json
+import math
+
+from .models import Offer
+
+# Fields of a rendered offer, in response order
+OFFER_FIELDS = (
+    'name', 'price', 'price_value', 'original_price', 'discount', 'description', 'category',
+    'brand', 'unit', 'availability', 'promotion_valid_until', 'multibuy_quantity',
+    'unit_price_value', 'comparison_price', 'comparison_price_value',
+)
+
+# Sort keys by name; prefix with '-' to sort descending
+SORT_KEYS: Dict[str, Callable[[Offer], Any]] = {
+    'price_value': lambda offer: offer.price,
+    'unit_price_value': lambda offer: offer.unit_price,
+    'comparison_price_value': lambda offer: offer.comparison_price if offer.comparison_price is not None else math.inf,
+    'savings': lambda offer: offer.savings,
+    'name': lambda offer: offer.name.lower(),
+    'promotion_valid_until': lambda offer: offer.valid_until or '9999',
+}
+
+# Sorted orders kept per (store id, snapshot, offers list, sort), with the list they were sorted from.
+# Results cut from one snapshot with different max_items share a stamp but not a list.
+_SORTED_CACHE_SIZE = 32
+_sorted: "OrderedDict[Tuple[str, str, int, str], Tuple[List[Offer], List[Offer]]]" = OrderedDict()
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Pack cursor state into an opaque token"""
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Unpack a token made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        state = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(state, dict) or not isinstance(state.get('o'), dict):
+        raise ValueError("Invalid cursor")
+    for position in state['o'].values():
+        if not (isinstance(position, list) and len(position) == 2 and isinstance(position[0], int)):
+            raise ValueError("Invalid cursor")
+    return state
+
+
+def snapshot_stamp(result: Dict[str, Any]) -> str:
+    """Identify the snapshot a store result was cut from"""
+    return str(result.get('snapshot_saved_at') or result.get('fetched_at', ''))
+
+
+def sorted_offers(store_id: str, stamp: str, offers: List[Offer], sort_by: Optional[str]) -> List[Offer]:
+    """Get a snapshot's offers in sort order, sorting each snapshot at most once per order"""
+    if not sort_by:
+        return offers
+    if not stamp:
+        return sorted(offers, key=SORT_KEYS[sort_by.lstrip('-')], reverse=sort_by.startswith('-'))
+    key = (store_id, stamp, id(offers), sort_by)
+    # Holding the source list keeps its id from being reused by another list
+    entry = _sorted.get(key)
+    if entry is None or entry[0] is not offers:
+        descending = sort_by.startswith('-')
+        entry = (offers, sorted(offers, key=SORT_KEYS[sort_by.lstrip('-')], reverse=descending))
+        _sorted[key] = entry
+        while len(_sorted) > _SORTED_CACHE_SIZE:
+            _sorted.popitem(last=False)
+    else:
+        _sorted.move_to_end(key)
+    return entry[1]
+
+
+class OfferView:
+    """How the offers of one tool call are projected, sorted and paged.
+
+    Without any options every offer is rendered with every field, exactly as
+    before. Rendering records where each store stopped, for next_cursor().
+    """
+
+    def __init__(self, fields: Optional[Sequence[str]] = None, limit: Optional[int] = None,
+                 sort_by: Optional[str] = None, cursor: Optional[str] = None):
+        if fields is not None:
+            unknown = [field for field in fields if field not in OFFER_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields {unknown}. Available fields: {', '.join(OFFER_FIELDS)}")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.fields = list(fields) if fields is not None else None
+        self.limit = limit
+        self.offsets: Dict[str, List[Any]] = {}
+        if cursor:
+            state = decode_cursor(cursor)
+            if sort_by is not None and sort_by != state.get('s'):
+                raise ValueError("sort_by cannot change while paging with a cursor")
+            sort_by = state.get('s')
+            self.offsets = state['o']
+        if sort_by is not None and sort_by.lstrip('-') not in SORT_KEYS:
+            raise ValueError(f"Unknown sort_by '{sort_by}'. Available: {', '.join(SORT_KEYS)}")
+        self.sort_by = sort_by
+        self._next: Dict[str, List[Any]] = {}
+        self._more = False
+
+    @property
+    def paged(self) -> bool:
+        return self.limit is not None or bool(self.offsets)
+
+    def project(self, offer: Offer) -> Dict[str, Any]:
+        """Render an offer with the selected fields"""
+        item = offer.to_dict()
+        if self.fields is None:
+            return item
+        return {field: item[field] for field in self.fields}
+
+    def render(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Serialize one store result's slice of offers"""
+        offers = result.get('items', [])
+        if not self.paged and self.sort_by is None:
+            return dict(result, items=[self.project(offer) for offer in offers])
+
+        store_id = result.get('store_id', '')
+        stamp = snapshot_stamp(result)
+        offset = 0
+        if store_id in self.offsets:
+            offset, cursor_stamp = self.offsets[store_id]
+            if cursor_stamp != stamp:
+                raise ValueError(f"The offers of {store_id} were refreshed since this cursor was issued; "
+                                 "start again without a cursor")
+        ordered = sorted_offers(store_id, stamp, offers, self.sort_by)
+        end = len(ordered) if self.limit is None else offset + self.limit
+        page = ordered[offset:end]
+        if 'error' not in result:
+            # Exhausted stores stay in the cursor so they are not served again from the start
+            self._next[store_id] = [min(end, len(ordered)), stamp]
+            self._more = self._more or end < len(ordered)
+        rendered = dict(result, items=[self.project(offer) for offer in page])
+        rendered.update(offset=offset, returned_count=len(page))
+        return rendered
+
+    def next_cursor(self) -> Optional[str]:
+        """Token for the next page, or None once every store is exhausted"""
+        if not self._more:
+            return None
+        return encode_cursor({"s": self.sort_by, "o": self._next})
@@ -0,0 +1,57 @@
+"""
+Single-flight coalescing of concurrent identical calls.
+
+The first caller for a key starts the call; callers arriving while it is in
+flight wait for the same result (or exception) instead of starting their own.
+Once the call finishes the key is released, so later callers start afresh;
+caching results is left to the layers above.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+
+
+class _Flight:
+    __slots__ = ('task', 'callers')
+
+    def __init__(self, task: "asyncio.Future[Any]"):
+        self.task = task
+        self.callers = 1
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        # Callers served by another caller's call, over the lifetime of the group
+        self.joined = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, int, bool]:
+        """Run call() once per key at a time.
+
+        Returns (result, callers, joined): how many callers shared the call
+        in total, and whether this caller joined one already in flight. A
+        caller that is cancelled stops waiting without cancelling the call
+        for the others.
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            flight.callers += 1
+            self.joined += 1
+        else:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(call()))
+
+            def release(task: "asyncio.Future[Any]") -> None:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # Mark the error as seen, in case every caller was cancelled
+                if not task.cancelled():
+                    task.exception()
+            flight.task.add_done_callback(release)
+        result = await asyncio.shield(flight.task)
+        return result, flight.callers, joined
@@ -0,0 +1,61 @@
+"""
+Shared setup for tests that call the server's tools.
+
+Store APIs are replaced by the benchmark fixtures, served through
+FixtureTransport, so no test touches the network.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Read when the server module is imported, so set it before any test imports it
+os.environ.setdefault('RECIPE_MCP_CACHE_DIR', tempfile.mkdtemp(prefix='recipe-mcp-test-'))
+
+
+@pytest.fixture
+def transport():
+    from benchmarks.transport import FixtureTransport
+    return FixtureTransport()
+
+
+@pytest.fixture
+def server(monkeypatch, transport):
+    """The server module with fixture stores, an empty cache and fresh indexes"""
+    from recipe_mcp import client, foodmcp, resilience
+    from recipe_mcp.matching import ProductMatcher
+    from recipe_mcp.metrics import MetricsRegistry
+    from recipe_mcp.search import OfferIndex
+
+    client.use_transport(transport)
+    foodmcp.offer_cache.clear()
+    monkeypatch.setattr(foodmcp, 'response_store', None)
+    monkeypatch.setattr(foodmcp, '_response_store_opened', True)
+    monkeypatch.setattr(foodmcp, 'history_store', None)
+    monkeypatch.setattr(foodmcp, '_history_opened', True)
+    monkeypatch.setattr(foodmcp, 'search_index', OfferIndex())
+    monkeypatch.setattr(foodmcp, 'product_matcher', ProductMatcher())
+    monkeypatch.setitem(foodmcp.CONSTANTS['common']['rateLimit'], 'requestsPerSecond', 0)
+    monkeypatch.setattr(resilience, '_breakers', {})
+    monkeypatch.setattr(resilience, '_latencies', {})
+    monkeypatch.setattr(resilience, '_retry_budget', None)
+    monkeypatch.setattr(foodmcp, 'metrics', MetricsRegistry())
+    yield foodmcp
+    client.use_transport(None)
+
+
+@pytest.fixture
+def run(server):
+    """Run a coroutine on a new event loop, closing the pooled clients before the loop ends"""
+    from recipe_mcp import client
+
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await client.close_clients()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,30 @@
+import httpx
+import pytest
+
+from benchmarks.transport import FixtureTransport
+
+
+class _IcaDown(FixtureTransport):
+    """ICA always answering 503"""
+
+    async def handle_async_request(self, request):
+        if request.url.host == 'apimgw-pub.ica.se':
+            return httpx.Response(503, request=request)
+        return await super().handle_async_request(request)
+
+
+def test_chains_not_cached_are_fetched_before_planning(server, run):
+    run(server.get_city_gross_offers())
+    assert list(server.search_index.updated_at) == ['citygross']
+    result = run(server.plan_basket(['mjölk', 'smör']))
+    assert sorted(server.search_index.updated_at) == sorted(
+        store['id'] for store in server.CONSTANTS['stores'].values())
+    assert result["missing_stores"] == []
+
+
+@pytest.mark.parametrize('transport', [_IcaDown()])
+def test_chains_that_fail_are_reported(server, run, monkeypatch, transport):
+    monkeypatch.setitem(server.CONSTANTS['common']['resilience'], 'retries', 0)
+    result = run(server.plan_basket(['mjölk']))
+    assert result["missing_stores"] == [server.CONSTANTS['stores']['ica']['name']]
+    assert 'willys' in server.search_index.updated_at
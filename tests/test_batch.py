@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+
+def test_batch_deduplicates_and_reports_each_request(server, run):
+    response = run(server.get_offers_batch([
+        {"store": "willys", "query": "mjölk"},
+        {"store": "Willys", "query": "mjölk", "limit": 1},
+        {"store": "lidl"},
+        {"store": "ica", "location": "999"},
+    ]))
+    ok, subset, unknown_store, unknown_location = response["results"]
+    assert ok["status"] == subset["status"] == "ok"
+    assert subset["offer_ids"] == ok["offer_ids"][:1]
+    assert len(response["offers"]) == len(set(ok["offer_ids"]))
+    assert unknown_store["status"] == unknown_location["status"] == "error"
+    assert response["failed_count"] == 2
+
+
+def test_batch_searches_the_snapshot_it_was_served(server, run, transport):
+    """A refresh landing while the batch waits for another store must not mix snapshots"""
+    serve = transport.handle_async_request
+
+    async def slow_ica(request):
+        if request.url.host == 'apimgw-pub.ica.se':
+            await asyncio.sleep(0.2)
+        return await serve(request)
+    transport.handle_async_request = slow_ica
+
+    async def scenario():
+        await server.get_willys_offers()
+        # Serve the cached Willys snapshot stale, so the batch triggers a background refresh
+        for entry in server.offer_cache._entries.values():
+            entry.fresh_until = time.time() - 1
+        return await server.get_offers_batch([{"store": "willys", "query": "mjölk"}, {"store": "ica"}])
+
+    response = run(scenario())
+    willys, ica = response["results"]
+    assert willys["status"] == "ok" and willys["offer_count"] > 0
+    assert ica["status"] == "ok"
+    assert all(offer["store_id"] == "willys" for offer in
+               (response["offers"][offer_id] for offer_id in willys["offer_ids"]))
+
+
+def test_batch_of_only_invalid_requests(server, run):
+    response = run(server.get_offers_batch([{"store": "lidl"}, {"store": "ica", "location": "999"}]))
+    assert [result["status"] for result in response["results"]] == ["error", "error"]
+    assert response["failed_count"] == 2
+    assert not response["offers"]
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from benchmarks.transport import FixtureTransport
+from recipe_mcp import cache
+from recipe_mcp.cache import OfferCache, earliest_expiry
+
+
+class _LosingPages(FixtureTransport):
+    """Willys with a second page that always fails"""
+
+    async def handle_async_request(self, request):
+        if request.url.host == 'www.willys.se' and request.url.params.get('page') == '1':
+            return httpx.Response(503, request=request)
+        return await super().handle_async_request(request)
+
+
+@pytest.fixture
+def transport():
+    return _LosingPages(items_per_store=120)
+
+
+def test_complete_snapshots_are_cached(server, run):
+    first = run(server.get_city_gross_offers())
+    second = run(server.get_city_gross_offers())
+    assert not first["cache"]["hit"] and second["cache"]["hit"]
+    assert 'citygross' in server.search_index.updated_at
+
+
+def test_snapshots_missing_pages_are_not_cached_or_indexed(server, run, monkeypatch):
+    monkeypatch.setitem(server.CONSTANTS['common']['resilience'], 'retries', 0)
+    first = run(server.get_willys_offers())
+    assert first["page_errors"] and first["item_count"] < 120
+    second = run(server.get_willys_offers())
+    assert not second["cache"]["hit"]
+    assert 'willys' not in server.search_index.updated_at
+    assert not server.product_matcher._entries.get('willys')
+
+
+def test_snapshots_cut_by_the_page_cap_are_not_indexed(server, run, monkeypatch):
+    pagination = server.CONSTANTS['stores']['cityGross']['api']['pagination']
+    monkeypatch.setitem(pagination, 'maxPages', 2)
+    result = run(server.get_city_gross_offers())
+    assert result["truncated"] and result["item_count"] == 100 and result["total_available"] == 120
+    assert 'citygross' not in server.search_index.updated_at
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+class _Fetcher:
+    """Returns a new value on every call, or raises once fail is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {"value": self.calls}
+
+
+def _get(offers, key, fetch, ttl=10, stale=5, expires=None):
+    return offers.get_or_fetch(key, fetch, ttl, stale, lambda value: expires, lambda value: True)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    async def main():
+        offers = OfferCache(max_entries=2)
+        fetches = {key: _Fetcher() for key in 'abc'}
+        await _get(offers, 'a', fetches['a'])
+        await _get(offers, 'b', fetches['b'])
+        assert (await _get(offers, 'a', fetches['a']))[1]["hit"]
+        await _get(offers, 'c', fetches['c'])
+        assert list(offers._entries) == ['a', 'c']
+        assert not (await _get(offers, 'b', fetches['b']))[1]["hit"]
+        assert fetches['b'].calls == 2 and fetches['a'].calls == 1
+    asyncio.run(main())
+
+
+def test_stale_entry_is_served_while_it_revalidates(clock):
+    async def main():
+        offers = OfferCache()
+        fetch = _Fetcher()
+        await _get(offers, 'key', fetch)
+        clock.now += 9
+        value, info = await _get(offers, 'key', fetch)
+        assert value == {"value": 1} and info["hit"] and not info["stale"] and info["age_seconds"] == 9
+
+        clock.now += 2
+        value, info = await _get(offers, 'key', fetch)
+        assert value == {"value": 1} and info["hit"] and info["stale"]
+        # A second stale hit shares the refresh already running
+        await _get(offers, 'key', fetch)
+        await asyncio.gather(*offers._revalidating.values())
+        assert fetch.calls == 2
+        value, info = await _get(offers, 'key', fetch)
+        assert value == {"value": 2} and not info["stale"]
+    asyncio.run(main())
+
+
+def test_failed_revalidation_keeps_the_stale_entry_until_the_window_closes(clock):
+    async def main():
+        offers = OfferCache()
+        fetch = _Fetcher()
+        await _get(offers, 'key', fetch)
+        fetch.fail = True
+        clock.now += 11
+        await _get(offers, 'key', fetch)
+        await asyncio.gather(*offers._revalidating.values())
+        value, info = await _get(offers, 'key', fetch)
+        assert value == {"value": 1} and info["stale"]
+
+        clock.now += 5
+        with pytest.raises(RuntimeError):
+            await _get(offers, 'key', fetch)
+    asyncio.run(main())
+
+
+def test_entries_expire_with_their_earliest_promotion(clock):
+    async def main():
+        offers = OfferCache()
+        fetch = _Fetcher()
+        await _get(offers, 'key', fetch, expires=clock.now + 3)
+        clock.now += 2
+        assert (await _get(offers, 'key', fetch))[1]["hit"]
+        # No stale window past the promotion's end
+        clock.now += 1
+        value, info = await _get(offers, 'key', fetch)
+        assert not info["hit"] and value == {"value": 2}
+    asyncio.run(main())
+
+
+def test_earliest_expiry():
+    now = datetime.now()
+    soon = (now + timedelta(hours=1)).isoformat()
+    later = (now + timedelta(days=3)).isoformat()
+    past = (now - timedelta(days=3)).isoformat()
+    assert earliest_expiry([later, '', 'not a date', past, soon]) == pytest.approx(datetime.fromisoformat(soon).timestamp())
+    assert earliest_expiry([past, '']) is None
+    # A bare date runs to the end of the day
+    today = now.date().isoformat()
+    assert earliest_expiry([today]) == (datetime.fromisoformat(today) + timedelta(days=1)).timestamp()
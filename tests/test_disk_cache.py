@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import httpx
+
+from recipe_mcp.disk_cache import FRESH, NOT_MODIFIED, STALE, ResponseStore, fetch_json, load_stale
+from recipe_mcp.jsonstream import BufferedDecoder
+
+
+def _save(store, key, body):
+    f, path = store.temp_file()
+    with f:
+        f.write(body)
+    store.save(key, path, {"decoded": key}, httpx.Headers({'etag': '"1"'}))
+
+
+def test_decoded_bodies_are_bounded(tmp_path):
+    store = ResponseStore(str(tmp_path), max_decoded=2)
+    for key in ('a', 'b', 'c'):
+        _save(store, key, b'{"stored": true}')
+    assert list(store._decoded) == ['b', 'c']
+    # Kept bodies come from memory; evicted ones are parsed from disk again
+    assert store.load_data('b', BufferedDecoder()) == {"decoded": 'b'}
+    assert store.load_data('a', BufferedDecoder()) == {"stored": True}
+    assert list(store._decoded) == ['b', 'a']
+
+
+def test_file_access_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = ResponseStore(str(tmp_path))
+    threads = []
+    for name in ('load_meta', 'load_data', 'temp_file', 'save'):
+        method = getattr(store, name)
+
+        def record(*args, method=method, name=name):
+            threads.append((name, threading.get_ident()))
+            return method(*args)
+        monkeypatch.setattr(store, name, record)
+
+    def handler(request):
+        if request.headers.get('if-none-match') == '"1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"items": [1, 2]}, headers={'etag': '"1"'})
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await fetch_json(store, client, 'GET', 'https://example.test/offers')
+            store._decoded.clear()
+            second = await fetch_json(store, client, 'GET', 'https://example.test/offers')
+            stale = await load_stale(store, client, 'GET', 'https://example.test/offers')
+            return first, second, stale, threading.get_ident()
+
+    first, second, stale, loop_thread = asyncio.run(scenario())
+    assert first.data == second.data == stale.data == {"items": [1, 2]}
+    assert (first.status, second.status, stale.status) == (FRESH, NOT_MODIFIED, STALE)
+    assert {name for name, _ in threads} == {'load_meta', 'load_data', 'temp_file', 'save'}
+    assert all(thread != loop_thread for _, thread in threads)
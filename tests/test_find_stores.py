@@ -0,0 +1,34 @@
+from recipe_mcp.geo import StoreLocationIndex, haversine_km
+
+
+def test_nearest_matches_a_full_scan():
+    stores = [
+        {"chain": "ica", "id": str(n), "name": f"Store {n}", "lat": 55.5 + (n % 40) * 0.33, "lon": 11.5 + (n // 40) * 0.5}
+        for n in range(800)
+    ]
+    index = StoreLocationIndex(5)
+    index.extend(stores)
+    for lat, lon, radius_km in ((59.33, 18.06, 25), (57.7, 12.0, 60), (63.8, 20.3, 100)):
+        expected = sorted(
+            (distance, store['id']) for distance, store in
+            ((haversine_km(lat, lon, store['lat'], store['lon']), store) for store in stores) if distance <= radius_km
+        )[:10]
+        assert [(distance, store['id']) for distance, store in index.nearest(lat, lon, radius_km)] == expected
+
+
+def test_find_stores_reports_chains_without_stores(server, run):
+    response = run(server.find_stores(59.35, 18.0, 10))
+    assert sorted(store["chain"] for store in response["stores"]) == ["ICA", "Willys"]
+    assert response["missing_chains"] == ["City Gross"]
+    response = run(server.find_stores(59.35, 18.0, 10, chains=["city gross"]))
+    assert response["stores"] == [] and response["missing_chains"] == ["City Gross"]
+
+
+def test_find_stores_with_offers_and_no_stores_found(server, run, transport):
+    # Nothing within 5 km of Malmö
+    response = run(server.find_stores(55.6, 13.0, 5, include_offers=True))
+    assert response["stores"] == [] and response["offers"] == []
+    assert not response["partial"]
+    response = run(server.find_stores(59.35, 18.0, 10, chains=["city gross"], include_offers=True))
+    assert response["offers"] == [] and response["missing_chains"] == ["City Gross"]
+    assert transport.requests == 0
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from recipe_mcp.jsonstream import BufferedDecoder, StreamDecoder
+
+DOCUMENT = {
+    "meta": {"total": -12.5e-1, "next": None, "final": True},
+    "data": {
+        "items": [
+            {"name": "Mjölk \"3%\" \\ 1,5 l", "price": 1234.5, "tags": ["a", "é€"]},
+            {"name": "Smör", "price": -0.25e+2, "active": False, "extra": None},
+            {"name": "Ägg", "price": 42, "nested": {"items": [1, 2]}},
+            -1234.5e-2, 0.125, 10, True, False, None, "ost",
+        ],
+        "count": 3,
+        "ratio": 12.75E+3,
+        "empty": None,
+    },
+}
+
+
+def _decode(body, paths, chunk_size, transform=None):
+    decoder = StreamDecoder(paths, transform)
+    for start in range(0, len(body), chunk_size):
+        decoder.feed(body[start:start + chunk_size])
+    return decoder, decoder.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+def test_chunk_boundaries(chunk_size):
+    # Byte-sized chunks split every number, string, literal and UTF-8 sequence
+    for body in (json.dumps(DOCUMENT).encode(), json.dumps(DOCUMENT, ensure_ascii=False, indent=2).encode()):
+        decoder, result = _decode(body, ['data.items'], chunk_size)
+        assert result == DOCUMENT
+        assert decoder.items_path == 'data.items'
+        assert decoder.item_count == len(DOCUMENT['data']['items'])
+
+
+def test_items_are_transformed_and_dropped():
+    body = json.dumps(DOCUMENT).encode()
+    decoder, result = _decode(body, ['missing', 'data.items'], 5,
+                              lambda item: item['name'] if isinstance(item, dict) and item['price'] > 0 else None)
+    assert result['data']['items'] == ["Mjölk \"3%\" \\ 1,5 l", "Ägg"]
+    assert decoder.item_count == 2
+    # Arrays outside the items path are decoded as is
+    assert result['data']['count'] == 3
+
+
+def test_root_array():
+    items = [{"id": index, "price": index / 4} for index in range(10)] + [[], {}]
+    decoder, result = _decode(json.dumps(items).encode(), ['data', ''], 3)
+    assert result == items
+    assert decoder.items_path == ''
+    assert decoder.item_count == len(items)
+
+
+def test_matches_buffered_decoder():
+    body = json.dumps(DOCUMENT).encode()
+    buffered = BufferedDecoder()
+    buffered.feed(body)
+    assert _decode(body, ['data.items'], 4)[1] == buffered.close()
+
+
+@pytest.mark.parametrize('body', [
+    b'{"data": {"items": [1, 2}',
+    b'{"data": {"items": [1, 2]}',
+    b'{"data" {"items": []}}',
+    b'{"data": {"items": [tru]}}',
+    b'{"data": {"items": [1.]}}',
+    b'{data: []}',
+    b'{"data": []} []',
+    b'',
+])
+def test_malformed_input(body):
+    for chunk_size in (1, len(body) or 1):
+        with pytest.raises(ValueError):
+            _decode(body, ['data.items'], chunk_size)
@@ -0,0 +1,62 @@
+from recipe_mcp.matching import ProductMatcher
+from recipe_mcp.models import Offer
+
+
+def _groups(*offers):
+    matcher = ProductMatcher()
+    for store_id in sorted({offer.store_id for offer in offers}):
+        matcher.update(store_id, [offer for offer in offers if offer.store_id == store_id])
+    return matcher.find()
+
+
+def test_offers_priced_by_weight_keep_their_own_comparison_price():
+    [group] = _groups(
+        Offer('citygross', 'Kycklingfilé', 29.9, unit='kg'),
+        Offer('willys', 'Kycklingfilé', 90.0, description='900 g'),
+    )
+    prices = dict(zip((offer.store_id for offer in group.offers), group.prices))
+    assert prices['citygross'] == (29.9, 'kr/kg')
+    assert prices['willys'] == (100.0, 'kr/kg')
+    assert group.offers[0].store_id == 'citygross'
+    assert round(group.price_spread, 2) == 70.1
+
+
+def test_group_package_size_applies_to_per_item_offers_without_one():
+    [group] = _groups(
+        Offer('willys', 'Krossade tomater', 12.0, description='400 g'),
+        Offer('ica', 'Krossade tomater', 10.0),
+    )
+    prices = dict(zip((offer.store_id for offer in group.offers), group.prices))
+    assert prices['ica'] == (25.0, 'kr/kg')
+    assert prices['willys'] == (30.0, 'kr/kg')
+    assert group.unit_price(group.offers[0]) == (25.0, 'kr/kg')
+
+
+def test_cheapest_offer_per_store_is_chosen_by_normalized_price():
+    [group] = _groups(
+        Offer('willys', 'Lösvikt godis', 12.0, description='1 kg'),
+        Offer('ica', 'Lösvikt godis', 9.0, unit='hg'),
+        Offer('ica', 'Lösvikt godis', 10.0, description='1 kg'),
+    )
+    ica = next(offer for offer in group.offers if offer.store_id == 'ica')
+    assert ica.price == 10.0
+    assert [price for price, _ in group.prices] == sorted(price for price, _ in group.prices)
+
+
+def test_refreshing_a_store_regroups_only_its_offers():
+    matcher = ProductMatcher()
+    matcher.update('willys', [Offer('willys', 'Krossade tomater', 12.0, description='400 g'),
+                              Offer('willys', 'Krossade tomater', 11.0, description='400 g')])
+    assert matcher.groups == []
+    matcher.update('ica', [Offer('ica', 'Krossade tomater', 10.0, description='400 g'),
+                           Offer('ica', 'Arla Mellanmjölk', 14.0, description='1 l')])
+    [group] = matcher.groups
+    assert [offer.price for offer in group.offers] == [10.0, 11.0]
+    matcher.update('citygross', [Offer('citygross', 'Arla Mellanmjölk', 13.0, description='1 l')])
+    assert sorted(group.name for group in matcher.groups) == ['Arla Mellanmjölk', 'Krossade tomater']
+    # Replacing a store drops its old offers from every group
+    matcher.update('ica', [Offer('ica', 'Arla Mellanmjölk', 12.5, description='1 l')])
+    [group] = matcher.groups
+    assert [(offer.store_id, offer.price) for offer in group.offers] == [('ica', 12.5), ('citygross', 13.0)]
+    matcher.update('ica', [])
+    assert matcher.groups == []
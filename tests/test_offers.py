@@ -0,0 +1,67 @@
+import copy
+
+import pytest
+
+from recipe_mcp.delta import SnapshotLog, encode_version
+
+
+@pytest.fixture
+def changes(server, monkeypatch):
+    monkeypatch.setattr(server, 'snapshot_log', SnapshotLog())
+    return server
+
+
+def _edit_city_gross(server, transport):
+    """Change the first offer's price, drop the second and add a new one, then refetch"""
+    items = transport.fixtures['citygross']['items']
+    changed = copy.deepcopy(items[0])
+    changed['productStoreDetails']['prices']['activePromotion']['priceDetails']['price'] = 19.9
+    added = dict(copy.deepcopy(items[2]), id='99999999', name="Nyhet")
+    transport.fixtures['citygross']['items'] = [changed] + items[2:] + [added]
+    transport._encoded.clear()
+    server.offer_cache.clear()
+    return items[0], items[1]
+
+
+def test_empty_location_list_is_rejected(server, run):
+    assert "error" in run(server.get_all_grocery_offers(locations=[]))
+    assert "error" in run(server.get_offer_changes(locations=[]))
+
+
+def test_changes_since_a_version(changes, run, transport):
+    version = run(changes.get_all_grocery_offers())["version"]
+    previous, removed = _edit_city_gross(changes, transport)
+    result = run(changes.get_offer_changes(since_version=version))
+    assert result["changed"]
+    assert (result["added_count"], result["changed_count"], result["removed_count"]) == (1, 1, 1)
+    stores = {store["store_id"]: store for store in result["stores"]}
+    city_gross = stores.pop('citygross')
+    assert not city_gross.get("full")
+    assert [item["name"] for item in city_gross["added"]] == ["Nyhet"]
+    [changed] = city_gross["changed"]
+    assert changed["name"] == previous["name"] and changed["price_value"] == 19.9
+    assert changed["previous_price_value"] == 29.9
+    assert [item["name"] for item in city_gross["removed"]] == [removed["name"]]
+    assert all(store["unchanged"] and "added" not in store for store in stores.values())
+
+    # Polling again with the new version finds nothing
+    again = run(changes.get_offer_changes(since_version=result["version"]))
+    assert not again["changed"]
+    assert all(store["unchanged"] for store in again["stores"])
+
+
+def test_unknown_versions_get_a_full_resync(changes, run):
+    full = run(changes.get_offer_changes())
+    assert all(store["full"] for store in full["stores"])
+    assert full["added_count"] == sum(len(store["added"]) for store in full["stores"]) > 0
+
+    result = run(changes.get_offer_changes(since_version=encode_version({'citygross': 'forgotten'})))
+    stores = {store["store_id"]: store for store in result["stores"]}
+    assert stores['citygross']["full"] and stores['citygross']["added"]
+    assert result["version"] == full["version"]
+
+
+@pytest.mark.parametrize('token', ["not a version", "W10", encode_version({})[:-1] + '!'])
+def test_invalid_versions_are_rejected(changes, run, transport, token):
+    assert "error" in run(changes.get_offer_changes(since_version=token))
+    assert transport.requests == 0
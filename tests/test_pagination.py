@@ -0,0 +1,40 @@
+import asyncio
+
+from recipe_mcp.pagination import Paginator
+
+CONFIG = {"style": "page", "pageParam": "page", "sizeParam": "size", "itemsPath": "results",
+          "totalPath": "total", "maxPages": 3}
+
+
+def _walk(total, max_items=None, report_total=True):
+    async def fetch_page(params):
+        start = params['page'] * params['size']
+        page = {"results": list(range(start, min(start + params['size'], total)))}
+        if report_total:
+            page["total"] = total
+        return page
+
+    async def walk():
+        paginator = Paginator(fetch_page, {"page": 0, "size": 10}, CONFIG, max_items)
+        items = [item async for page in paginator.pages() for item in page]
+        return paginator, items
+    return asyncio.run(walk())
+
+
+def test_whole_walk_is_not_truncated():
+    paginator, items = _walk(25)
+    assert items == list(range(25)) and not paginator.truncated
+
+
+def test_page_cap_is_reported_as_truncation():
+    for report_total in (True, False):
+        paginator, items = _walk(50, report_total=report_total)
+        assert len(items) == 30
+        assert paginator.capped and paginator.truncated
+
+
+def test_max_items_is_reported_as_truncation():
+    paginator, items = _walk(25, max_items=15)
+    assert len(items) == 15 and paginator.truncated and not paginator.capped
+    paginator, items = _walk(15, max_items=15)
+    assert not paginator.truncated
@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+from recipe_mcp.adapters import StoreAdapter
+from recipe_mcp.config import load_constants
+from recipe_mcp.models import Offer
+from recipe_mcp.prices import parse_multibuy, parse_price, parse_quantity, regular_item_price, unit_prices
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 0.0),
+    ('', 0.0),
+    (19.9, 19.9),
+    (25, 25.0),
+    ('19,90', 19.9),
+    ('19:90 kr', 19.9),
+    ('1 299:-', 1299.0),
+    ('1 299,5', 1299.5),
+    ('Jmf-pris 49.50 kr/kg', 49.5),
+    ('2 för 35 kr', 17.5),
+    ('inget pris', 0.0),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('2 för 35 kr', (2, 35.0)),
+    ('3 st för 50:-', (3, 50.0)),
+    ('2 for 35,90', (2, 35.9)),
+    ('4 förp för 100 kr', (4, 100.0)),
+    ('1 för 10 kr', None),
+    ('2 för', None),
+    ('Spara 10 kr', None),
+])
+def test_parse_multibuy(text, expected):
+    assert parse_multibuy(text) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2 för', 2),
+    ('3 st för', 3),
+    (2, 2),
+    ('', 1),
+    (None, 1),
+    ('Max 2 köp/hushåll', 1),
+])
+def test_parse_quantity(value, expected):
+    assert parse_quantity(value) == expected
+
+
+def test_unit_prices_per_package():
+    assert unit_prices(24.75, 'st', '', 'Pasta Penne 500 g') == (1, 24.75, 49.5, 'kg')
+    assert unit_prices(32.3, 'st', '', 'Mellanmjölk 1 l') == (1, 32.3, 32.3, 'l')
+    assert unit_prices(40.0, 'st', '', 'Yoghurt 4x125g') == (1, 40.0, 80.0, 'kg')
+    assert unit_prices(12.0, 'st', '', 'Gurka') == (1, 12.0, None, '')
+
+
+def test_unit_prices_by_weight_unit():
+    assert unit_prices(29.9, 'kg', '', 'Kycklingfilé') == (1, 29.9, 29.9, 'kg')
+    assert unit_prices(5.0, 'hg', '', 'Ost') == (1, 5.0, 50.0, 'kg')
+
+
+def test_unit_prices_multibuy_label():
+    assert unit_prices(65.51, 'st', '2 för 45 kr', 'Krossade tomater 400 g') == (2, 22.5, 56.25, 'kg')
+
+
+def test_unit_prices_multibuy_total_with_quantity():
+    # The price is the total for the multi-buy and counts packages, whatever the price unit
+    assert unit_prices(145.0, 'kg', '', 'Kycklingfilé 900 g', 2) == (2, 72.5, 80.56, 'kg')
+
+
+def test_willys_multibuy_offer():
+    constants = load_constants()
+    adapter = StoreAdapter('willys', constants['stores']['willys'])
+    with open(os.path.join(FIXTURES, 'willys.json'), encoding='utf-8') as f:
+        items = adapter.items_of(json.load(f)['body'])
+    chicken_offer = adapter.to_offer('willys', next(item for item in items if item['name'] == 'Kycklingfilé'))
+    chicken = chicken_offer.to_dict()
+    assert chicken['price_value'] == 145.0
+    assert chicken['multibuy_quantity'] == 2
+    assert chicken['unit_price_value'] == 72.5
+    # The regular price is per kg; one 900 g package of it costs 81.70
+    assert chicken['original_price'] == '90.78 kr/kg'
+    assert chicken_offer.regular_price == 81.7 and chicken_offer.savings == 9.2
+    butter = adapter.to_offer('willys', next(item for item in items if item['name'] == 'Smör Normalsaltat'))
+    assert butter.quantity == 1 and butter.original_price is None
+
+
+def test_regular_item_price():
+    assert regular_item_price(90.78, 'kg', 2, 'Kycklingfilé 900 g') == 81.7
+    assert regular_item_price(30.0, 'st', 2, 'Krossade tomater 400 g') == 30.0
+    assert regular_item_price(49.9, 'kg', 1, 'Kycklingfilé') == 49.9
+    # A per-kg price cannot be turned into a package price without the package size
+    assert regular_item_price(90.78, 'kg', 2, 'Kycklingfilé') is None
+
+
+def test_multibuy_savings_compare_like_units():
+    # 2 för 145 against 90.78 kr/kg with no package size: the units cannot be compared
+    offer = Offer('willys', 'Kycklingfilé', 145.0, 90.78, 'kg', multibuy_quantity=2)
+    assert offer.original_price is None and offer.savings == 0.0
+    # 2 för 145 against a regular 70 kr/kg for 900 g packages (63 kr each) is no saving
+    offer = Offer('willys', 'Kycklingfilé', 145.0, 70.0, 'kg', description='900 g', multibuy_quantity=2)
+    assert offer.original_price is None and offer.savings == 0.0
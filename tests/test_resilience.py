@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from benchmarks.transport import FixtureTransport
+from recipe_mcp.disk_cache import ResponseStore
+from recipe_mcp.resilience import CircuitBreaker, RetryBudget
+
+ICA_HOST = 'apimgw-pub.ica.se'
+
+
+class _Scripted(FixtureTransport):
+    """ICA answering with the given statuses (None for the fixture), then the fixture"""
+
+    def __init__(self):
+        super().__init__()
+        self.ica_statuses = []
+        self.ica_delays = []
+
+    async def handle_async_request(self, request):
+        if request.url.host == ICA_HOST:
+            if self.ica_delays:
+                await asyncio.sleep(self.ica_delays.pop(0))
+            status = self.ica_statuses.pop(0) if self.ica_statuses else None
+            if status is not None:
+                return httpx.Response(status, request=request)
+        return await super().handle_async_request(request)
+
+
+@pytest.fixture
+def transport():
+    return _Scripted()
+
+
+def _ica_stats(server):
+    return server.metrics.store(server._store_config('ica')['id'])
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    time.sleep(0.06)
+    # Half open: a single probe goes out, and its failure opens the circuit again
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_retry_budget_limits_retries_to_a_share_of_requests():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_failed_attempts_are_retried(server, run, monkeypatch, transport):
+    monkeypatch.setitem(server.CONSTANTS['common']['resilience'], 'backoffBaseSeconds', 0.001)
+    transport.ica_statuses = [503]
+    result = run(server.get_ica_offers())
+    assert result["item_count"] > 0
+    assert _ica_stats(server).events.get('retries') == 1
+    assert _ica_stats(server).request_errors == {'HTTPStatusError': 1}
+
+
+def test_retries_beyond_the_budget_are_refused(server, run, monkeypatch, transport):
+    monkeypatch.setitem(server.CONSTANTS['common']['resilience']['retryBudget'], 'maxTokens', 0)
+    transport.ica_statuses = [503]
+    result = run(server.get_ica_offers())
+    assert "error" in result
+    assert _ica_stats(server).events.get('retries_refused') == 1
+
+
+def test_open_circuit_skips_the_store(server, run, monkeypatch, transport):
+    resilience = server.CONSTANTS['common']['resilience']
+    monkeypatch.setitem(resilience, 'retries', 0)
+    monkeypatch.setitem(resilience['circuitBreaker'], 'failureThreshold', 1)
+    transport.ica_statuses = [503]
+    assert "error" in run(server.get_ica_offers())
+    requests = transport.requests
+    assert "error" in run(server.get_ica_offers())
+    assert transport.requests == requests
+    assert _ica_stats(server).events.get('short_circuits') == 1
+
+
+def test_losing_hedge_is_not_an_error(server, run, monkeypatch, transport):
+    from recipe_mcp import resilience
+    hedge = server.CONSTANTS['common']['resilience']['hedge']
+    monkeypatch.setitem(hedge, 'minSamples', 1)
+    monkeypatch.setitem(hedge, 'minDelaySeconds', 0.05)
+    resilience.get_latencies(server._store_config('ica')['id']).add(0.01)
+    # The first request hangs, so the hedge answers and the first is cancelled
+    transport.ica_delays = [2.0]
+    result = run(server.get_ica_offers())
+    assert result["item_count"] > 0
+    stats = _ica_stats(server)
+    assert stats.events.get('hedges') == 1
+    assert stats.request_errors == {}
+
+
+def test_request_errors_fall_back_to_the_saved_snapshot(server, run, monkeypatch, transport, tmp_path):
+    monkeypatch.setattr(server, 'response_store', ResponseStore(str(tmp_path)))
+    assert run(server.get_ica_offers())["item_count"] > 0
+    server.offer_cache.clear()
+    # An upstream API change rejects the request; retrying cannot help, the snapshot can
+    transport.ica_statuses = [400]
+    result = run(server.get_ica_offers())
+    assert result.get("stale_snapshot") and result["item_count"] > 0
+    assert _ica_stats(server).events.get('retries') is None
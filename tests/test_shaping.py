@@ -0,0 +1,16 @@
+from recipe_mcp.models import Offer
+from recipe_mcp.shaping import OfferView
+
+
+def _result(count, stamp='2026-10-12T08:00:00'):
+    offers = [Offer('willys', f"Vara {n}", float(n)) for n in range(count, 0, -1)]
+    return {"store_id": 'willys', "snapshot_saved_at": stamp, "items": offers, "item_count": count}
+
+
+def test_sorted_orders_are_not_shared_between_results_of_one_snapshot():
+    # A capped and a full result replayed from the same stale snapshot share its stamp
+    capped, full = _result(5), _result(120)
+    assert len(OfferView(sort_by='price_value').render(capped)["items"]) == 5
+    rendered = OfferView(sort_by='price_value').render(full)
+    assert len(rendered["items"]) == 120
+    assert [item["price_value"] for item in rendered["items"]] == [float(n) for n in range(1, 121)]
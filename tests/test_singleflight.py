@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from recipe_mcp.singleflight import SingleFlight
+
+
+class _Call:
+    """A call that waits until released, then returns or raises"""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return {"call": self.calls}
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flights = SingleFlight()
+        call = _Call()
+        waiting = [asyncio.ensure_future(flights.do('key', call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert len(flights) == 1
+        call.release.set()
+        results = await asyncio.gather(*waiting)
+        assert call.calls == 1
+        assert [result for result, _, _ in results] == [{"call": 1}] * 3
+        assert [callers for _, callers, _ in results] == [3, 3, 3]
+        assert [joined for _, _, joined in results] == [False, True, True]
+        assert flights.joined == 2 and len(flights) == 0
+
+        # A finished call is not reused
+        result, callers, joined = await flights.do('key', call)
+        assert result == {"call": 2} and callers == 1 and not joined
+    asyncio.run(main())
+
+
+def test_different_keys_do_not_share():
+    async def main():
+        flights = SingleFlight()
+        call = _Call()
+        call.release.set()
+        await asyncio.gather(flights.do('a', call), flights.do('b', call))
+        assert call.calls == 2 and flights.joined == 0
+    asyncio.run(main())
+
+
+def test_errors_reach_every_caller_and_release_the_key():
+    async def main():
+        flights = SingleFlight()
+        call = _Call(RuntimeError("upstream down"))
+        waiting = [asyncio.ensure_future(flights.do('key', call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        call.release.set()
+        results = await asyncio.gather(*waiting, return_exceptions=True)
+        assert call.calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(flights) == 0
+
+        call.error = None
+        assert (await flights.do('key', call))[0] == {"call": 2}
+    asyncio.run(main())
+
+
+def test_cancelled_caller_leaves_the_call_running():
+    async def main():
+        flights = SingleFlight()
+        call = _Call()
+        first = asyncio.ensure_future(flights.do('key', call))
+        second = asyncio.ensure_future(flights.do('key', call))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        call.release.set()
+        assert (await second)[0] == {"call": 1}
+        assert call.calls == 1
+    asyncio.run(main())
+
+
+def test_concurrent_tool_calls_fetch_once(server, run, transport):
+    async def calls():
+        return await asyncio.gather(*(server.get_city_gross_offers() for _ in range(3)))
+    results = run(calls())
+    pages = transport.requests
+    assert sum(not result["cache"]["hit"] for result in results) == 3
+    assert sum(result["cache"]["joined"] for result in results) == 2
+    server.offer_cache.clear()
+    run(server.get_city_gross_offers())
+    assert transport.requests == 2 * pages
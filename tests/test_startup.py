@@ -0,0 +1,124 @@
+"""
+Cold start.
+
+Every stdio client spawns its own server process, so startup is paid on each
+connection. What is loaded and opened at startup is always checked. The time
+budgets depend on the machine, so they only run with RECIPE_MCP_TIMING_TESTS=1.
+The startup budget covers the CLI entry point from process spawn until it
+has answered initialize and listed its tools. Budgets are in seconds and can
+be changed with RECIPE_MCP_IMPORT_BUDGET and RECIPE_MCP_STARTUP_BUDGET.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from mcp.types import LATEST_PROTOCOL_VERSION
+
+from recipe_mcp.config import load_constants, validate_constants
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET = float(os.environ.get('RECIPE_MCP_IMPORT_BUDGET', 0.05))
+STARTUP_BUDGET = float(os.environ.get('RECIPE_MCP_STARTUP_BUDGET', 0.5))
+
+timing = pytest.mark.skipif(not os.environ.get('RECIPE_MCP_TIMING_TESTS'),
+                            reason="set RECIPE_MCP_TIMING_TESTS=1 to check the time budgets")
+
+
+def _run(code, cache_dir):
+    """Run code in a fresh interpreter and return what it prints as JSON"""
+    env = dict(os.environ, PYTHONPATH=ROOT, RECIPE_MCP_CACHE_DIR=str(cache_dir))
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _import_package(cache_dir):
+    return _run(
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import recipe_mcp\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'loaded': [m for m in ('mcp', 'httpx', 'pydantic', "
+        "'recipe_mcp.foodmcp') if m in sys.modules]}))",
+        cache_dir,
+    )
+
+
+def test_package_import_is_lazy(tmp_path):
+    assert _import_package(tmp_path)['loaded'] == []
+
+
+@timing
+def test_package_import_budget(tmp_path):
+    assert min(_import_package(tmp_path)['seconds'] for _ in range(3)) < IMPORT_BUDGET
+
+
+def _stdio_startup(cache_dir):
+    """Start the CLI over stdio; returns the seconds until it listed its tools, and the tools"""
+    messages = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+         "params": {"protocolVersion": LATEST_PROTOCOL_VERSION, "capabilities": {},
+                    "clientInfo": {"name": "test_startup", "version": "0"}}},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+    ]
+    env = dict(os.environ, PYTHONPATH=ROOT, RECIPE_MCP_CACHE_DIR=str(cache_dir))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', 'from recipe_mcp.foodmcp import main; main()'],
+                               env=env, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    try:
+        process.stdin.write(''.join(json.dumps(message) + '\n' for message in messages))
+        process.stdin.flush()
+        for line in process.stdout:
+            reply = json.loads(line)
+            if reply.get('id') == 2:
+                return time.perf_counter() - start, reply['result']['tools']
+        raise AssertionError("The server exited without listing its tools")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_stdio_startup_opens_nothing(tmp_path):
+    _, tools = _stdio_startup(tmp_path)
+    assert tools
+    assert os.listdir(tmp_path) == []
+
+
+@timing
+def test_stdio_startup_budget(tmp_path):
+    # Best of a few runs, so a busy machine does not fail the budget by chance
+    assert min(_stdio_startup(tmp_path)[0] for _ in range(3)) < STARTUP_BUDGET
+
+
+def test_server_state_is_built_on_first_use(tmp_path):
+    result = _run(
+        "import json\n"
+        "from recipe_mcp import foodmcp\n"
+        "print(json.dumps([foodmcp._adapters is not None, foodmcp._response_store_opened, "
+        "foodmcp._history_opened, foodmcp._store_location_index is not None]))",
+        tmp_path,
+    )
+    assert result == [False, False, False, False]
+
+
+def test_constants_are_loaded_once():
+    assert load_constants() is load_constants()
+
+
+def test_invalid_constants_are_rejected():
+    constants = json.loads(json.dumps(load_constants()))
+    del constants['common']['cache']['maxEntries']
+    with pytest.raises(ValueError, match='common.cache: missing maxEntries'):
+        validate_constants(constants)
+
+    constants = json.loads(json.dumps(load_constants()))
+    store_key = next(iter(constants['stores']))
+    constants['stores'][store_key]['adapter']['endpoint'] = 'nope'
+    with pytest.raises(ValueError, match=f"{store_key}.adapter: unknown endpoint 'nope'"):
+        validate_constants(constants)